@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import sys
+
+# Figure out where our base `data` path is
+base_dir = os.path.dirname(__file__)
+planetinfo_file = 'PlanetInfo'
+db_file = 'uqm.sqlite'
+
+# Allow overriding the files on the commandline
+if len(sys.argv) > 1:
+    planetinfo_file = sys.argv[1]
+if len(sys.argv) > 2:
+    db_file = sys.argv[2]
+
+# Munge the system path.  This is lame, but whatever.
+sys.path.append(os.path.join(base_dir, '..'))
+
+import sqlite3
+from uqm_map import export
+
+# The SQLite equivalent of `import.pl`: loads the `PlanetInfo` dump into
+# fresh `system` and `planet` tables, which `exportdb.py --sqlite` can then
+# export.  Mostly useful for running the database side of the pipeline
+# without a MySQL server around.
+if not os.path.exists(planetinfo_file):
+    print('{} not found!'.format(planetinfo_file))
+    sys.exit(1)
+
+print('Importing {} into {}'.format(planetinfo_file, db_file))
+dbconn = sqlite3.connect(db_file)
+(num_systems, num_planets) = export.import_planetinfo(dbconn, planetinfo_file)
+dbconn.close()
+print('...done!  {} systems and {} planets imported.'.format(num_systems, num_planets))
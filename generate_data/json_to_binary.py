@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+
+# Figure out where our base `data` path is
+base_dir = os.path.dirname(__file__)
+data_dir = os.path.join(base_dir, '..', 'data')
+json_file = os.path.join(data_dir, 'uqm.json.gz')
+binary_file = os.path.join(data_dir, 'uqm.bin')
+
+# Allow overriding the files on the commandline
+if len(sys.argv) > 1:
+    json_file = sys.argv[1]
+if len(sys.argv) > 2:
+    binary_file = sys.argv[2]
+
+# Munge the system path.  This is lame, but whatever.
+sys.path.append(os.path.join(base_dir, '..'))
+
+from uqm_map import datafile
+
+# Converts the gzipped JSON datafile into the binary datafile format, which
+# the app loads quite a bit faster.  The app will use the binary file in
+# preference to the JSON if it exists, so re-run this whenever the JSON
+# gets regenerated.
+print('Converting {} to {}'.format(json_file, binary_file))
+datafile.convert(json_file, binary_file)
+print('...done!')
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import sys
+
+# Figure out where our base `data` path is
+base_dir = os.path.dirname(__file__)
+constellation_file = os.path.join(base_dir, 'constellations.ini')
+data_dir = os.path.join(base_dir, '..', 'data')
+planetinfo_file = 'PlanetInfo'
+json_file = os.path.join(data_dir, 'uqm.json.gz')
+
+# Allow overriding the files on the commandline
+if len(sys.argv) > 1:
+    planetinfo_file = sys.argv[1]
+if len(sys.argv) > 2:
+    json_file = sys.argv[2]
+
+# Munge the system path.  This is lame, but whatever.
+sys.path.append(os.path.join(base_dir, '..'))
+
+from uqm_map import planetinfo
+
+# Goes straight from the `PlanetInfo` dump written by our patched UQM to
+# the gzipped JSON datafile, in a single pass.  This does the same massaging
+# of the data as `import.pl` used to, without needing a database in the
+# middle.  Note that system and planet IDs are just numbered sequentially,
+# so they won't match the ones in a datafile generated via MySQL.
+for filename in [planetinfo_file, constellation_file]:
+    if not os.path.exists(filename):
+        print('{} not found!'.format(filename))
+        sys.exit(1)
+
+print('Converting {} to {}'.format(planetinfo_file, json_file))
+for warning in planetinfo.convert(planetinfo_file, json_file, constellation_file):
+    print(warning)
+print('...done!')
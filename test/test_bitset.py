@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+from uqm_map.index import bitset_from_flags, bitset_from_indexes, bitset_to_flags
+
+class BitsetTests(unittest.TestCase):
+    """
+    Tests for our bitset helper functions, which are used to store sets
+    of systems as Python ints (with one bit per system index).
+    """
+
+    def test_from_flags(self):
+        """
+        Tests converting a sequence of flags into a bitset
+        """
+        self.assertEqual(bitset_from_flags(b''), 0)
+        self.assertEqual(bitset_from_flags(b'\x00\x00'), 0)
+        self.assertEqual(bitset_from_flags(b'\x01\x00\x01\x01'), 0b1101)
+        self.assertEqual(bitset_from_flags([True, False, True]), 0b101)
+
+    def test_from_indexes(self):
+        """
+        Tests converting a list of indexes into a bitset
+        """
+        self.assertEqual(bitset_from_indexes([], 0), 0)
+        self.assertEqual(bitset_from_indexes([], 3), 0)
+        self.assertEqual(bitset_from_indexes([0, 3, 3], 5), 0b1001)
+
+    def test_to_flags(self):
+        """
+        Tests converting a bitset back into flags
+        """
+        self.assertEqual(bitset_to_flags(0, 0), b'')
+        self.assertEqual(bitset_to_flags(0, 3), b'\x00\x00\x00')
+        self.assertEqual(bitset_to_flags(0b1101, 5), b'\x01\x00\x01\x01\x00')
+
+    def test_round_trip(self):
+        """
+        Tests converting a larger set of flags to a bitset and back
+        """
+        flags = bytes([(idx % 3 == 0) for idx in range(1000)])
+        self.assertEqual(bitset_to_flags(bitset_from_flags(flags), 1000), flags)
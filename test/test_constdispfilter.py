@@ -20,7 +20,7 @@
 
 import unittest
 
-from uqm_map.data import ConstDispFilter, System
+from uqm_map.data import ConstDispFilter, System, Systems
 
 class ConstDispFilterTests(unittest.TestCase):
     """
@@ -68,3 +68,38 @@ class ConstDispFilterTests(unittest.TestCase):
         system = System(1, 'System Name', 'Alpha', 5000, 5000, 'blue dwarf', 'Alpha System Name')
         cdf = ConstDispFilter('Alpha System Name')
         self.assertEqual(cdf.approve(system), False)
+
+    def test_predicate(self):
+        """
+        Tests using our standalone predicate function
+        """
+        system = System(1, 'System Name', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.assertEqual(ConstDispFilter('System Name').predicate()(system), True)
+        self.assertEqual(ConstDispFilter('System').predicate()(system), False)
+
+    def test_prepare(self):
+        """
+        Tests matching after being prepared with a `Systems` object, so
+        that our matches come from the constellation index
+        """
+        s = Systems()
+        sys1 = s.add_system(1, 'Serpentis', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys2 = s.add_system(2, 'Vulpeculae', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys3 = s.add_system(3, 'Serpentis', 'Beta', 5000, 5000, 'blue dwarf', '')
+        cdf = ConstDispFilter('Serpentis')
+        cdf.prepare(s)
+        self.assertEqual(cdf.matches, set([sys1, sys3]))
+        self.assertEqual(cdf.approve(sys1), True)
+        self.assertEqual(cdf.approve(sys2), False)
+
+    def test_system_mask(self):
+        """
+        Tests getting a bitset of matching systems
+        """
+        s = Systems()
+        s.add_system(1, 'Serpentis', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        s.add_system(2, 'Vulpeculae', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        s.add_system(3, 'Serpentis', 'Beta', 5000, 5000, 'blue dwarf', '')
+        self.assertEqual(ConstDispFilter('Serpentis').system_mask(s), 0b101)
+        self.assertEqual(ConstDispFilter('Vulpeculae').system_mask(s), 0b010)
+        self.assertEqual(ConstDispFilter('Nothing').system_mask(s), 0)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import gzip
+import shutil
+import struct
+import tempfile
+import unittest
+
+from uqm_map.data import Systems, SafetyAggFilter, NameDispFilter
+from uqm_map import datafile
+
+class DatafileTests(unittest.TestCase):
+    """
+    Tests for our compact binary datafile format
+    """
+
+    def setUp(self):
+        """
+        Gives us a temporary directory to write files into
+        """
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'uqm.bin')
+        self.json_file = os.path.join(os.path.dirname(__file__), '..', 'data', 'uqm.json.gz')
+
+    def tearDown(self):
+        """
+        Cleans up our temporary directory
+        """
+        shutil.rmtree(self.tempdir)
+
+    def data(self, planets=None):
+        """
+        Returns a small set of data, in the format read by `load_from_json`
+        """
+        if planets is None:
+            planets = [
+                {'pid': 3, 'sid': 2, 'pname': 'Planet I', 'ptype': 'Acid World', 'tectonics': 2,
+                    'weather': 3, 'temp': 400, 'gravity': 1, 'bio': 100, 'bio_danger': 50, 'mineral': 8,
+                    'min_common': 1, 'min_corrosive': 0, 'min_base': 0, 'min_noble': 0,
+                    'min_rare': 0, 'min_precious': 0, 'min_radio': 0, 'min_exotic': 7},
+                {'pid': 4, 'sid': 1, 'pname': 'Planet Ï', 'ptype': 'Water World', 'tectonics': 1,
+                    'weather': 1, 'temp': -20, 'gravity': 1, 'bio': 0, 'bio_danger': 0, 'mineral': 2,
+                    'min_common': 2, 'min_corrosive': 0, 'min_base': 0, 'min_noble': 0,
+                    'min_rare': 0, 'min_precious': 0, 'min_radio': 0, 'min_exotic': 0},
+                ]
+        return {
+            'systems': [
+                {'sid': 1, 'name': 'System', 'position': 'Alpha',
+                    'x': 5000, 'y': 6000, 'stype': 'green dwarf', 'extra': ''},
+                {'sid': 2, 'name': 'System', 'position': 'Beta',
+                    'x': 6000, 'y': 7000, 'stype': 'green dwarf', 'extra': 'Homeworld'},
+                ],
+            'quasispace': [
+                {'label': 'A', 'x': 438, 'y': 6373, 'qs_x': 500, 'qs_y': 500},
+                ],
+            'planets': planets,
+            'constellations': {'1': [2]},
+            }
+
+    def test_write_and_load(self):
+        """
+        Tests writing out a small datafile and reading it back in
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        s = Systems.load_from_file(self.filename)
+        self.assertEqual(len(s.system_list), 2)
+        self.assertEqual(len(s.quasispace), 1)
+        self.assertEqual(s.get('A').qs_x, 500)
+        sys2 = s.get(2)
+        self.assertEqual(sys2.fullname, 'Beta System')
+        self.assertEqual(sys2.extra, 'Homeworld')
+        self.assertEqual((sys2.x, sys2.y), (6000, 7000))
+        p = sys2.planets[0]
+        self.assertEqual(p.idnum, 3)
+        self.assertEqual(p.tectonics, 2)
+        self.assertEqual(p.mineral.exotic, 7)
+        p = s.get(1).planets[0]
+        self.assertEqual(p.name, 'Planet Ï')
+        self.assertEqual(p.temp, -20)
+        self.assertEqual(list(s.columns.system_offsets), [0, 1, 2])
+        self.assertEqual(s.planet_types, set(['Acid', 'Water']))
+        self.assertEqual(s.connections, [(s.get(1), sys2)])
+        self.assertEqual(s.agg_max_value, 176)
+
+    def test_load_gzipped(self):
+        """
+        Tests loading a binary datafile which has been gzipped
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        gz_file = os.path.join(self.tempdir, 'uqm.bin.gz')
+        with open(self.filename, 'rb') as df:
+            with gzip.GzipFile(gz_file, 'w') as gz:
+                gz.write(df.read())
+        s = Systems.load_from_file(gz_file)
+        self.assertEqual(len(s.system_list), 2)
+        self.assertEqual(s.get(2).planets[0].idnum, 3)
+
+    def test_write_unknown_system(self):
+        """
+        Tests writing a datafile with a planet which references a system
+        which doesn't exist
+        """
+        planets = self.data()['planets']
+        planets[0]['sid'] = 5
+        with self.assertRaises(KeyError) as cm:
+            datafile.write_datafile(self.data(planets), self.filename)
+
+    def test_writer_rows(self):
+        """
+        Tests writing a datafile a row at a time, with a system which has no
+        planets and with spools which get flushed partway through
+        """
+        data = self.data()
+        writer = datafile.DatafileWriter(self.filename)
+        for spool in [spool for (name, spool) in writer.planets]:
+            spool.flush_size = 1
+        writer.add_system({'sid': 5, 'name': 'Empty', 'position': '', 'x': 1, 'y': 2,
+            'stype': 'red dwarf', 'extra': ''})
+        for system in data['systems']:
+            writer.add_system(system)
+        for planet in sorted(data['planets'], key=lambda planet: planet['sid']):
+            writer.add_planet(planet)
+        writer.add_link(1, 2)
+        writer.close()
+        s = Systems.load_from_file(self.filename)
+        self.assertEqual(list(s.columns.system_offsets), [0, 0, 1, 2])
+        self.assertEqual(s.get(5).planets, [])
+        self.assertEqual(s.get(1).planets[0].name, 'Planet Ï')
+        self.assertEqual(s.get(2).planets[0].mineral.exotic, 7)
+        self.assertEqual(len(s.quasispace), 0)
+        self.assertEqual(s.connections, [(s.get(1), s.get(2))])
+
+    def test_writer_out_of_order(self):
+        """
+        Tests that the writer insists on planets being grouped in system
+        order, and on systems all coming first
+        """
+        data = self.data()
+        writer = datafile.DatafileWriter(self.filename)
+        for system in data['systems']:
+            writer.add_system(system)
+        writer.add_planet(data['planets'][0])
+        with self.assertRaises(KeyError):
+            writer.add_planet(data['planets'][1])
+        with self.assertRaises(ValueError):
+            writer.add_system(data['systems'][0])
+
+    def test_derived(self):
+        """
+        Tests that derived data gets written out, and used when loading
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        with open(self.filename, 'rb') as df:
+            reader = datafile.DatafileReader(df.read())
+        derived = reader.derived(reader.strings())
+        self.assertEqual(derived['systems'], 2)
+        self.assertEqual(derived['planet_types'], set(['Acid', 'Water']))
+        self.assertEqual(derived['full_aggregates']['exotic'], [0, 7])
+        self.assertEqual(derived['full_aggregates']['value'], [2, 176])
+        self.assertEqual(derived['types'], {'Water World': [0], 'Acid World': [1]})
+        self.assertEqual(list(derived['connections']), [(1, 2)])
+        s = Systems.load_from_file(self.filename)
+        self.assertEqual(s.full_sums['value'], [2, 176])
+        self.assertEqual(s.types.lookup('Acid'), set([1]))
+
+    def test_load_version_1(self):
+        """
+        Tests loading a version 1 datafile, which has no derived data
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        with open(self.filename, 'rb') as df:
+            buf = bytearray(df.read())
+        # Version 1 files are the same, just without the derived sections
+        struct.pack_into('<I', buf, 4, 1)
+        struct.pack_into('<I', buf, 28, 0)
+        reader = datafile.DatafileReader(buf)
+        self.assertIsNone(reader.derived(reader.strings()))
+        s = datafile.load_from_buffer(buf)
+        self.assertEqual(s.planet_types, set(['Acid', 'Water']))
+        self.assertEqual(s.connections, [(s.get(1), s.get(2))])
+        self.assertEqual(s.full_sums['value'], [2, 176])
+        self.assertEqual(s.agg_max_value, 176)
+
+    def test_sections_aligned(self):
+        """
+        Tests that our file ends up padded to our section alignment
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        self.assertEqual(os.path.getsize(self.filename) % 8, 0)
+
+    def test_reader_bad_magic(self):
+        """
+        Tests reading a buffer which isn't a binary datafile
+        """
+        with self.assertRaises(ValueError) as cm:
+            datafile.DatafileReader(b'\0' * 64)
+        self.assertIn('Not a binary', str(cm.exception))
+
+    def test_reader_truncated(self):
+        """
+        Tests reading a datafile which has been cut short
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        with open(self.filename, 'rb') as df:
+            buf = df.read()
+        with self.assertRaises(ValueError) as cm:
+            datafile.DatafileReader(buf[:-16])
+        self.assertIn('truncated', str(cm.exception))
+
+    def test_reader_newer_version(self):
+        """
+        Tests reading a datafile from a newer version than we support
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        with open(self.filename, 'rb') as df:
+            buf = bytearray(df.read())
+        buf[4] = datafile.version + 1
+        with self.assertRaises(ValueError) as cm:
+            datafile.DatafileReader(buf)
+        self.assertIn('newer', str(cm.exception))
+
+    def test_convert_default(self):
+        """
+        Converts our main default datafile and makes sure that we end up with
+        the same data as loading the JSON.
+        """
+        datafile.convert(self.json_file, self.filename)
+        s = Systems.load_from_file(self.json_file)
+        b = Systems.load_from_file(self.filename)
+        self.assertEqual(len(b.systems), 518)
+        self.assertEqual(len(b.columns), 3806)
+        self.assertEqual(b.planet_types, s.planet_types)
+        self.assertEqual(b.constellation_names, s.constellation_names)
+        self.assertEqual(len(b.connections), len(s.connections))
+        self.assertEqual(b.agg_max_value, s.agg_max_value)
+        self.assertEqual(b.bio_agg_max_value, s.bio_agg_max_value)
+        for system in s.system_list:
+            other = b.get(system.idnum)
+            self.assertEqual(other.fullname, system.fullname)
+            self.assertEqual([p.name for p in other.planets], [p.name for p in system.planets])
+            self.assertEqual(other.mineral_agg_full.value(), system.mineral_agg_full.value())
+
+    def test_load_mmap(self):
+        """
+        Tests memory-mapping a small datafile
+        """
+        datafile.write_datafile(self.data(), self.filename)
+        s = Systems.load_from_file(self.filename, mmap=True)
+        self.assertIsInstance(s.columns.tectonics, memoryview)
+        self.assertEqual(list(s.datafile.systems['x']), [5000, 6000])
+        self.assertEqual(s.get(2).planets[0].mineral.exotic, 7)
+        self.assertEqual(s.get(1).planets[0].temp, -20)
+        self.assertEqual(s.agg_max_value, 176)
+
+    def test_load_mmap_gzipped(self):
+        """
+        Tests trying to memory-map a gzipped file, which can't work
+        """
+        with self.assertRaises(ValueError) as cm:
+            Systems.load_from_file(self.json_file, mmap=True)
+        self.assertIn('uncompressed', str(cm.exception))
+
+    def test_load_mmap_filtered(self):
+        """
+        Makes sure that aggregate processing over memory-mapped columns
+        matches the same processing over copied columns, including the
+        incremental safety filter updates.
+        """
+        datafile.convert(self.json_file, self.filename)
+        results = []
+        for mmap in [False, True]:
+            s = Systems.load_from_file(self.filename, mmap=mmap)
+            f = SafetyAggFilter()
+            f.set_tectonics(4)
+            s.aggfilter.add(f)
+            s.dispfilter.add(NameDispFilter('a', False))
+            s.process_aggregates()
+            f.set_tectonics(6)
+            s.process_aggregates()
+            results.append([(system.highlight, system.mineral_agg.value(), system.bio_agg)
+                for system in s.system_list])
+            results.append((s.agg_min_value, s.agg_max_value, s.bio_agg_max_value))
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[1], results[3])
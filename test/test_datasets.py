@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from uqm_map.multi import Datasets
+from uqm_map import datafile, query
+
+class DatasetsTests(unittest.TestCase):
+    """
+    Tests for our `Datasets` class, which loads several datafiles side by side
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Sets up a JSON and a binary copy of our main datafile
+        """
+        cls.tempdir = tempfile.mkdtemp()
+        cls.json_file = os.path.join(os.path.dirname(__file__), '..', 'data', 'uqm.json.gz')
+        cls.binary_file = os.path.join(cls.tempdir, 'uqm.bin')
+        datafile.convert(cls.json_file, cls.binary_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Cleans up our temporary directory
+        """
+        shutil.rmtree(cls.tempdir)
+
+    def test_dataset_names(self):
+        """
+        Tests naming datasets after their files
+        """
+        self.assertEqual(Datasets.dataset_names(['/a/one.json.gz', '/b/one.json.gz', '/c/two.bin']),
+            {'one.json.gz': '/a/one.json.gz', 'one.json.gz (2)': '/b/one.json.gz', 'two.bin': '/c/two.bin'})
+        self.assertEqual(Datasets.dataset_names({'a': 'file'}), {'a': 'file'})
+
+    def test_load_single_process(self):
+        """
+        Tests loading datasets all in this process
+        """
+        d = Datasets.load({'json': self.json_file, 'binary': self.binary_file}, processes=1)
+        self.assertEqual(len(d), 2)
+        self.assertEqual(d.names(), ['json', 'binary'])
+        self.assertIsNot(d.get('json'), d.get('binary'))
+        self.assertEqual(len(d.get('binary').system_list), 502)
+        self.assertEqual(d.timings['json']['transfer'], 0)
+        self.assertGreater(d.total_time, 0)
+
+    def test_load_pool(self):
+        """
+        Tests loading datasets across a pool of processes
+        """
+        d = Datasets.load({'json': self.json_file, 'binary': self.binary_file}, processes=2)
+        self.assertEqual(d.names(), ['json', 'binary'])
+        for name in d.names():
+            systems = d.get(name)
+            self.assertEqual(len(systems.system_list), 502)
+            self.assertEqual(len(systems.columns), 3806)
+            self.assertEqual(sorted(d.timings[name].keys()), ['load', 'total', 'transfer'])
+        self.assertEqual(d.get('json').agg_max_value, d.get('binary').agg_max_value)
+
+    def test_load_pool_mmap(self):
+        """
+        Tests that memory-mapped datasets can't be loaded in a pool
+        """
+        with self.assertRaises(ValueError) as cm:
+            Datasets.load([self.binary_file], processes=2, mmap=True)
+
+    def test_query(self):
+        """
+        Tests querying across all our datasets at once
+        """
+        d = Datasets.load({'a': self.json_file, 'b': self.binary_file}, processes=1)
+        results = d.query({'name': 'sol'})
+        self.assertEqual([(result['dataset'], result['name'], result['rank']) for result in results],
+            [('a', 'Sol', 1), ('b', 'Sol', 2)])
+        results = d.query({'limit': 3})
+        self.assertEqual(len(results), 3)
+        self.assertEqual([result['dataset'] for result in results], ['a', 'b', 'a'])
+        self.assertEqual([result['dataset_rank'] for result in results], [1, 1, 2])
+
+    def test_query_each(self):
+        """
+        Tests querying each dataset separately, including an error for one
+        of them.
+        """
+        d = Datasets.load({'a': self.json_file}, processes=1)
+        results = d.query_each({'name': 'sol'})
+        self.assertEqual(list(results.keys()), ['a'])
+        self.assertEqual(results['a'][0]['name'], 'Sol')
+        results = d.query_each({'id': 5, 'near': 'Nowhere'})
+        self.assertEqual(results['a'][0]['query'], 5)
+        self.assertIn('error', results['a'][0])
+        with self.assertRaises(ValueError):
+            d.query_each({'sort': 'bogus'})
+
+    def test_query_errors(self):
+        """
+        Tests that invalid specs, and queries which no dataset can run, raise
+        errors rather than returning no results
+        """
+        d = Datasets.load({'a': self.json_file, 'b': self.binary_file}, processes=1)
+        for spec in [{'sort': 'bogus'}, {'name': 5}, {'near': 'Nowhere'}]:
+            with self.assertRaises(ValueError):
+                d.query(spec)
+        self.assertEqual(d.query({'sort': None, 'limit': 2}), d.query({'limit': 2}))
+
+    def test_query_partial_error(self):
+        """
+        Tests that a dataset which can't run a query is left out of the
+        combined results
+        """
+        d = Datasets.load({'a': self.json_file, 'b': self.binary_file}, processes=1)
+        run_query = query.run_query
+        def fail_b(systems, spec):
+            if systems is d.get('b'):
+                raise ValueError('Unknown system "Sol"')
+            return run_query(systems, spec)
+        with mock.patch.object(query, 'run_query', fail_b):
+            results = d.query({'near': 'Sol', 'radius': 0})
+        self.assertEqual([(result['dataset'], result['name']) for result in results], [('a', 'Sol')])
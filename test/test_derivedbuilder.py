@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from uqm_map.data import derived_version
+from uqm_map.derived import DerivedBuilder, derive
+
+class DerivedBuilderTests(unittest.TestCase):
+    """
+    Tests for our `DerivedBuilder` class, which works out the derived data
+    that exporters embed in datafiles
+    """
+
+    def system(self, sid, name):
+        """
+        Returns a system dict with the given ID and name
+        """
+        return {'sid': sid, 'name': name, 'position': 'Alpha', 'x': 1, 'y': 2,
+            'stype': 'red dwarf', 'extra': ''}
+
+    def planet(self, pid, sid, ptype, bio=0, exotic=0):
+        """
+        Returns a planet dict with the given values (and zero for the rest)
+        """
+        planet = {'pid': pid, 'sid': sid, 'pname': 'Planet', 'ptype': ptype, 'bio': bio,
+            'bio_danger': 0, 'min_exotic': exotic}
+        for key in ['min_common', 'min_corrosive', 'min_base', 'min_noble', 'min_rare',
+                'min_precious', 'min_radio']:
+            planet[key] = 1
+        return planet
+
+    def test_empty(self):
+        """
+        Tests the derived data with nothing added
+        """
+        data = DerivedBuilder().data({})
+        self.assertEqual(data['version'], derived_version)
+        self.assertEqual(data['systems'], 0)
+        self.assertEqual(data['planet_types'], [])
+        self.assertEqual(data['full_aggregates']['value'], [])
+        self.assertEqual(data['types'], {})
+
+    def test_data(self):
+        """
+        Tests building up derived data for a few systems
+        """
+        b = DerivedBuilder()
+        b.add_system(self.system(5, 'Vulpeculae'))
+        b.add_system(self.system(2, 'Sol'))
+        b.add_system(self.system(7, 'Sol'))
+        b.add_planet(self.planet(1, 2, 'Water World', bio=3))
+        b.add_planet(self.planet(2, 2, 'Water World', exotic=2))
+        b.add_planet(self.planet(3, 5, 'StarBase', bio=1))
+        data = b.data({'5': [2, 7]})
+        self.assertEqual(data['systems'], 3)
+        self.assertEqual(data['planet_types'], ['StarBase', 'Water'])
+        self.assertEqual(data['constellation_names'], ['Sol', 'Vulpeculae'])
+        self.assertEqual(data['connections'], [[5, 2], [5, 7]])
+        self.assertEqual(data['full_aggregates']['bio'], [1, 3, 0])
+        self.assertEqual(data['full_aggregates']['exotic'], [0, 2, 0])
+        self.assertEqual(data['full_aggregates']['common'], [1, 2, 0])
+        self.assertEqual(data['full_aggregates']['value'], [1+2+3+4+5+6+8, 2*29+50, 0])
+        self.assertEqual(data['types'], {'StarBase': [0], 'Water World': [1]})
+
+    def test_unknown_system(self):
+        """
+        Tests adding a planet for a system we haven't seen
+        """
+        b = DerivedBuilder()
+        with self.assertRaises(KeyError):
+            b.add_planet(self.planet(1, 2, 'Water World'))
+
+    def test_derive(self):
+        """
+        Tests building derived data straight from a data dict
+        """
+        data = {'systems': [self.system(1, 'Sol')], 'planets': [self.planet(1, 1, 'Acid World')],
+            'constellations': {}}
+        derived = derive(data)
+        self.assertEqual(derived['planet_types'], ['Acid'])
+        self.assertEqual(derived['connections'], [])
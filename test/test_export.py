@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import gzip
+import json
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from uqm_map import export
+from uqm_map.data import Systems
+from uqm_map.planetinfo import convert
+
+class ExportTests(unittest.TestCase):
+    """
+    Tests for importing a `PlanetInfo` dump into SQLite and streaming it
+    back out again as a datafile
+    """
+
+    dump = """System\tAlpha Serpentis\t(5007, 35)\tgreen dwarf\t
+Planet\tPlanet I\tAcid World
+          Tectonics:  2
+          Bio: 7\tMin: 5
+          Exotic Minerals: 5
+Moon\tMoon a\tSelenic World
+          NoAttr
+System\tBeta Serpentis\t(5100, 200)\tred giant\tMelnorme trader #0
+System\tSol\t(1752, 1450)\tyellow dwarf\t
+Planet\tPlanet III\tWater World
+          NoScan
+"""
+
+    def setUp(self):
+        """
+        Writes out our dump and constellation file, and imports the dump
+        into an in-memory SQLite database
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.planetinfo_file = os.path.join(self.tmpdir, 'PlanetInfo')
+        with open(self.planetinfo_file, 'w') as df:
+            df.write(self.dump)
+        self.constellation_file = os.path.join(self.tmpdir, 'constellations.ini')
+        with open(self.constellation_file, 'w') as df:
+            df.write('[Serpentis]\nAlpha = Beta\n')
+        self.conn = sqlite3.connect(':memory:')
+        self.counts = export.import_planetinfo(self.conn, self.planetinfo_file, batch_size=2)
+
+    def tearDown(self):
+        """
+        Cleans up our database and temporary directory
+        """
+        self.conn.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_import(self):
+        """
+        Tests importing the dump into SQLite
+        """
+        self.assertEqual(self.counts, (3, 3))
+        self.assertEqual(self.conn.execute('select count(*) from planet').fetchone(), (3,))
+        self.assertEqual(self.conn.execute('select extra from system where sid=2').fetchone(),
+            ('Melnorme trader #1',))
+
+    def test_import_again(self):
+        """
+        Tests that importing replaces the existing tables
+        """
+        self.assertEqual(export.import_planetinfo(self.conn, self.planetinfo_file), (3, 3))
+        self.assertEqual(self.conn.execute('select count(*) from system').fetchone(), (3,))
+
+    def test_rows(self):
+        """
+        Tests reading rows back out in batches
+        """
+        rows = list(export.rows(self.conn, 'planet', ['pid', 'pname'], 'pid desc', batch_size=2))
+        self.assertEqual(rows, [{'pid': 3, 'pname': 'Planet III'},
+            {'pid': 2, 'pname': 'Planet I Moon a'}, {'pid': 1, 'pname': 'Planet I'}])
+
+    def test_export_json(self):
+        """
+        Tests that exporting to JSON gives the same data as converting the
+        dump directly
+        """
+        json_file = os.path.join(self.tmpdir, 'uqm.json.gz')
+        direct_file = os.path.join(self.tmpdir, 'direct.json.gz')
+        (num_systems, num_planets, warnings) = export.export_json(self.conn, json_file,
+            self.constellation_file, batch_size=2)
+        self.assertEqual((num_systems, num_planets, warnings), (3, 3, []))
+        convert(self.planetinfo_file, direct_file, self.constellation_file, processes=1)
+        with gzip.open(json_file, 'rb') as df:
+            exported = df.read()
+        with gzip.open(direct_file, 'rb') as df:
+            self.assertEqual(exported, df.read())
+        self.assertEqual(json.loads(exported.decode('utf-8'))['constellations'], {'1': [2]})
+
+    def test_export_binary(self):
+        """
+        Tests exporting to a binary datafile
+        """
+        bin_file = os.path.join(self.tmpdir, 'uqm.bin')
+        self.assertEqual(export.export_binary(self.conn, bin_file, self.constellation_file),
+            (3, 3, []))
+        s = Systems.load_from_file(bin_file)
+        self.assertEqual(len(s.system_list), 3)
+        self.assertEqual([p.name for p in s.get(1).planets], ['Planet I', 'Planet I Moon a'])
+        self.assertEqual(s.get(2).planets, [])
+        self.assertEqual(s.get(1).planets[0].mineral.exotic, 5)
+        self.assertEqual(s.connections, [(s.get(1), s.get(2))])
+        self.assertEqual(len(s.quasispace), 16)
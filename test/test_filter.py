@@ -20,7 +20,8 @@
 
 import unittest
 
-from uqm_map.data import Filter, ProxDispFilter, NameDispFilter, System
+from uqm_map.data import Filter, ProxDispFilter, NameDispFilter, ConstDispFilter, TypeDispFilter, \
+    System, Systems, Planet, MinData
 
 class FilterTests(unittest.TestCase):
     """
@@ -114,3 +115,100 @@ class FilterTests(unittest.TestCase):
         self.f.add(NameDispFilter('alpha system', False))
         self.f.add(ProxDispFilter(s2, 50))
         self.assertEqual(self.f.approve(s), False)
+
+    def test_compile_empty(self):
+        """
+        Tests compiling an empty filter chain
+        """
+        s = System(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        predicate = self.f.compile()
+        self.assertEqual(self.f.compiled, predicate)
+        self.assertEqual(predicate(s), True)
+
+    def test_compile_three_filters(self):
+        """
+        Tests compiling a chain of three filters and using the result
+        directly
+        """
+        s = System(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        s2 = System(2, 'System', 'Beta', 5100, 5100, 'red dwarf', '')
+        s3 = System(3, 'Other', 'Beta', 5100, 5100, 'red dwarf', '')
+        s4 = System(4, 'System', 'Gamma', 9000, 9000, 'red dwarf', '')
+        self.f.add(NameDispFilter('system', False))
+        self.f.add(ProxDispFilter(s2, 500))
+        self.f.add(ConstDispFilter('System'))
+        predicate = self.f.compile()
+        self.assertEqual(predicate(s), True)
+        self.assertEqual(predicate(s2), True)
+        self.assertEqual(predicate(s3), False)
+        self.assertEqual(predicate(s4), False)
+
+    def test_compile_cheapest_first(self):
+        """
+        Tests that the compiled predicate tries the cheapest filters first,
+        and stops as soon as one of them says no
+        """
+        calls = []
+        class CountingFilter(object):
+            def __init__(self, name, cost, result):
+                self.name = name
+                self.predicate_cost = cost
+                self.result = result
+            def predicate(self):
+                def approve(obj):
+                    calls.append(self.name)
+                    return self.result
+                return approve
+        s = System(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.f.add(CountingFilter('expensive', 3, True))
+        self.f.add(CountingFilter('cheap', 0, False))
+        self.f.add(CountingFilter('middle', 1, True))
+        self.assertEqual(self.f.approve(s), False)
+        self.assertEqual(calls, ['cheap'])
+        self.f.filters[1].result = True
+        self.f.compiled = None
+        calls.clear()
+        self.assertEqual(self.f.approve(s), True)
+        self.assertEqual(calls, ['cheap', 'middle', 'expensive'])
+
+    def test_approve_recompiles(self):
+        """
+        Tests that adding a filter or resetting the chain will cause it to
+        be recompiled on the next `approve()` call
+        """
+        s = System(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.assertEqual(self.f.approve(s), True)
+        self.assertNotEqual(self.f.compiled, None)
+        self.f.add(NameDispFilter('ur-quan', False))
+        self.assertEqual(self.f.compiled, None)
+        self.assertEqual(self.f.approve(s), False)
+        self.f.reset()
+        self.assertEqual(self.f.compiled, None)
+        self.assertEqual(self.f.approve(s), True)
+
+    def test_approve_no_from_system(self):
+        """
+        Tests that a proximity filter without a system returns a real
+        boolean from the compiled chain
+        """
+        s = System(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.f.add(NameDispFilter('alpha system', False))
+        self.f.add(ProxDispFilter(None, 500))
+        self.assertIs(self.f.approve(s), False)
+
+    def test_system_mask(self):
+        """
+        Tests getting a bitset of approved systems
+        """
+        systems = Systems()
+        sys1 = systems.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys2 = systems.add_system(2, 'Other', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys3 = systems.add_system(3, 'System', 'Beta', 5000, 5000, 'blue dwarf', '')
+        sys3.addplanet(Planet(1, 'Acid', 'Acid World', 1, 1, 100, 1, 0, 0, MinData()))
+        self.assertEqual(self.f.system_mask(systems), 0b111)
+        self.f.add(ConstDispFilter('System'))
+        self.f.prepare(systems)
+        self.assertEqual(self.f.system_mask(systems), 0b101)
+        self.f.add(TypeDispFilter('Acid'))
+        self.f.prepare(systems)
+        self.assertEqual(self.f.system_mask(systems), 0b100)
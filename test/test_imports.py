@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+class ImportTests(unittest.TestCase):
+    """
+    Tests to make sure that our non-GUI modules can be used headless, which
+    in particular means not pulling in Qt, and that they stay cheap to
+    import.  Each import is checked in a fresh interpreter.
+
+    Rather than timing imports, which is at the mercy of whatever else the
+    machine is doing, our import budget is counted in modules: each
+    headless module has a ceiling on how many modules importing it may
+    load (including itself), with some headroom for differences between
+    Python versions, and the core data model must not pull in any of our
+    `heavy` modules.  `python -X importtime -c "import uqm_map.data"` is
+    the place to start if one of these fails.
+    """
+
+    # Maximum number of newly-loaded modules for each headless import
+    budgets = {
+        'uqm_map.index': 10,
+        'uqm_map.route': 15,
+        'uqm_map.data': 40,
+        'uqm_map.jsonstream': 40,
+        'uqm_map.mining': 65,
+        'uqm_map.query': 70,
+        'uqm_map.tour': 70,
+        'uqm_map.datafile': 70,
+        'uqm_map.multi': 90,
+        'uqm_map.server': 150,
+        }
+    headless = sorted(budgets.keys())
+
+    # Modules which are expensive to import, and which the data model only
+    # needs for particular jobs (so should import when it needs them)
+    heavy = [ 'PyQt5', 'numpy', 'multiprocessing', 'concurrent', 'sqlite3', 'http',
+        'gzip', 'pickle', 'json', 'uqm_map.gui' ]
+
+    def loaded_modules(self, modules):
+        """
+        Imports the given modules in a new interpreter, and returns the list
+        of modules which were loaded along the way.
+        """
+        code = 'import sys, json\n' \
+            'before = set(sys.modules)\n' \
+            'import {}\n' \
+            'print(json.dumps(sorted(set(sys.modules) - before)))\n'.format(', '.join(modules))
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=base_dir)
+        return json.loads(output.decode('utf-8'))
+
+    def loaded_gui_modules(self, modules):
+        """
+        Imports the given modules in a new interpreter, and returns the list
+        of Qt or GUI modules which were loaded along the way.
+        """
+        return [module for module in self.loaded_modules(modules)
+            if module.startswith('PyQt') or module == 'uqm_map.gui']
+
+    def test_headless_no_qt(self):
+        """
+        Tests that importing our data layer doesn't import Qt or the GUI
+        """
+        self.assertEqual(self.loaded_gui_modules(self.headless), [])
+
+    def test_each_headless_no_qt(self):
+        """
+        Tests each headless module on its own, so that one of them can't
+        lean on the others having been imported first
+        """
+        for module in self.headless:
+            self.assertEqual(self.loaded_gui_modules([module]), [], module)
+
+    def test_import_budgets(self):
+        """
+        Tests that each headless module stays within its import budget
+        """
+        for (module, budget) in sorted(self.budgets.items()):
+            loaded = self.loaded_modules([module])
+            self.assertLessEqual(len(loaded), budget, '{} loads: {}'.format(module, ', '.join(loaded)))
+
+    def test_data_no_heavy_modules(self):
+        """
+        Tests that the core data model doesn't pull in any heavy modules
+        """
+        loaded = self.loaded_modules(['uqm_map.data'])
+        found = [module for module in loaded
+            if any([module == heavy or module.startswith(heavy + '.') for heavy in self.heavy])]
+        self.assertEqual(found, [])
+
+    def test_main_help_no_qt(self):
+        """
+        Tests that the main script can at least parse its arguments without
+        needing Qt.
+        """
+        output = subprocess.check_output([sys.executable, '-c',
+            'import sys, runpy\n'
+            'sys.argv = ["uqm_map.py", "--help"]\n'
+            'try:\n'
+            '    runpy.run_path("uqm_map.py", run_name="__main__")\n'
+            'except SystemExit:\n'
+            '    pass\n'
+            'print([m for m in sys.modules if m.startswith("PyQt") or m == "uqm_map.gui"])\n'],
+            cwd=base_dir)
+        self.assertIn('--datafile', output.decode('utf-8'))
+        self.assertTrue(output.decode('utf-8').strip().endswith('[]'))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import io
+import json
+import unittest
+
+from uqm_map.jsonstream import JSONStream
+
+class JSONStreamTests(unittest.TestCase):
+    """
+    Tests for our `JSONStream` class, which reads a top-level JSON dict
+    incrementally.
+    """
+
+    def items(self, text, chunk_size=65536):
+        """
+        Returns the list of items read from the given JSON text
+        """
+        return list(JSONStream(io.StringIO(text), chunk_size=chunk_size).items())
+
+    def test_empty_dict(self):
+        """
+        Tests reading an empty dict
+        """
+        self.assertEqual(self.items('{}'), [])
+        self.assertEqual(self.items(' { } '), [])
+
+    def test_lists(self):
+        """
+        Tests reading list values, which are returned one element at a time
+        """
+        self.assertEqual(self.items('{"a": [1, {"b": 2}], "c": []}'),
+            [('a', 1), ('a', {'b': 2}), ('c', None)])
+
+    def test_other_values(self):
+        """
+        Tests reading non-list values, which are returned whole
+        """
+        self.assertEqual(self.items('{"a": {"1": [2, 3]}, "b": "text", "c": 12345}'),
+            [('a', {'1': [2, 3]}), ('b', 'text'), ('c', 12345)])
+
+    def test_small_chunks(self):
+        """
+        Tests reading with a tiny chunk size, so that every value is split
+        across reads
+        """
+        data = {'systems': [{'sid': n, 'name': 'Sÿstem {}'.format(n)} for n in range(20)],
+            'count': 123456789, 'links': {'1': [2]}}
+        text = json.dumps(data, indent=2)
+        for chunk_size in [1, 2, 7]:
+            items = self.items(text, chunk_size=chunk_size)
+            self.assertEqual([record for (key, record) in items if key == 'systems'], data['systems'])
+            self.assertIn(('count', 123456789), items)
+            self.assertIn(('links', {'1': [2]}), items)
+
+    def test_every_chunk_size(self):
+        """
+        Tests reading documents full of numbers (and other scalars) with
+        every chunk size up to the whole document, so that a chunk boundary
+        falls everywhere, including in the middle of numbers which look
+        complete on their own (like the "1" of "1.5")
+        """
+        fixtures = [
+            '{"a": [1.5, 2.25, 3.125, 10.5]}',
+            '{"a": [-0.5, 1e10, 2.5E-3, -12, 0], "b": 3.75, "c": -1.0e+2}',
+            '{"x": 123.456, "y": [true, false, null, 7.0], "z": {"w": [0.1, 22]}}',
+            '{"a":[1.5,2],"b":10.25,"c":{"d":1.5e3}}',
+            ]
+        for text in fixtures:
+            expected = json.loads(text)
+            for chunk_size in range(1, len(text)+1):
+                items = self.items(text, chunk_size=chunk_size)
+                result = {}
+                for (key, value) in items:
+                    if isinstance(expected[key], list):
+                        result.setdefault(key, []).append(value)
+                    else:
+                        result[key] = value
+                self.assertEqual(result, expected, 'chunk size {}'.format(chunk_size))
+
+    def test_big_value(self):
+        """
+        Tests that a big single value gets decoded in a handful of attempts
+        as the buffer grows, rather than once per chunk
+        """
+        data = {'big': dict([(str(n), [n, n*1.5]) for n in range(5000)])}
+        text = json.dumps(data)
+        stream = JSONStream(io.StringIO(text), chunk_size=256)
+        attempts = []
+        decode = stream.decoder.raw_decode
+        def counting_decode(*args):
+            attempts.append(1)
+            return decode(*args)
+        stream.decoder.raw_decode = counting_decode
+        self.assertEqual(list(stream.items()), [('big', data['big'])])
+        self.assertLess(len(attempts), 20)
+
+    def test_empty_string(self):
+        """
+        Tests reading an empty document
+        """
+        with self.assertRaises(ValueError) as cm:
+            self.items('')
+
+    def test_not_dict(self):
+        """
+        Tests reading a document whose top level isn't a dict
+        """
+        with self.assertRaises(ValueError) as cm:
+            self.items('[1, 2]')
+
+    def test_truncated(self):
+        """
+        Tests reading a document which has been cut short
+        """
+        with self.assertRaises(ValueError) as cm:
+            self.items('{"a": [1, 2')
+        with self.assertRaises(ValueError) as cm:
+            self.items('{"a": [{"b": 1}')
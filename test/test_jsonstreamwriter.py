@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import io
+import json
+import unittest
+
+from uqm_map.jsonstream import JSONStream, JSONStreamWriter
+
+class JSONStreamWriterTests(unittest.TestCase):
+    """
+    Tests for our `JSONStreamWriter` class, which writes a top-level JSON
+    dict incrementally.
+    """
+
+    def test_empty_dict(self):
+        """
+        Tests writing a document with no keys
+        """
+        out = io.StringIO()
+        JSONStreamWriter(out).close()
+        self.assertEqual(out.getvalue(), '{}')
+
+    def test_matches_dumps(self):
+        """
+        Tests that the output is identical to `json.dumps`, across list
+        batches of various sizes
+        """
+        data = {'systems': [{'sid': n, 'name': 'Sÿstem {}'.format(n)} for n in range(25)],
+            'empty': [], 'links': {1: [2, 3]}, 'count': 12345}
+        for batch_size in [1, 7, 25, 1000]:
+            out = io.StringIO()
+            writer = JSONStreamWriter(out, batch_size=batch_size)
+            self.assertEqual(writer.write_list('systems', iter(data['systems'])), 25)
+            self.assertEqual(writer.write_list('empty', []), 0)
+            writer.write_value('links', data['links'])
+            writer.write_value('count', data['count'])
+            writer.close()
+            self.assertEqual(out.getvalue(), json.dumps(data))
+
+    def test_round_trip(self):
+        """
+        Tests reading our output back in with `JSONStream`
+        """
+        out = io.StringIO()
+        writer = JSONStreamWriter(out)
+        writer.write_list('planets', ({'pid': n} for n in range(3)))
+        writer.close()
+        out.seek(0)
+        self.assertEqual(list(JSONStream(out).items()),
+            [('planets', {'pid': 0}), ('planets', {'pid': 1}), ('planets', {'pid': 2})])
+
+    def test_write_after_close(self):
+        """
+        Tests that nothing can be written once the document is closed
+        """
+        writer = JSONStreamWriter(io.StringIO())
+        writer.close()
+        with self.assertRaises(ValueError):
+            writer.write_value('a', 1)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import time
+import random
+import unittest
+
+from uqm_map.data import Systems, Planet, MinData, SafetyAggFilter
+from uqm_map.mining import MiningOptimizer, knapsack, cheapest_insertion, restart_seeds, tour_length, \
+    build_tour
+from uqm_map.query import find_system
+
+class MiningOptimizerTests(unittest.TestCase):
+    """
+    Tests for our `MiningOptimizer` class, which plans cargo-constrained
+    mining runs.
+    """
+
+    def setUp(self):
+        """
+        Some vars we might need on (nearly) every test.  Our start system is
+        empty, and is surrounded by a few small systems close by plus a rich
+        one a long way off.
+        """
+        self.s = Systems()
+        self.start = self.add_system(1, 'Start', 5000, 5000, MinData())
+        self.exotic = self.add_system(2, 'Exotic', 5100, 5000, MinData(exotic=10), tectonics=6)
+        self.common = self.add_system(3, 'Common', 5000, 5200, MinData(common=100))
+        self.far = self.add_system(4, 'Far', 9000, 5000, MinData(exotic=1000))
+        self.base = self.add_system(5, 'Base', 4900, 5000, MinData(base=50))
+        self.s.process_aggregates()
+
+    def add_system(self, idnum, name, x, y, minerals, tectonics=1):
+        """
+        Adds a system with a single planet holding the given minerals
+        """
+        system = self.s.add_system(idnum, 'System', name, x, y, 'blue dwarf', '')
+        system.addplanet(Planet(idnum, name, 'Acid World', tectonics, 1, 100, 1, 0, 0, minerals))
+        return system
+
+    def test_candidates(self):
+        """
+        Tests that only systems we could reach, with minerals which fit in
+        our holds, are considered
+        """
+        o = MiningOptimizer(self.s, self.start, 60, 100)
+        self.assertEqual([c[0] for c in o.candidates], [self.exotic, self.base])
+        self.assertEqual(o.values, [250, 150])
+        self.assertEqual(o.weights, [10, 50])
+        o = MiningOptimizer(self.s, self.start, 1000, 100)
+        self.assertEqual([c[0] for c in o.candidates], [self.exotic, self.common, self.base])
+        o = MiningOptimizer(self.s, self.start, 1000, 100, round_trip=False)
+        self.assertEqual(len(o.candidates), 3)
+        o = MiningOptimizer(self.s, self.start, 10000, 800)
+        self.assertEqual(len(o.candidates), 4)
+
+    def test_candidates_filtered(self):
+        """
+        Tests that systems are valued by their filtered aggregates
+        """
+        f = SafetyAggFilter()
+        f.set_tectonics(4)
+        self.s.aggfilter.add(f)
+        self.s.process_aggregates()
+        o = MiningOptimizer(self.s, self.start, 1000, 100)
+        self.assertEqual([c[0] for c in o.candidates], [self.common, self.base])
+
+    def test_optimize_capacity(self):
+        """
+        Tests a plan where cargo space is what limits us
+        """
+        o = MiningOptimizer(self.s, self.start, 60, 100)
+        plan = o.optimize(restarts=5, time_limit=None)
+        self.assertEqual(set(plan.stops), set([self.exotic, self.base]))
+        self.assertEqual(plan.value, 400)
+        self.assertEqual(plan.weight, 60)
+        self.assertAlmostEqual(plan.distance, 40)
+
+    def test_optimize_budget(self):
+        """
+        Tests a plan where our travel budget is what limits us
+        """
+        o = MiningOptimizer(self.s, self.start, 1000, 30)
+        plan = o.optimize(restarts=5, time_limit=None)
+        self.assertEqual(plan.stops, [self.exotic])
+        self.assertEqual(plan.value, 250)
+        self.assertAlmostEqual(plan.distance, 20)
+
+    def test_optimize_one_way(self):
+        """
+        Tests a one-way plan, which can go twice as far out
+        """
+        o = MiningOptimizer(self.s, self.start, 1000, 30, round_trip=False)
+        plan = o.optimize(restarts=5, time_limit=None)
+        self.assertEqual(set(plan.stops), set([self.exotic, self.base]))
+        self.assertAlmostEqual(plan.distance, 30)
+
+    def test_optimize_nothing(self):
+        """
+        Tests a plan with nowhere worth going
+        """
+        o = MiningOptimizer(self.s, self.start, 1000, 5)
+        plan = o.optimize(restarts=1, time_limit=None)
+        self.assertEqual(plan.stops, [])
+        self.assertEqual(plan.value, 0)
+        self.assertEqual(plan.distance, 0)
+
+    def test_optimize_time_limit(self):
+        """
+        Tests a plan limited just by time.  With no time at all, we still get
+        a (useless but valid) plan.
+        """
+        o = MiningOptimizer(self.s, self.start, 60, 100)
+        plan = o.optimize(time_limit=1)
+        self.assertEqual(plan.value, 400)
+        plan = o.optimize(time_limit=0)
+        self.assertEqual(plan.stops, [])
+        self.assertEqual(plan.value, 0)
+
+    def test_optimize_time_limit_large(self):
+        """
+        Tests that the time limit cuts even the first restart short, on a
+        budget big enough to take in hundreds of systems
+        """
+        s = Systems.load_from_file()
+        budget = 20000
+        o = MiningOptimizer(s, find_system(s, 'Sol'), 100000, budget)
+        self.assertGreater(len(o.candidates), 400)
+        start = time.perf_counter()
+        plan = o.optimize(time_limit=0.2)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertGreater(plan.value, 0)
+        self.assertLessEqual(plan.weight, 100000)
+        self.assertLessEqual(plan.distance, budget)
+
+    def test_optimize_processes(self):
+        """
+        Tests that spreading restarts across processes gives the same plan
+        """
+        o = MiningOptimizer(self.s, self.start, 1000, 800)
+        serial = o.optimize(restarts=4, time_limit=None, seed=3)
+        pooled = o.optimize(restarts=4, time_limit=None, seed=3, processes=2)
+        self.assertEqual(serial.to_dict(), pooled.to_dict())
+
+    def test_optimize_no_limits(self):
+        """
+        Tests that we refuse to search forever
+        """
+        o = MiningOptimizer(self.s, self.start, 1000, 100)
+        with self.assertRaises(ValueError) as cm:
+            o.optimize(restarts=None, time_limit=None)
+        with self.assertRaises(ValueError) as cm:
+            o.optimize(restarts=0)
+
+    def test_to_dict(self):
+        """
+        Tests our JSON-friendly plan description
+        """
+        o = MiningOptimizer(self.s, self.start, 1000, 30)
+        info = o.optimize(restarts=1, time_limit=None).to_dict()
+        self.assertEqual(info, {'start': 'Start System', 'stops': ['Exotic System'],
+            'value': 250, 'weight': 10, 'distance': 20})
+
+    def test_knapsack(self):
+        """
+        Tests picking the most valuable load which fits
+        """
+        values = [60, 100, 120, 5]
+        weights = [10, 20, 30, 100]
+        self.assertEqual(knapsack([0, 1, 2, 3], values, weights, 50), [1, 2])
+        self.assertEqual(knapsack([0, 1, 2, 3], values, weights, 30), [0, 1])
+        self.assertEqual(knapsack([0, 3], values, weights, 5), [])
+        self.assertEqual(knapsack([], values, weights, 50), [])
+
+    def test_knapsack_deadline(self):
+        """
+        Tests that the knapsack falls back on a greedy pick once its deadline
+        has passed
+        """
+        values = [60, 100, 120, 10]
+        weights = [10, 20, 30, 40]
+        self.assertEqual(knapsack([0, 1, 2, 3], values, weights, 50, deadline=0), [0, 1])
+
+    def test_knapsack_scaled(self):
+        """
+        Tests that scaling down the knapsack table never picks a load which
+        doesn't really fit
+        """
+        values = [10, 10, 10]
+        weights = [34, 33, 33]
+        chosen = knapsack([0, 1, 2], values, weights, 99, cells=10)
+        self.assertLessEqual(sum([weights[idx] for idx in chosen]), 99)
+        self.assertEqual(len(chosen), 2)
+
+    def test_cheapest_insertion(self):
+        """
+        Tests finding where to put a new stop on a tour
+        """
+        points = [(1000, 0), (1000, 1000), (500, 0)]
+        self.assertEqual(cheapest_insertion((0, 0), points, [0, 1], 2), (0, 0))
+        (pos, delta) = cheapest_insertion((0, 0), points, [], 0)
+        self.assertEqual((pos, delta), (0, 200))
+        (pos, delta) = cheapest_insertion((0, 0), points, [], 0, round_trip=False)
+        self.assertEqual((pos, delta), (0, 100))
+        self.assertAlmostEqual(tour_length((0, 0), points, [2, 0, 1]), 200+100*2**0.5)
+        self.assertEqual(tour_length((0, 0), points, [2, 0, 1], round_trip=False), 200)
+
+    def test_build_tour(self):
+        """
+        Tests that keeping insertion costs up to date as the tour grows picks
+        the same tour as working them all out afresh each time
+        """
+        rng = random.Random(1)
+        start = (5000, 5000)
+        points = [(rng.uniform(4000, 6000), rng.uniform(4000, 6000)) for idx in range(40)]
+        values = [rng.randint(1, 100) for idx in range(40)]
+        weights = [rng.randint(1, 10) for idx in range(40)]
+        for round_trip in [True, False]:
+            tour = []
+            length = 0
+            remaining = set(range(40))
+            while True:
+                best = None
+                for idx in sorted(remaining):
+                    (pos, delta) = cheapest_insertion(start, points, tour, idx, round_trip)
+                    if sum([weights[i] for i in tour]) + weights[idx] <= 100 and length + delta <= 800:
+                        score = values[idx]/(delta+1)
+                        if best is None or score > best[0]:
+                            best = (score, idx, pos, delta)
+                if best is None:
+                    break
+                tour.insert(best[2], best[1])
+                length += best[3]
+                remaining.discard(best[1])
+            (built, built_length) = build_tour(start, points, values, weights, 100, 800, round_trip)
+            self.assertGreater(len(built), 5)
+            self.assertEqual(built, tour)
+            self.assertAlmostEqual(built_length, tour_length(start, points, built, round_trip))
+
+    def test_restart_seeds(self):
+        """
+        Tests sharing restarts out between workers
+        """
+        self.assertEqual(list(restart_seeds(0, 1, 3)), [0, 1, 2])
+        self.assertEqual(list(restart_seeds(0, 2, 5, seed=1)), [0, 1000005, 1000007])
+        self.assertEqual(list(restart_seeds(1, 2, 5, seed=1)), [1000004, 1000006])
+        self.assertEqual(list(restart_seeds(3, 4, 2)), [])
@@ -20,7 +20,7 @@
 
 import unittest
 
-from uqm_map.data import NameDispFilter, System, Quasispace
+from uqm_map.data import NameDispFilter, System, Systems, Quasispace
 
 class NameDispFilterTests(unittest.TestCase):
     """
@@ -149,3 +149,48 @@ class NameDispFilterTests(unittest.TestCase):
         q = Quasispace(5000, 5000, 5000, 5000, 'C')
         ndf = NameDispFilter('Quasispace Exit F', True)
         self.assertEqual(ndf.approve(q), False)
+
+    def test_predicate(self):
+        """
+        Tests using our standalone predicate function, with and without
+        the extra text being checked
+        """
+        system = System(1, 'System Name', 'Alpha', 5000, 5000, 'blue dwarf', 'Homeworld')
+        self.assertEqual(NameDispFilter('alpha', False).predicate()(system), True)
+        self.assertEqual(NameDispFilter('home', False).predicate()(system), False)
+        self.assertEqual(NameDispFilter('home', True).predicate()(system), True)
+
+    def test_prepare(self):
+        """
+        Tests matching after being prepared with a `Systems` object, so
+        that our matches come from the name index
+        """
+        s = Systems()
+        sys1 = s.add_system(1, 'Serpentis', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys2 = s.add_system(2, 'Serpentis', 'Beta', 5000, 5000, 'blue dwarf', 'Homeworld')
+        sys3 = s.add_system(3, 'Vulpeculae', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        quasi = s.add_quasi(4900, 4900, 3000, 3000, 'C')
+        ndf = NameDispFilter('Serpentis', False)
+        ndf.prepare(s)
+        self.assertEqual(ndf.matches, set([sys1, sys2]))
+        self.assertEqual(ndf.approve(sys1), True)
+        self.assertEqual(ndf.approve(sys3), False)
+        ndf = NameDispFilter('home', True)
+        ndf.prepare(s)
+        self.assertEqual(ndf.matches, set([sys2]))
+        ndf = NameDispFilter('exit c', False)
+        ndf.prepare(s)
+        self.assertEqual(ndf.matches, set([quasi]))
+        self.assertEqual(ndf.approve(quasi), True)
+
+    def test_system_mask(self):
+        """
+        Tests getting a bitset of matching systems
+        """
+        s = Systems()
+        s.add_system(1, 'Serpentis', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        s.add_system(2, 'Serpentis', 'Beta', 5000, 5000, 'blue dwarf', 'Homeworld')
+        s.add_system(3, 'Vulpeculae', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.assertEqual(NameDispFilter('alpha', False).system_mask(s), 0b101)
+        self.assertEqual(NameDispFilter('home', False).system_mask(s), 0)
+        self.assertEqual(NameDispFilter('home', True).system_mask(s), 0b010)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+from uqm_map.index import NameIndex
+
+class NameIndexTests(unittest.TestCase):
+    """
+    Tests for our `NameIndex` class, an inverted n-gram index used to
+    speed up system name searches.
+    """
+
+    def setUp(self):
+        """
+        Some vars we might need on (nearly) every test
+        """
+        self.i = NameIndex()
+        self.i.add(0, 'Alpha Serpentis', '')
+        self.i.add(1, 'Beta Serpentis', 'Ur-Quan Homeworld')
+        self.i.add(2, 'Alpha Vulpeculae', 'Orz Homeworld')
+        self.i.add(3, 'Sol', 'Earth')
+
+    def test_init(self):
+        """
+        Tests our basic initialization routine
+        """
+        i = NameIndex()
+        self.assertEqual(len(i), 0)
+        self.assertEqual(i.n, 3)
+        self.assertEqual(i.search('alpha'), set())
+
+    def test_grams(self):
+        """
+        Tests splitting text into n-grams
+        """
+        self.assertEqual(self.i.grams('sol'), set(['sol']))
+        self.assertEqual(self.i.grams('alpha'), set(['alp', 'lph', 'pha']))
+        self.assertEqual(self.i.grams('al'), set())
+
+    def test_add(self):
+        """
+        Tests adding entries to the index
+        """
+        self.assertEqual(len(self.i), 4)
+        self.assertEqual(self.i.fullname_grams['alp'], set([0, 2]))
+        self.assertEqual(self.i.extra_grams['hom'], set([1, 2]))
+
+    def test_search(self):
+        """
+        Tests searching for names
+        """
+        self.assertEqual(self.i.search('serpentis'), set([0, 1]))
+        self.assertEqual(self.i.search('SERPENTIS'), set([0, 1]))
+        self.assertEqual(self.i.search('alpha s'), set([0]))
+        self.assertEqual(self.i.search('homeworld'), set())
+        self.assertEqual(self.i.search('ptolemae'), set())
+
+    def test_search_extra(self):
+        """
+        Tests searching for names, including the extra text
+        """
+        self.assertEqual(self.i.search('homeworld', True), set([1, 2]))
+        self.assertEqual(self.i.search('sol', True), set([3]))
+        self.assertEqual(self.i.search('alpha', True), set([0, 2]))
+
+    def test_search_short(self):
+        """
+        Tests searching for strings shorter than our n-grams
+        """
+        self.assertEqual(self.i.search('so'), set([3]))
+        self.assertEqual(self.i.search('ea', True), set([3]))
+        self.assertEqual(self.i.search(''), set([0, 1, 2, 3]))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+from uqm_map.data import PlanetColumns, PlanetView, Planet, MinData, and_masks
+
+class PlanetColumnsTests(unittest.TestCase):
+    """
+    Tests for our `PlanetColumns` class, which stores planet data in
+    columnar form, and the `PlanetView` objects which read from it.
+    """
+
+    def setUp(self):
+        """
+        Some vars we might need on (nearly) every test
+        """
+        self.c = PlanetColumns()
+
+    def test_init(self):
+        """
+        Tests our basic initialization routine
+        """
+        self.assertEqual(len(self.c), 0)
+        self.assertEqual(self.c.num_systems(), 0)
+        self.assertEqual(list(self.c.system_offsets), [0])
+        self.assertEqual(sorted(self.c.minerals.keys()), sorted(MinData.min_vals))
+
+    def test_add_planet(self):
+        """
+        Tests adding a single planet
+        """
+        row = self.c.add_planet(1, 'Planet I', 'Acid World', 2, 3, 400, 1, 100, 50,
+            (1, 2, 3, 4, 5, 6, 7, 8))
+        self.assertEqual(row, 0)
+        self.assertEqual(len(self.c), 1)
+        self.assertEqual(self.c.tectonics[0], 2)
+        self.assertEqual(self.c.weather[0], 3)
+        self.assertEqual(self.c.temp[0], 400)
+        self.assertEqual(self.c.gravity[0], 1)
+        self.assertEqual(self.c.bio[0], 100)
+        self.assertEqual(self.c.bio_danger[0], 50)
+        self.assertEqual(self.c.minerals['common'][0], 1)
+        self.assertEqual(self.c.minerals['exotic'][0], 8)
+
+    def test_system_ranges(self):
+        """
+        Tests splitting planets up into per-system ranges, including a
+        system with no planets at all.
+        """
+        self.c.add_planet(1, 'Planet I', 'Acid World', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.c.add_planet(2, 'Planet II', 'Acid World', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.assertEqual(self.c.end_system(), 0)
+        self.assertEqual(self.c.end_system(), 1)
+        self.c.add_planet(3, 'Planet I', 'Acid World', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.assertEqual(self.c.end_system(), 2)
+        self.assertEqual(self.c.num_systems(), 3)
+        self.assertEqual(list(self.c.rows(0)), [0, 1])
+        self.assertEqual(list(self.c.rows(1)), [])
+        self.assertEqual(list(self.c.rows(2)), [2])
+        self.assertEqual([p.idnum for p in self.c.planets(0)], [1, 2])
+        self.assertEqual(self.c.planets(1), [])
+
+    def test_mineral(self):
+        """
+        Tests getting a `MinData` object back out of a row
+        """
+        self.c.add_planet(1, 'Planet I', 'Acid World', 1, 1, 100, 1, 0, 0, (1, 2, 3, 4, 5, 6, 7, 8))
+        m = self.c.mineral(0)
+        self.assertEqual(m.common, 1)
+        self.assertEqual(m.corrosive, 2)
+        self.assertEqual(m.base, 3)
+        self.assertEqual(m.noble, 4)
+        self.assertEqual(m.rare, 5)
+        self.assertEqual(m.precious, 6)
+        self.assertEqual(m.radioactive, 7)
+        self.assertEqual(m.exotic, 8)
+
+    def test_view(self):
+        """
+        Tests reading a planet through a `PlanetView`
+        """
+        self.c.add_planet(5, 'Planet I', 'Type', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.c.add_planet(6, 'Planet II', 'Acid World', 2, 3, 400, 1, 100, 50, (0, 0, 3, 0, 0, 0, 0, 1))
+        p = PlanetView(self.c, 1)
+        self.assertEqual(p.idnum, 6)
+        self.assertEqual(p.name, 'Planet II')
+        self.assertEqual(p.ptype, 'Acid World')
+        self.assertEqual(p.tectonics, 2)
+        self.assertEqual(p.weather, 3)
+        self.assertEqual(p.temp, 400)
+        self.assertEqual(p.gravity, 1)
+        self.assertEqual(p.bio, 100)
+        self.assertEqual(p.bio_danger, 50)
+        self.assertEqual(p.mineral.value(), 34)
+
+    def test_materialize(self):
+        """
+        Tests building standalone `Planet` objects for a system
+        """
+        self.c.add_planet(5, 'Planet I', 'Type', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.c.end_system()
+        self.c.add_planet(6, 'Planet II', 'Acid World', 2, 3, 400, 1, 100, 50, (0, 0, 3, 0, 0, 0, 0, 1))
+        self.c.end_system()
+        planets = self.c.materialize(1)
+        self.assertEqual(len(planets), 1)
+        p = planets[0]
+        self.assertIsInstance(p, Planet)
+        self.assertEqual(p.idnum, 6)
+        self.assertEqual(p.name, 'Planet II')
+        self.assertEqual(p.ptype, 'Acid World')
+        self.assertEqual((p.tectonics, p.weather, p.temp, p.gravity), (2, 3, 400, 1))
+        self.assertEqual((p.bio, p.bio_danger), (100, 50))
+        self.assertEqual(p.mineral.value(), 34)
+
+    def test_group_sums(self):
+        """
+        Tests summing a column up per-system, with and without a mask
+        """
+        self.c.add_planet(1, 'Planet I', 'Acid World', 1, 1, 100, 1, 10, 0, (0,)*8)
+        self.c.add_planet(2, 'Planet II', 'Acid World', 1, 1, 100, 1, 20, 0, (0,)*8)
+        self.c.end_system()
+        self.c.end_system()
+        self.c.add_planet(3, 'Planet I', 'Acid World', 1, 1, 100, 1, 40, 0, (0,)*8)
+        self.c.end_system()
+        self.assertEqual(self.c.group_sums(self.c.bio), [30, 0, 40])
+        self.assertEqual(self.c.group_sums(self.c.bio, b'\x00\x01\x01'), [20, 0, 40])
+        self.assertEqual(self.c.group_sums(self.c.bio, b'\x00\x00\x00'), [0, 0, 0])
+
+    def test_aggregate(self):
+        """
+        Tests computing all our aggregates at once
+        """
+        self.c.add_planet(1, 'Planet I', 'Acid World', 1, 1, 100, 1, 10, 5, (0, 0, 3, 0, 0, 0, 0, 0))
+        self.c.add_planet(2, 'Planet II', 'Acid World', 1, 1, 100, 1, 15, 10, (0, 0, 1, 0, 0, 0, 5, 0))
+        self.c.end_system()
+        sums = self.c.aggregate()
+        self.assertEqual(sums['bio'], [25])
+        self.assertEqual(sums['bio_danger'], [15])
+        self.assertEqual(sums['base'], [4])
+        self.assertEqual(sums['radioactive'], [5])
+        self.assertEqual(sums['value'], [52])
+        sums = self.c.aggregate(b'\x01\x00')
+        self.assertEqual(sums['bio'], [10])
+        self.assertEqual(sums['value'], [9])
+
+    def test_aggregate_systems(self):
+        """
+        Tests computing sums for just a few systems, which should match
+        the full aggregates
+        """
+        self.c.add_planet(1, 'Planet I', 'Type', 1, 1, 100, 1, 10, 5, (1, 0, 0, 0, 0, 0, 0, 1))
+        self.c.end_system()
+        self.c.add_planet(2, 'Planet I', 'Type', 1, 1, 100, 1, 20, 0, (0, 2, 0, 0, 0, 0, 0, 0))
+        self.c.add_planet(3, 'Planet II', 'Type', 5, 1, 100, 1, 30, 0, (0, 0, 3, 0, 0, 0, 0, 0))
+        self.c.end_system()
+        full = self.c.aggregate()
+        sums = self.c.aggregate_systems([1])
+        for col in full.keys():
+            self.assertEqual(sums[col], {1: full[col][1]})
+        sums = self.c.aggregate_systems([0, 1], lambda row: self.c.tectonics[row] < 5)
+        self.assertEqual(sums['bio'], {0: 10, 1: 20})
+        self.assertEqual(sums['value'], {0: 26, 1: 4})
+
+    def test_and_masks(self):
+        """
+        Tests combining two masks
+        """
+        self.assertEqual(and_masks(None, None), None)
+        self.assertEqual(and_masks(b'\x01\x00', None), b'\x01\x00')
+        self.assertEqual(and_masks(None, b'\x01\x00'), b'\x01\x00')
+        self.assertEqual(and_masks(b'\x01\x01\x00', b'\x00\x01\x00'), b'\x00\x01\x00')
+        self.assertEqual(and_masks(b'', b''), b'')
+
+    def test_sorted_rows(self):
+        """
+        Tests getting a sorted ordering of a column
+        """
+        for (idx, temp) in enumerate([300, -20, 100, 100]):
+            self.c.add_planet(idx, 'Planet', 'Acid World', 1, 1, temp, 1, 0, 0, (0,)*8)
+        self.c.end_system()
+        (values, rows) = self.c.sorted_rows('temp')
+        self.assertEqual(list(values), [-20, 100, 100, 300])
+        self.assertEqual(list(rows), [1, 2, 3, 0])
+        self.assertIs(self.c.sorted_rows('temp')[0], values)
+        self.c.add_planet(5, 'Planet', 'Acid World', 1, 1, 0, 1, 0, 0, (0,)*8)
+        self.assertEqual(list(self.c.sorted_rows('temp')[1]), [1, 4, 2, 3, 0])
+
+    def test_row_system(self):
+        """
+        Tests finding which system a row belongs to
+        """
+        self.c.add_planet(1, 'Planet I', 'Acid World', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.c.add_planet(2, 'Planet II', 'Acid World', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.c.end_system()
+        self.c.end_system()
+        self.c.add_planet(3, 'Planet I', 'Acid World', 1, 1, 100, 1, 0, 0, (0,)*8)
+        self.c.end_system()
+        self.assertEqual(self.c.row_system(0), 0)
+        self.assertEqual(self.c.row_system(1), 0)
+        self.assertEqual(self.c.row_system(2), 2)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import io
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+from uqm_map.planetinfo import PlanetInfoParser, resolve_constellations, build_data, convert, quasispace, \
+    split_chunks, parse_chunk, parse_file
+
+dump = """System\tAlpha Serpentis\t(5007, 35)\tgreen dwarf\t
+Planet\tPlanet I\tAcid World
+          Tectonics:  2
+          Weather:    2
+          Gravity:    28
+          Temp:       78
+          Bio: 0\tMin: 165
+          Dangerous Bio: 0
+          Common Minerals: 165
+          Corrosive Minerals: 0
+          Base Metal Minerals: 0
+          Noble Gas Minerals: 0
+          Rare Earth Minerals: 0
+          Precious Minerals: 0
+          Radioactive Minerals: 0
+          Exotic Minerals: 0
+Moon\tMoon a\tSelenic World
+          Weather:    0
+          Bio: 12\tMin: 40
+          Dangerous Bio: 3
+          Exotic Minerals: 40
+System\tBeta Serpentis\t(5100, 200)\tred giant\tMelnorme trader #0
+Planet\tPlanet I\tSlave-shielded Planet
+          NoScan
+Moon\tMoon a\tStarbase
+          NoAttr
+System\tSol\t(1752, 1450)\tyellow dwarf\t
+Planet\tPlanet III\tWater World
+          Tectonics:  0
+"""
+
+constellations = """[Serpentis]
+Alpha = Beta,Gamma
+Delta = Beta
+"""
+
+class PlanetInfoParserTests(unittest.TestCase):
+    """
+    Tests for parsing `PlanetInfo` dumps
+    """
+
+    def records(self, text=dump, **kwargs):
+        """
+        Returns the list of records parsed from the given dump text
+        """
+        return list(PlanetInfoParser(io.StringIO(text), **kwargs).records())
+
+    def test_record_order(self):
+        """
+        Tests that systems and planets are returned in the dump's order
+        """
+        self.assertEqual([kind for (kind, record) in self.records()],
+            ['system', 'planet', 'planet', 'system', 'planet', 'planet', 'system', 'planet'])
+
+    def test_system(self):
+        """
+        Tests parsing a system line, including splitting off its position
+        """
+        system = self.records()[0][1]
+        self.assertEqual(system, {'sid': 1, 'name': 'Serpentis', 'position': 'Alpha',
+            'x': 5007, 'y': 35, 'stype': 'green dwarf', 'extra': ''})
+
+    def test_system_no_position(self):
+        """
+        Tests parsing a system without a position
+        """
+        system = self.records()[6][1]
+        self.assertEqual(system['name'], 'Sol')
+        self.assertEqual(system['position'], '')
+
+    def test_system_extra_number(self):
+        """
+        Tests that numbered extras are renumbered to start from one
+        """
+        system = self.records()[3][1]
+        self.assertEqual(system['extra'], 'Melnorme trader #1')
+
+    def test_planet(self):
+        """
+        Tests parsing a fully-scanned planet
+        """
+        planet = self.records()[1][1]
+        self.assertEqual(planet, {'pid': 1, 'sid': 1, 'pname': 'Planet I', 'ptype': 'Acid World',
+            'tectonics': 3, 'weather': 3, 'temp': 78, 'gravity': 28, 'bio': 0, 'bio_danger': 0,
+            'mineral': 165, 'min_common': 165, 'min_corrosive': 0, 'min_base': 0, 'min_noble': 0,
+            'min_rare': 0, 'min_precious': 0, 'min_radio': 0, 'min_exotic': 0})
+
+    def test_moon(self):
+        """
+        Tests that moons are named after their planet, and that missing
+        attributes default to zero
+        """
+        moon = self.records()[2][1]
+        self.assertEqual(moon['pname'], 'Planet I Moon a')
+        self.assertEqual(moon['sid'], 1)
+        self.assertEqual(moon['weather'], 0)
+        self.assertEqual(moon['tectonics'], 0)
+        self.assertEqual(moon['bio'], 12)
+        self.assertEqual(moon['bio_danger'], 3)
+        self.assertEqual(moon['mineral'], 40)
+        self.assertEqual(moon['min_exotic'], 40)
+
+    def test_unusual_attrs(self):
+        """
+        Tests attribute lines which don't look quite like the ones our
+        patched UQM writes out
+        """
+        text = '\n'.join([
+            'System\tSol\t(1752, 1450)\tyellow dwarf\t',
+            'Planet\tPlanet III\tWater World',
+            '   Weather: 3 (heavy)',
+            '   Temp: 12.7',
+            '   Bio:  5    Min:  7',
+            '   AxialTilt: 12  Gravity:  44',
+            '   Exotic Minerals: 2',
+            ])
+        planet = self.records(text)[1][1]
+        self.assertEqual(planet['weather'], 4)
+        self.assertEqual(planet['temp'], 12)
+        self.assertEqual(planet['bio'], 5)
+        self.assertEqual(planet['mineral'], 7)
+        self.assertEqual(planet['gravity'], 44)
+        self.assertEqual(planet['min_exotic'], 2)
+
+    def test_unscannable(self):
+        """
+        Tests worlds which have no attributes
+        """
+        records = self.records()
+        self.assertEqual(records[4][1]['ptype'], 'Slave-shielded Planet')
+        self.assertEqual(records[4][1]['mineral'], 0)
+        self.assertEqual(records[5][1]['pname'], 'Planet I Moon a')
+        self.assertEqual(records[5][1]['sid'], 2)
+
+    def test_truncated_planet(self):
+        """
+        Tests that a planet cut off by the end of the dump is still returned
+        """
+        planet = self.records()[7][1]
+        self.assertEqual(planet['pname'], 'Planet III')
+        self.assertEqual(planet['sid'], 3)
+        self.assertEqual(planet['tectonics'], 1)
+
+    def test_first_ids(self):
+        """
+        Tests starting the ID numbering somewhere other than one
+        """
+        records = self.records(first_sid=10, first_pid=100)
+        self.assertEqual([r['sid'] for (kind, r) in records if kind == 'system'], [10, 11, 12])
+        self.assertEqual([r['pid'] for (kind, r) in records if kind == 'planet'], [100, 101, 102, 103, 104])
+        self.assertEqual(records[7][1]['sid'], 12)
+
+    def test_moon_in_new_system(self):
+        """
+        Tests that a moon never takes its name from another system's planet
+        """
+        records = self.records(dump + 'System\tSol\t(1, 2)\tyellow dwarf\t\nMoon\tMoon a\tStarbase\n          NoAttr\n')
+        self.assertEqual(records[-1][1]['pname'], ' Moon a')
+
+    def test_planet_before_system(self):
+        """
+        Tests that a planet without a system is an error
+        """
+        with self.assertRaises(ValueError):
+            self.records('Planet\tPlanet I\tWater World\n')
+
+class PlanetInfoConvertTests(unittest.TestCase):
+    """
+    Tests for turning `PlanetInfo` dumps into a datafile
+    """
+
+    def setUp(self):
+        """
+        Writes our constellation file out to a temporary directory
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.constellation_file = os.path.join(self.tmpdir, 'constellations.ini')
+        with open(self.constellation_file, 'w') as df:
+            df.write(constellations)
+
+    def tearDown(self):
+        """
+        Cleans up our temporary directory
+        """
+        shutil.rmtree(self.tmpdir)
+
+    def test_resolve_constellations(self):
+        """
+        Tests resolving constellation links, with warnings for unknown stars
+        """
+        systems = [
+            {'sid': 1, 'name': 'Serpentis', 'position': 'Alpha'},
+            {'sid': 2, 'name': 'Serpentis', 'position': 'Beta'},
+            {'sid': 3, 'name': 'Sol', 'position': ''},
+            ]
+        (links, warnings) = resolve_constellations(systems, self.constellation_file)
+        self.assertEqual(links, {1: [2]})
+        self.assertEqual(warnings, ['No ID for link gamma serpentis!',
+            'No ID for starting point delta serpentis!'])
+
+    def write_dump(self, copies=1):
+        """
+        Writes our dump out (repeated `copies` times) to a temporary file,
+        returning its path
+        """
+        planetinfo_file = os.path.join(self.tmpdir, 'PlanetInfo')
+        with open(planetinfo_file, 'w') as df:
+            df.write(dump * copies)
+        return planetinfo_file
+
+    def test_split_chunks(self):
+        """
+        Tests splitting a dump into chunks on system boundaries
+        """
+        planetinfo_file = self.write_dump(4)
+        with open(planetinfo_file, 'rb') as df:
+            data = df.read()
+        for count in [1, 2, 5, 12, 100]:
+            ranges = split_chunks(planetinfo_file, count)
+            self.assertLessEqual(len(ranges), count)
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], len(data))
+            for ((start, end), (next_start, next_end)) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, next_start)
+                self.assertTrue(data[next_start:].startswith(b'System\t'))
+        self.assertEqual(len(split_chunks(planetinfo_file, 2)), 2)
+
+    def test_parse_chunk(self):
+        """
+        Tests that chunks are numbered from zero
+        """
+        planetinfo_file = self.write_dump(2)
+        ranges = split_chunks(planetinfo_file, 2)
+        self.assertEqual(len(ranges), 2)
+        counts = [0, 0]
+        for (start, end) in ranges:
+            (systems, planets) = parse_chunk(planetinfo_file, start, end)
+            self.assertEqual([system['sid'] for system in systems], list(range(len(systems))))
+            self.assertEqual([planet['pid'] for planet in planets], list(range(len(planets))))
+            counts[0] += len(systems)
+            counts[1] += len(planets)
+        self.assertEqual(counts, [6, 10])
+
+    def test_parse_file_parallel(self):
+        """
+        Tests that parsing in chunks across several processes gives the same
+        results as parsing serially
+        """
+        planetinfo_file = self.write_dump(10)
+        serial = parse_file(planetinfo_file, processes=1, first_sid=5, first_pid=7)
+        parallel = parse_file(planetinfo_file, processes=2, first_sid=5, first_pid=7, min_chunk_size=100)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(len(serial[0]), 30)
+        self.assertEqual(len(serial[1]), 50)
+        self.assertEqual(serial[0][-1]['sid'], 34)
+        self.assertEqual(serial[1][-1]['pid'], 56)
+        self.assertEqual(serial[1][-1]['sid'], 34)
+
+    def test_build_data(self):
+        """
+        Tests building a full data dict
+        """
+        (data, warnings) = build_data(io.StringIO(dump), self.constellation_file)
+        self.assertEqual(len(data['systems']), 3)
+        self.assertEqual(len(data['planets']), 5)
+        self.assertEqual(data['quasispace'], quasispace)
+        self.assertEqual(data['constellations'], {1: [2]})
+        self.assertEqual(data['derived']['systems'], 3)
+        self.assertEqual(data['derived']['connections'], [[1, 2]])
+        self.assertEqual(len(warnings), 2)
+
+    def test_convert(self):
+        """
+        Tests converting a dump straight to a loadable JSON datafile
+        """
+        from uqm_map.data import Systems
+        planetinfo_file = self.write_dump()
+        json_file = os.path.join(self.tmpdir, 'uqm.json.gz')
+        warnings = convert(planetinfo_file, json_file, self.constellation_file)
+        self.assertEqual(len(warnings), 2)
+        with gzip.open(json_file, 'rt') as df:
+            data = json.load(df)
+        self.assertEqual(data['constellations'], {'1': [2]})
+        systems = Systems.load_from_file(json_file)
+        self.assertEqual(len(systems.system_list), 3)
+        self.assertEqual(systems.systems[1].planets[1].name, 'Planet I Moon a')
+
+    def test_convert_matches_build_data(self):
+        """
+        Tests that the streamed datafile holds the same data as `build_data`
+        builds in memory, whatever the batch size
+        """
+        planetinfo_file = self.write_dump()
+        with open(planetinfo_file, 'r', encoding='utf-8') as df:
+            (expected, warnings) = build_data(df, self.constellation_file)
+        expected = json.loads(json.dumps(expected))
+        for batch_size in [1, 1000]:
+            json_file = os.path.join(self.tmpdir, 'uqm-{}.json.gz'.format(batch_size))
+            convert(planetinfo_file, json_file, self.constellation_file, processes=1,
+                batch_size=batch_size)
+            with gzip.open(json_file, 'rt') as df:
+                self.assertEqual(json.load(df), expected)
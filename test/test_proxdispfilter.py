@@ -20,7 +20,7 @@
 
 import unittest
 
-from uqm_map.data import ProxDispFilter, System, Quasispace
+from uqm_map.data import ProxDispFilter, System, Systems, Quasispace
 
 class ProxDispFilterTests(unittest.TestCase):
     """
@@ -106,3 +106,45 @@ class ProxDispFilterTests(unittest.TestCase):
         """
         quasi_far = Quasispace(1000, 1000, 4000, 4000, 'F')
         self.assertEqual(self.qpdf.approve(quasi_far), False)
+
+    def test_prepare(self):
+        """
+        Test matching after being prepared with a `Systems` object, so
+        that our matches come from the spatial index
+        """
+        s = Systems()
+        center = s.add_system(1, 'Center', 'Alpha', 5000, 5000, 'white dwarf', '')
+        close = s.add_system(2, 'Close', 'Alpha', 5100, 5100, 'red dwarf', '')
+        far = s.add_system(3, 'Far', 'Alpha', 9000, 9000, 'blue dwarf', '')
+        quasi = s.add_quasi(4900, 4900, 3000, 3000, 'C')
+        pdf = ProxDispFilter(center, 100)
+        pdf.prepare(s)
+        self.assertEqual(pdf.matches, set([center, close, quasi]))
+        self.assertEqual(pdf.approve(center), True)
+        self.assertEqual(pdf.approve(close), True)
+        self.assertEqual(pdf.approve(quasi), True)
+        self.assertEqual(pdf.approve(far), False)
+
+    def test_prepare_no_system(self):
+        """
+        Test preparing a filter which doesn't have a system set
+        """
+        s = Systems()
+        center = s.add_system(1, 'Center', 'Alpha', 5000, 5000, 'white dwarf', '')
+        pdf = ProxDispFilter(None, 100)
+        pdf.prepare(s)
+        self.assertEqual(pdf.approve(center), False)
+
+    def test_system_mask(self):
+        """
+        Tests getting a bitset of matching systems.  Quasispace exits
+        aren't part of the bitset.
+        """
+        s = Systems()
+        center = s.add_system(1, 'Center', 'Alpha', 5000, 5000, 'white dwarf', '')
+        s.add_system(2, 'Far', 'Alpha', 9000, 9000, 'blue dwarf', '')
+        s.add_system(3, 'Close', 'Alpha', 5100, 5100, 'red dwarf', '')
+        s.add_quasi(4900, 4900, 3000, 3000, 'C')
+        self.assertEqual(ProxDispFilter(center, 100).system_mask(s), 0b101)
+        self.assertEqual(ProxDispFilter(center, 1000).system_mask(s), 0b111)
+        self.assertEqual(ProxDispFilter(None, 100).system_mask(s), 0)
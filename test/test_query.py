@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import io
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+from uqm_map.data import Systems, NameDispFilter, ProxDispFilter, SafetyAggFilter
+from uqm_map import query
+
+base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+class QueryTests(unittest.TestCase):
+    """
+    Tests for our headless query functions
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Loads our main datafile just once, since queries don't modify it
+        """
+        cls.s = Systems.load_from_file(lazy=True)
+
+    def test_parse_limit(self):
+        """
+        Tests parsing the various forms of safety limits
+        """
+        self.assertEqual(query.parse_limit(4), (4, True))
+        self.assertEqual(query.parse_limit([4, False]), (4, False))
+        self.assertEqual(query.parse_limit('4'), (4, True))
+        self.assertEqual(query.parse_limit('<=4'), (4, True))
+        self.assertEqual(query.parse_limit('>= 4'), (4, False))
+        with self.assertRaises(ValueError) as cm:
+            query.parse_limit('lots')
+
+    def test_find_system(self):
+        """
+        Tests finding systems by name
+        """
+        self.assertEqual(query.find_system(self.s, 'sol').fullname, 'Sol')
+        self.assertEqual(query.find_system(self.s, 'Alpha Centauri').idnum, 2165)
+        self.assertEqual(query.find_system(self.s, 'A').label, 'A')
+        with self.assertRaises(ValueError) as cm:
+            query.find_system(self.s, 'Nowhere')
+
+    def test_build_filters_unknown_key(self):
+        """
+        Tests building filters from a spec with a key we don't know about
+        """
+        with self.assertRaises(ValueError) as cm:
+            query.build_filters(self.s, {'nmae': 'sol'})
+        self.assertIn('nmae', str(cm.exception))
+
+    def test_build_filters_no_safety(self):
+        """
+        Tests that no aggregate filter is used unless a limit is given
+        """
+        (dispfilter, aggfilter) = query.build_filters(self.s, {'name': 'sol'})
+        self.assertEqual(len(dispfilter.filters), 1)
+        self.assertFalse(aggfilter.filtering())
+
+    def test_unknown_sort(self):
+        """
+        Tests running a query with an unknown sort
+        """
+        with self.assertRaises(ValueError) as cm:
+            query.run_query(self.s, {'sort': 'size'})
+
+    def test_validate_spec(self):
+        """
+        Tests checking query specs for values of the wrong type or range
+        """
+        query.validate_spec({})
+        query.validate_spec({'id': [1], 'near': 'Sol', 'radius': 50.5, 'type': 'Water',
+            'name': 'a', 'extra': True, 'constellation': 'Sol', 'tectonics': '>=4',
+            'weather': [2, False], 'temp': 100, 'bio': None, 'sort': 'name', 'limit': 0})
+        query.validate_spec({'near': 'Sol', 'radius': float('inf')})
+        for spec in [[], {'nmae': 'sol'}, {'name': 5}, {'near': 5}, {'type': ['Water']},
+                {'constellation': {'a': 1}}, {'radius': 'far'}, {'radius': -1},
+                {'radius': float('nan')}, {'radius': True}, {'extra': 'yes'},
+                {'tectonics': 'lots'}, {'temp': {}}, {'bio': [1, 2, 3]},
+                {'sort': 'size'}, {'sort': ['value']}, {'limit': -1}, {'limit': 1.5},
+                {'limit': '5'}, {'limit': False}]:
+            with self.assertRaises(ValueError, msg=repr(spec)) as cm:
+                query.validate_spec(spec)
+
+    def test_run_query_invalid(self):
+        """
+        Tests that running a query with a badly-typed spec raises a
+        `ValueError` rather than anything else
+        """
+        for spec in [{'name': 5}, {'near': 5}, {'constellation': ['Sol']}, {'limit': -1}]:
+            with self.assertRaises(ValueError) as cm:
+                query.run_query(self.s, spec)
+
+    def test_run_query_null_defaults(self):
+        """
+        Tests that optional keys set to null get their defaults
+        """
+        self.assertEqual(query.run_query(self.s, {'near': 'Sol', 'radius': None, 'extra': None,
+                'sort': None, 'limit': None, 'tectonics': None}),
+            query.run_query(self.s, {'near': 'Sol'}))
+        self.assertEqual(query.run_query(self.s, {'near': 'Sol', 'radius': None}),
+            query.run_query(self.s, {'near': 'Sol', 'radius': 100}))
+
+    def test_prepare_systems(self):
+        """
+        Tests building everything a query needs up front
+        """
+        s = Systems.load_from_file(lazy=True)
+        self.assertIs(query.prepare_systems(s), s)
+        self.assertIsNotNone(s.columns)
+        self.assertIsNotNone(s.full_sums)
+        self.assertIsNotNone(s.types)
+        self.assertIsNotNone(s.name_index)
+        self.assertEqual(set(s.constellation_masks.keys()), s.constellation_names)
+
+    def test_run_query_matches_gui(self):
+        """
+        Makes sure that query results match what the GUI would highlight and
+        show, for both broad and narrow queries.
+        """
+        s = Systems.load_from_file()
+        sol = query.find_system(s, 'Sol')
+        for (spec, disp) in [
+                ({'name': 'a', 'tectonics': 4, 'temp': [200, False]}, NameDispFilter('a', False)),
+                ({'near': 'Sol', 'radius': 150, 'tectonics': 4, 'bio': 0}, ProxDispFilter(sol, 150)),
+                ]:
+            results = query.run_query(self.s, spec)
+            s.dispfilter.reset()
+            s.dispfilter.add(disp)
+            s.aggfilter.reset()
+            f = SafetyAggFilter()
+            for key in ['tectonics', 'weather', 'temp', 'bio']:
+                if key in spec:
+                    getattr(f, 'set_{}'.format(key))(*query.parse_limit(spec[key]))
+            s.aggfilter.add(f)
+            s.process_aggregates()
+            expected = set([system.idnum for system in s.system_list if system.highlight])
+            self.assertEqual(set([result['sid'] for result in results]), expected)
+            for result in results:
+                system = s.get(result['sid'])
+                self.assertEqual(result['value'], system.mineral_agg.value())
+                self.assertEqual(result['bio'], system.bio_agg)
+                self.assertEqual(result['full_value'], system.mineral_agg_full.value())
+
+    def test_run_query_ranking(self):
+        """
+        Tests the sorting, ranking and limits of query results
+        """
+        results = query.run_query(self.s, {'id': 'q', 'limit': 5})
+        self.assertEqual(len(results), 5)
+        self.assertEqual([result['rank'] for result in results], [1, 2, 3, 4, 5])
+        self.assertEqual([result['query'] for result in results], ['q']*5)
+        values = [result['value'] for result in results]
+        self.assertEqual(values, sorted(values, reverse=True))
+        results = query.run_query(self.s, {'sort': 'name', 'limit': 3})
+        names = [result['name'] for result in results]
+        self.assertEqual(names, sorted(names))
+
+    def test_run_query_sums_cache(self):
+        """
+        Tests that broad filtered queries store their aggregates in the cache
+        we pass in, and get the same results when using them again.
+        """
+        cache = {}
+        spec = {'tectonics': 4, 'limit': 5}
+        results = query.run_query(self.s, spec, cache)
+        self.assertEqual(list(cache.keys()), [(((4, True), (8, True), (5200, True), (400, True)),)])
+        self.assertEqual(query.run_query(self.s, spec, cache), results)
+        self.assertEqual(query.run_query(self.s, spec), results)
+
+    def test_run_query_no_change(self):
+        """
+        Makes sure that running a query doesn't touch the filters or
+        highlighting on the `Systems` object
+        """
+        before = [system.highlight for system in self.s.system_list]
+        query.run_query(self.s, {'name': 'sol', 'tectonics': 1})
+        self.assertFalse(self.s.dispfilter.filtering())
+        self.assertFalse(self.s.aggfilter.filtering())
+        self.assertEqual([system.highlight for system in self.s.system_list], before)
+
+    def test_read_specs(self):
+        """
+        Tests reading the various formats of query spec files
+        """
+        self.assertEqual(query.read_specs(io.StringIO('{"name": "sol"}')), [{'name': 'sol'}])
+        self.assertEqual(query.read_specs(io.StringIO('[{"id": 1}, {"id": 2}]')), [{'id': 1}, {'id': 2}])
+        self.assertEqual(query.read_specs(io.StringIO('{"id": 1}\n\n{"id": 2}\n')), [{'id': 1}, {'id': 2}])
+        with self.assertRaises(ValueError) as cm:
+            query.read_specs(io.StringIO('[1, 2]'))
+
+    def test_run_batch(self):
+        """
+        Tests running a batch of queries, both in-process and with a pool,
+        making sure results come back in order and that errors are reported
+        per query.
+        """
+        specs = [{'id': 1, 'name': 'sol'}, {'id': 2, 'near': 'Nowhere'}, {'id': 3, 'type': 'Water', 'limit': 2},
+            {'id': 4, 'name': 5}, {'id': 5, 'near': 5}, {'id': 6, 'constellation': ['Sol']},
+            {'id': 7, 'limit': -1}]
+        for processes in [1, 2]:
+            batch = list(query.run_batch(None, specs, processes=processes, cache=False, chunksize=1))
+            self.assertEqual(len(batch), 7)
+            self.assertEqual([result['name'] for result in batch[0]], ['Sol'])
+            self.assertIn('error', batch[1][0])
+            self.assertEqual(batch[1][0]['query'], 2)
+            self.assertEqual([result['query'] for result in batch[2]], [3, 3])
+            for (spec, results) in zip(specs[3:], batch[3:]):
+                self.assertEqual(len(results), 1)
+                self.assertEqual(results[0]['query'], spec['id'])
+                self.assertIn('error', results[0])
+
+    def test_cli(self):
+        """
+        Tests running a query through the commandline tool
+        """
+        output = subprocess.check_output([sys.executable, 'uqm_query.py', '--no-cache',
+            '--near', 'Sol', '--radius', '150', '--tectonics', '4', '--limit', '2'], cwd=base_dir)
+        results = [json.loads(line) for line in output.decode('utf-8').splitlines()]
+        self.assertEqual([result['name'] for result in results], ['Alpha Centauri', 'Epsilon Volantis'])
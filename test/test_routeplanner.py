@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from uqm_map.data import Quasispace
+from uqm_map.route import RoutePlanner
+
+class FakeSystems(object):
+    """
+    Just enough of a `Systems` object for the planner
+    """
+
+    def __init__(self, quasispace):
+        self.quasispace = quasispace
+
+def point(x, y, name):
+    """
+    Returns a hyperspace position to route between.  `Quasispace` objects
+    make for handy stand-ins for systems.
+    """
+    return Quasispace(x, y, 0, 0, name)
+
+class RoutePlannerTests(unittest.TestCase):
+    """
+    Tests for our `RoutePlanner` class, which finds the cheapest routes
+    through hyperspace and quasispace.
+    """
+
+    def setUp(self):
+        """
+        Some vars we might need on (nearly) every test.  Exits A and B are
+        far apart in hyperspace but close together in quasispace; C is off
+        on its own.
+        """
+        self.a = Quasispace(0, 0, 500, 500, 'A')
+        self.b = Quasispace(9000, 0, 510, 500, 'B')
+        self.c = Quasispace(0, 9000, 500, 900, 'C')
+        self.planner = RoutePlanner(FakeSystems([self.a, self.b, self.c]))
+
+    def test_direct(self):
+        """
+        Tests a route which is cheapest straight through hyperspace
+        """
+        start = point(4000, 4000, 'Start')
+        end = point(4300, 4400, 'End')
+        route = self.planner.route(start, end)
+        self.assertAlmostEqual(route.cost, 50)
+        self.assertEqual(len(route.legs), 1)
+        self.assertEqual(route.legs[0].mode, 'hyperspace')
+        self.assertFalse(route.uses_quasispace())
+
+    def test_quasispace(self):
+        """
+        Tests a route which is cheapest through quasispace
+        """
+        start = point(300, 400, 'Start')
+        end = point(9000, 300, 'End')
+        route = self.planner.route(start, end)
+        self.assertAlmostEqual(route.cost, 50+10+30)
+        self.assertEqual([leg.mode for leg in route.legs],
+            ['hyperspace', 'quasispace', 'hyperspace'])
+        self.assertIs(route.legs[0].end, self.a)
+        self.assertIs(route.legs[1].end, self.b)
+        self.assertIs(route.legs[2].end, end)
+        self.assertTrue(route.uses_quasispace())
+        self.assertAlmostEqual(sum([leg.cost for leg in route.legs]), route.cost)
+
+    def test_at_exit(self):
+        """
+        Tests routes starting and ending right on exits, which shouldn't
+        include any empty hyperspace legs
+        """
+        route = self.planner.route(self.a, self.b)
+        self.assertAlmostEqual(route.cost, 10)
+        self.assertEqual([leg.mode for leg in route.legs], ['quasispace'])
+
+    def test_same_point(self):
+        """
+        Tests a route to where we already are
+        """
+        start = point(300, 400, 'Start')
+        route = self.planner.route(start, start)
+        self.assertEqual(route.cost, 0)
+        self.assertEqual(route.legs, [])
+
+    def test_portal_cost(self):
+        """
+        Tests that the cost of crossing quasispace can make hyperspace
+        the better option
+        """
+        planner = RoutePlanner(FakeSystems([self.a, self.b, self.c]), portal_cost=1000)
+        start = point(300, 400, 'Start')
+        end = point(9000, 300, 'End')
+        route = planner.route(start, end)
+        self.assertEqual([leg.mode for leg in route.legs], ['hyperspace'])
+        self.assertAlmostEqual(route.cost, start.distance_to(end))
+
+    def test_portal_costs(self):
+        """
+        Tests our precomputed routes between exits, including one which
+        chains together more than one hop
+        """
+        planner = RoutePlanner(FakeSystems([self.a, self.b, self.c]), quasi_scale=10)
+        self.assertAlmostEqual(planner.portal_costs[0][1], 100)
+        self.assertEqual(planner.portal_modes[0][1], 'quasispace')
+        self.assertEqual(planner.portal_modes[0][2], 'hyperspace')
+        self.assertAlmostEqual(planner.portal_costs[1][2], 100+900)
+        self.assertEqual(planner.portal_next[1][2], 0)
+        route = planner.route(self.b, self.c)
+        self.assertAlmostEqual(route.cost, 1000)
+        self.assertEqual([(leg.mode, leg.end) for leg in route.legs],
+            [('quasispace', self.a), ('hyperspace', self.c)])
+
+    def test_no_exits(self):
+        """
+        Tests routing when there's no quasispace at all
+        """
+        planner = RoutePlanner(FakeSystems([]))
+        start = point(0, 0, 'Start')
+        end = point(300, 400, 'End')
+        self.assertAlmostEqual(planner.cost(start, end), 50)
+
+    def test_routes(self):
+        """
+        Tests routing a batch of pairs
+        """
+        start = point(300, 400, 'Start')
+        end = point(9000, 300, 'End')
+        routes = list(self.planner.routes([(start, end), (end, start)]))
+        self.assertEqual(len(routes), 2)
+        self.assertAlmostEqual(routes[0].cost, routes[1].cost)
+        self.assertIs(routes[1].start, end)
+
+    def test_cost_matrix(self):
+        """
+        Tests building a matrix of route costs
+        """
+        start = point(300, 400, 'Start')
+        end = point(9000, 300, 'End')
+        matrix = self.planner.cost_matrix([start, end, start])
+        self.assertEqual(matrix[0][0], 0)
+        self.assertAlmostEqual(matrix[0][1], 90)
+        self.assertAlmostEqual(matrix[1][0], 90)
+        self.assertAlmostEqual(matrix[0][2], 0)
+
+    def test_to_dict(self):
+        """
+        Tests our JSON-friendly route description
+        """
+        start = point(300, 400, 'Start')
+        end = point(9000, 300, 'End')
+        info = self.planner.route(start, end).to_dict()
+        self.assertEqual(info['from'], 'Quasispace Exit Start')
+        self.assertEqual(info['cost'], 90)
+        self.assertEqual([leg['to'] for leg in info['legs']],
+            ['Quasispace Exit A', 'Quasispace Exit B', 'Quasispace Exit End'])
@@ -20,7 +20,7 @@
 
 import unittest
 
-from uqm_map.data import SafetyAggFilter, Planet, MinData
+from uqm_map.data import SafetyAggFilter, Planet, MinData, PlanetColumns
 
 class SafetyAggFilterTests(unittest.TestCase):
     """
@@ -128,3 +128,65 @@ class SafetyAggFilterTests(unittest.TestCase):
         """
         p = Planet(1, 'Acid', 'Acid World', 4, 4, 100, 1, 100, 10, MinData())
         self.assertEqual(self.saf_r.approve(p), False)
+
+    def test_mask(self):
+        """
+        Tests computing a mask over planet columns, making sure that it
+        matches what `approve()` says for each planet.
+        """
+        planets = [
+            Planet(1, 'Acid', 'Acid World', 4, 4, 100, 1, 100, 100, MinData()),
+            Planet(2, 'Acid', 'Acid World', 1, 4, 100, 1, 100, 100, MinData()),
+            Planet(3, 'Acid', 'Acid World', 4, 4, 25, 1, 100, 100, MinData()),
+            Planet(4, 'Acid', 'Acid World', 3, 3, 50, 1, 100, 50, MinData()),
+            Planet(5, 'Acid', 'Acid World', 4, 4, 100, 1, 100, 10, MinData()),
+            ]
+        c = PlanetColumns()
+        for p in planets:
+            c.add_planet(p.idnum, p.name, p.ptype, p.tectonics, p.weather, p.temp,
+                p.gravity, p.bio, p.bio_danger, (0,)*8)
+        c.end_system()
+        self.assertEqual(list(self.saf_r.mask(c)), [1, 0, 0, 1, 0])
+        self.assertEqual(list(self.saf_r.mask(c)), [int(self.saf_r.approve(p)) for p in planets])
+        self.assertEqual(list(self.saf.mask(c)), [1, 1, 1, 1, 1])
+
+    def test_mask_empty(self):
+        """
+        Tests computing a mask over empty planet columns
+        """
+        self.assertEqual(self.saf_r.mask(PlanetColumns()), b'')
+
+    def test_state(self):
+        """
+        Tests getting our current state
+        """
+        self.assertEqual(self.saf.state(), ((8, True), (8, True), (5200, True), (400, True)))
+        self.assertEqual(self.saf_r.state(), ((3, False), (3, False), (50, False), (50, False)))
+
+    def test_approve_row(self):
+        """
+        Tests approving a single row out of a `PlanetColumns` object, given
+        a state tuple
+        """
+        c = PlanetColumns()
+        c.add_planet(1, 'Acid', 'Acid World', 4, 4, 100, 1, 100, 100, (0,)*8)
+        c.add_planet(2, 'Acid', 'Acid World', 1, 4, 100, 1, 100, 100, (0,)*8)
+        c.end_system()
+        self.assertEqual(SafetyAggFilter.approve_row(c, 0, self.saf_r.state()), True)
+        self.assertEqual(SafetyAggFilter.approve_row(c, 1, self.saf_r.state()), False)
+        self.assertEqual(SafetyAggFilter.approve_row(c, 1, self.saf.state()), True)
+
+    def test_changed_rows(self):
+        """
+        Tests finding the rows which change status when a limit moves
+        """
+        c = PlanetColumns()
+        for (idx, tectonics) in enumerate([5, 1, 4, 5, 3, 8, 4]):
+            c.add_planet(idx, 'Acid', 'Acid World', tectonics, 1, 100, 1, 0, 0, (0,)*8)
+        c.end_system()
+        self.assertEqual(sorted(SafetyAggFilter.changed_rows(c, 'tectonics', (5, True), (4, True))), [0, 3])
+        self.assertEqual(sorted(SafetyAggFilter.changed_rows(c, 'tectonics', (3, True), (5, True))), [0, 2, 3, 6])
+        self.assertEqual(sorted(SafetyAggFilter.changed_rows(c, 'tectonics', (4, False), (5, False))), [2, 6])
+        self.assertEqual(sorted(SafetyAggFilter.changed_rows(c, 'tectonics', (8, False), (2, False))), [0, 2, 3, 4, 6])
+        self.assertEqual(list(SafetyAggFilter.changed_rows(c, 'tectonics', (4, True), (4, True))), [])
+        self.assertEqual(SafetyAggFilter.changed_rows(c, 'tectonics', (4, True), (4, False)), None)
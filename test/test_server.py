@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import http.client
+import urllib.request
+
+from uqm_map.data import Systems
+from uqm_map import query
+from uqm_map.server import QueryServer, UnixQueryServer, ServerStats, LRUCache, spec_from_params
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix socket, for testing `UnixQueryServer`
+    """
+
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+class ServerTests(unittest.TestCase):
+    """
+    Tests for our local query server
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Loads our main datafile and starts a server on a random port
+        """
+        cls.systems = Systems.load_from_file(lazy=True)
+        cls.server = QueryServer(('127.0.0.1', 0), cls.systems)
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Shuts down our server
+        """
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+
+    def request(self, path, data=None):
+        """
+        Makes a request to our server, returning the status and decoded JSON
+        """
+        if data is not None:
+            data = json.dumps(data).encode('utf-8')
+        req = urllib.request.Request(self.url + path, data=data)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return (response.status, json.loads(response.read().decode('utf-8')))
+        except urllib.error.HTTPError as e:
+            return (e.code, json.loads(e.read().decode('utf-8')))
+
+    def test_spec_from_params(self):
+        """
+        Tests turning URL parameters into a query spec
+        """
+        self.assertEqual(spec_from_params('name=sol&radius=50&limit=3&extra=true&tectonics=%3E%3D2'),
+            {'name': 'sol', 'radius': 50.0, 'limit': 3, 'extra': True, 'tectonics': '>=2'})
+        with self.assertRaises(ValueError) as cm:
+            spec_from_params('limit=lots')
+
+    def test_get_query(self):
+        """
+        Tests running a query from URL parameters
+        """
+        (status, data) = self.request('/query?near=Sol&radius=150&tectonics=4&limit=2')
+        self.assertEqual(status, 200)
+        self.assertEqual([result['name'] for result in data['results']], ['Alpha Centauri', 'Epsilon Volantis'])
+
+    def test_post_query(self):
+        """
+        Tests running a query from a JSON spec
+        """
+        (status, data) = self.request('/query', {'name': 'sol'})
+        self.assertEqual(status, 200)
+        self.assertEqual([result['name'] for result in data['results']], ['Sol'])
+
+    def test_post_batch(self):
+        """
+        Tests running a batch of queries
+        """
+        (status, data) = self.request('/batch', [{'name': 'sol'}, {'type': 'Water', 'limit': 2}])
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(len(data['results'][1]), 2)
+
+    def test_bad_requests(self):
+        """
+        Tests the various kinds of invalid requests
+        """
+        (status, data) = self.request('/query', {'near': 'Nowhere'})
+        self.assertEqual(status, 400)
+        self.assertIn('Nowhere', data['error'])
+        (status, data) = self.request('/query', [1])
+        self.assertEqual(status, 400)
+        (status, data) = self.request('/batch', {'name': 'sol'})
+        self.assertEqual(status, 400)
+        (status, data) = self.request('/nothing')
+        self.assertEqual(status, 404)
+
+    def test_bad_spec_types(self):
+        """
+        Tests that well-formed requests with badly-typed spec fields get a
+        400 back, and are counted in our stats
+        """
+        before = self.request('/stats')[1]
+        for spec in [{'name': 5}, {'near': 5}, {'limit': -1}, {'constellation': ['Sol']}]:
+            (status, data) = self.request('/query', spec)
+            self.assertEqual(status, 400, repr(spec))
+            self.assertIn('error', data)
+        (status, data) = self.request('/query?radius=nan&near=Sol')
+        self.assertEqual(status, 400)
+        (status, data) = self.request('/batch', [{'name': 'sol'}, {'name': 5}])
+        self.assertEqual(status, 400)
+        after = self.request('/stats')[1]
+        self.assertEqual(after['requests'] - before['requests'], 7)
+        self.assertEqual(after['errors'] - before['errors'], 6)
+
+    def test_bad_content_length(self):
+        """
+        Tests that negative, non-numeric and oversized body lengths are
+        rejected straight away, rather than waiting on a body
+        """
+        port = self.server.server_address[1]
+        for length in ['-5', 'lots', '1e3', str(16*1024*1024+1)]:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.putrequest('POST', '/query')
+            conn.putheader('Content-Length', length)
+            conn.endheaders()
+            response = conn.getresponse()
+            self.assertEqual(response.status, 400, length)
+            self.assertIn('error', json.loads(response.read().decode('utf-8')))
+            self.assertEqual(response.getheader('Connection'), 'close')
+            conn.close()
+
+    def test_internal_error(self):
+        """
+        Tests that an unexpected error still gets a response, and is counted
+        """
+        before = self.request('/stats')[1]
+        with unittest.mock.patch.object(query, 'run_query', side_effect=RuntimeError('boom')):
+            (status, data) = self.request('/query', {'name': 'sol'})
+        self.assertEqual(status, 500)
+        self.assertIn('boom', data['error'])
+        after = self.request('/stats')[1]
+        self.assertEqual(after['requests'] - before['requests'], 2)
+        self.assertEqual(after['errors'] - before['errors'], 1)
+
+    def test_caches_bounded(self):
+        """
+        Tests that lookups for things which don't exist don't get cached on
+        the shared `Systems` object
+        """
+        types = len(self.systems.types.cache)
+        masks = len(self.systems.constellation_masks)
+        for n in range(20):
+            self.request('/query', {'type': 'Nothing {}'.format(n), 'constellation': 'Nowhere {}'.format(n)})
+        self.assertEqual(len(self.systems.types.cache), types)
+        self.assertEqual(len(self.systems.constellation_masks), masks)
+
+    def test_info(self):
+        """
+        Tests getting information about our data
+        """
+        (status, data) = self.request('/info')
+        self.assertEqual(data['systems'], 502)
+        self.assertEqual(data['planets'], 3806)
+        self.assertEqual(data['quasispace'], 16)
+
+    def test_concurrent(self):
+        """
+        Runs a bunch of different queries at once, and makes sure each gets
+        the same answer it would get on its own.
+        """
+        specs = [{'name': 'a', 'tectonics': tectonics} for tectonics in range(1, 9)]
+        expected = [self.request('/query', spec)[1] for spec in specs]
+        results = [None]*len(specs)
+        def worker(idx):
+            results[idx] = self.request('/query', specs[idx])[1]
+        threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(len(specs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, expected)
+        self.assertFalse(self.systems.aggfilter.filtering())
+
+    def test_stats(self):
+        """
+        Tests that requests show up in our stats
+        """
+        before = self.request('/stats')[1]
+        self.request('/query?name=sol')
+        self.request('/nothing')
+        after = self.request('/stats')[1]
+        self.assertEqual(after['requests'] - before['requests'], 3)
+        self.assertEqual(after['errors'] - before['errors'], 1)
+        self.assertEqual(after['paths']['/query'] - before['paths'].get('/query', 0), 1)
+        self.assertGreater(after['max_latency'], 0)
+        self.assertGreater(after['requests_per_second'], 0)
+
+    def test_unix_socket(self):
+        """
+        Tests serving queries over a Unix socket
+        """
+        tempdir = tempfile.mkdtemp()
+        path = os.path.join(tempdir, 'uqm.sock')
+        server = UnixQueryServer(path, self.systems)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            conn = UnixHTTPConnection(path)
+            conn.request('GET', '/query?name=sol')
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            data = json.loads(response.read().decode('utf-8'))
+            self.assertEqual([result['name'] for result in data['results']], ['Sol'])
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            shutil.rmtree(tempdir)
+        self.assertFalse(os.path.exists(path))
+
+class ServerStatsTests(unittest.TestCase):
+    """
+    Tests for our server's request counters
+    """
+
+    def test_record(self):
+        """
+        Tests recording a few requests
+        """
+        stats = ServerStats()
+        self.assertEqual(stats.report()['mean_latency'], 0)
+        stats.record('/query', 0.5)
+        stats.record('/query', 1.5, error=True)
+        stats.record('/stats', 1)
+        report = stats.report()
+        self.assertEqual(report['requests'], 3)
+        self.assertEqual(report['errors'], 1)
+        self.assertEqual(report['paths'], {'/query': 2, '/stats': 1})
+        self.assertEqual(report['mean_latency'], 1)
+        self.assertEqual(report['max_latency'], 1.5)
+
+class LRUCacheTests(unittest.TestCase):
+    """
+    Tests for the small cache our server uses to share aggregates
+    """
+
+    def test_eviction(self):
+        """
+        Tests that the least recently used entry is the one which goes
+        """
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+from uqm_map.index import SpatialIndex
+from uqm_map.data import System, Quasispace
+
+class SpatialIndexTests(unittest.TestCase):
+    """
+    Tests for our `SpatialIndex` class, which is a uniform grid used to
+    speed up proximity queries.
+    """
+
+    def setUp(self):
+        """
+        Some vars we might need on (nearly) every test
+        """
+        self.i = SpatialIndex(cell_size=1000)
+        self.center = System(1, 'Center', 'Alpha', 5000, 5000, 'white dwarf', '')
+        self.close = System(2, 'Close', 'Alpha', 5100, 5100, 'red dwarf', '')
+        self.edge = System(3, 'Edge', 'Alpha', 6000, 5000, 'red dwarf', '')
+        self.far = System(4, 'Far', 'Alpha', 9000, 9000, 'blue dwarf', '')
+        self.quasi = Quasispace(4900, 4900, 3000, 3000, 'C')
+
+    def test_init(self):
+        """
+        Tests our basic initialization routine
+        """
+        self.assertEqual(len(self.i), 0)
+        self.assertEqual(self.i.within(self.center, 100), [])
+
+    def test_cell_for(self):
+        """
+        Tests finding the cell for a set of coordinates
+        """
+        self.assertEqual(self.i.cell_for(0, 0), (0, 0))
+        self.assertEqual(self.i.cell_for(999, 1000), (0, 1))
+        self.assertEqual(self.i.cell_for(-1, 9999), (-1, 9))
+
+    def test_add(self):
+        """
+        Tests adding objects
+        """
+        self.i.add(self.center)
+        self.i.add(self.far)
+        self.i.add(self.quasi)
+        self.assertEqual(len(self.i), 3)
+        self.assertEqual(len(self.i.cells), 3)
+
+    def test_within(self):
+        """
+        Tests finding things within a radius
+        """
+        for obj in [self.center, self.close, self.edge, self.far, self.quasi]:
+            self.i.add(obj)
+        found = self.i.within(self.center, 100)
+        self.assertEqual(len(found), 4)
+        self.assertIn(self.center, found)
+        self.assertIn(self.close, found)
+        self.assertIn(self.edge, found)
+        self.assertIn(self.quasi, found)
+        found = self.i.within(self.center, 99)
+        self.assertEqual(len(found), 3)
+        self.assertNotIn(self.edge, found)
+        self.assertEqual(self.i.within(self.center, 0), [self.center])
+
+    def test_within_from_quasispace(self):
+        """
+        Tests finding things within a radius of a quasispace exit
+        """
+        for obj in [self.center, self.far]:
+            self.i.add(obj)
+        self.assertEqual(self.i.within(self.quasi, 50), [self.center])
+
+    def test_candidates(self):
+        """
+        Tests getting candidates from the grid, which may include some
+        objects outside of the radius
+        """
+        for obj in [self.center, self.edge, self.far]:
+            self.i.add(obj)
+        candidates = list(self.i.candidates(5000, 5000, 50))
+        self.assertIn(self.center, candidates)
+        self.assertNotIn(self.far, candidates)
+
+    def test_candidates_huge_radius(self):
+        """
+        Tests that a huge radius just gets us everything, without walking
+        the whole (mostly empty) grid it covers
+        """
+        self.i = SpatialIndex(cell_size=1)
+        for obj in [self.center, self.edge, self.far]:
+            self.i.add(obj)
+        found = self.i.within(self.center, 1e12)
+        self.assertEqual(len(found), 3)
+        self.assertEqual(self.i.within(self.far, 1e12), found)
+
+    def test_candidates_clipped(self):
+        """
+        Tests that a large radius away from everything finds nothing
+        """
+        self.i.add(self.center)
+        self.assertEqual(list(self.i.candidates(-1e9, -1e9, 1e7)), [])
+
+    def test_within_infinite_radius(self):
+        """
+        Tests that an infinite radius covers everything, and a NaN one is
+        rejected
+        """
+        for obj in [self.center, self.edge, self.far, self.quasi]:
+            self.i.add(obj)
+        self.assertEqual(len(self.i.within(self.center, float('inf'))), 4)
+        with self.assertRaises(ValueError) as cm:
+            self.i.within(self.center, float('nan'))
+        self.assertEqual(self.i.within(self.center, -1), [])
+
+    def test_bounds(self):
+        """
+        Tests keeping track of the occupied part of the grid
+        """
+        self.assertIsNone(self.i.bounds)
+        self.i.add(self.center)
+        self.assertEqual(self.i.bounds, (5, 5, 5, 5))
+        self.i.add(self.far)
+        self.i.add(self.quasi)
+        self.assertEqual(self.i.bounds, (4, 4, 9, 9))
@@ -20,7 +20,8 @@
 
 import unittest
 
-from uqm_map.data import System, Planet, MinData, Filter, TypeDispFilter, SafetyAggFilter
+from uqm_map.data import System, Planet, MinData, Filter, TypeDispFilter, SafetyAggFilter, \
+    PlanetColumns
 
 class SystemTests(unittest.TestCase):
     """
@@ -66,6 +67,30 @@ class SystemTests(unittest.TestCase):
         self.assertEqual(p, p2)
         self.assertEqual(len(self.s.planets), 1)
 
+    def test_lazy_planets(self):
+        """
+        Tests building our planets lazily from planet columns
+        """
+        c = PlanetColumns()
+        c.add_planet(1, 'Acid', 'Acid World', 1, 1, 100, 1, 0, 0, (0,)*8)
+        c.end_system()
+        self.s.index = 0
+        self.s.planet_list = None
+        self.s.planet_columns = c
+        planets = self.s.planets
+        self.assertEqual([p.idnum for p in planets], [1])
+        self.assertIs(self.s.planets, planets)
+
+    def test_set_planets(self):
+        """
+        Tests setting our planets directly, which should stop any lazy loading
+        """
+        self.s.planet_list = None
+        self.s.planet_columns = PlanetColumns()
+        self.s.planets = []
+        self.assertEqual(self.s.planet_columns, None)
+        self.assertEqual(self.s.planets, [])
+
     def test_add_two_planets(self):
         """
         Tests adding two planets
@@ -188,3 +213,56 @@ class SystemTests(unittest.TestCase):
         self.assertEqual(self.s.bio_agg_full, 25)
         self.assertEqual(self.s.bio_danger_agg, 5)
         self.assertEqual(self.s.bio_danger_agg_full, 15)
+
+    def test_compute_full_aggregates(self):
+        """
+        Tests computing our unfiltered aggregates directly
+        """
+        self.s.addplanet(Planet(1, 'Acid', 'Acid World', 4, 4, 100, 1, 10, 5, MinData(
+            base=3,
+            )))
+        self.s.addplanet(Planet(2, 'Chlorine', 'Chlorine World', 1, 1, 100, 1, 15, 10, MinData(
+            base=1,
+            radioactive=5,
+            )))
+        self.s.compute_full_aggregates()
+        self.assertEqual(self.s.mineral_agg_full.value(), 52)
+        self.assertEqual(self.s.bio_agg_full, 25)
+        self.assertEqual(self.s.bio_danger_agg_full, 15)
+
+    def test_apply_filters_reuses_full_aggregates(self):
+        """
+        Tests that applying filters more than once doesn't recompute our
+        unfiltered aggregates
+        """
+        self.s.addplanet(Planet(1, 'Acid', 'Acid World', 4, 4, 100, 1, 10, 5, MinData(
+            base=3,
+            )))
+        self.s.apply_filters(Filter(), Filter())
+        full = self.s.mineral_agg_full
+        f = Filter()
+        saf = SafetyAggFilter()
+        saf.set_tectonics(3)
+        f.add(saf)
+        self.s.apply_filters(Filter(), f)
+        self.assertIs(self.s.mineral_agg_full, full)
+        self.assertEqual(self.s.mineral_agg.value(), 0)
+        self.assertEqual(self.s.mineral_agg_full.value(), 9)
+
+    def test_add_planet_resets_full_aggregates(self):
+        """
+        Tests that adding a planet after aggregates have been computed will
+        cause them to be recomputed on the next `apply_filters` call
+        """
+        self.s.addplanet(Planet(1, 'Acid', 'Acid World', 4, 4, 100, 1, 10, 5, MinData(
+            base=3,
+            )))
+        self.s.apply_filters(Filter(), Filter())
+        self.assertEqual(self.s.mineral_agg_full.value(), 9)
+        self.s.addplanet(Planet(2, 'Chlorine', 'Chlorine World', 1, 1, 100, 1, 15, 10, MinData(
+            base=1,
+            radioactive=5,
+            )))
+        self.s.apply_filters(Filter(), Filter())
+        self.assertEqual(self.s.mineral_agg_full.value(), 52)
+        self.assertEqual(self.s.bio_agg_full, 25)
@@ -18,10 +18,14 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import io
 import os
+import json
 import unittest
 
-from uqm_map.data import Systems, System, Planet, MinData, NameDispFilter, SafetyAggFilter
+from uqm_map.data import Systems, System, Planet, MinData, NameDispFilter, ProxDispFilter, \
+    TypeDispFilter, ConstDispFilter, SafetyAggFilter, Filter, derived_version
+from uqm_map.index import bitset_from_flags
 
 class SystemsTests(unittest.TestCase):
     """
@@ -43,6 +47,8 @@ class SystemsTests(unittest.TestCase):
         self.assertEqual(len(self.s.constellation_names), 0)
         self.assertEqual(len(self.s.planet_types), 0)
         self.assertEqual(self.s.connections, [])
+        self.assertEqual(len(self.s.spatial), 0)
+        self.assertEqual(len(self.s.names), 0)
 
     def test_add_single(self):
         """
@@ -598,6 +604,518 @@ class SystemsTests(unittest.TestCase):
         self.assertEqual(len(s.planet_types), 53)
         self.assertEqual(len(s.constellation_names), 132)
 
+    def test_load_from_stream(self):
+        """
+        Tests loading from a JSON stream, with planets and constellations
+        showing up before the systems they refer to.
+        """
+        json_str = '{"constellations": {"1": [2]}, "planets": [' \
+            '{"pid": 3, "sid": 2, "pname": "Planet I", "ptype": "Acid World", "tectonics": 2, ' \
+            '"weather": 3, "temp": 400, "gravity": 1, "bio": 100, "bio_danger": 50, "mineral": 8, ' \
+            '"min_common": 1, "min_corrosive": 0, "min_base": 0, "min_noble": 0, ' \
+            '"min_rare": 0, "min_precious": 0, "min_radio": 0, "min_exotic": 7} ' \
+            '], "systems": [' \
+            '{"sid": 1, "name": "System", "position": "Alpha",' \
+            '"x": 5000, "y": 6000, "stype": "green dwarf", "extra": ""}, ' \
+            '{"sid": 2, "name": "System", "position": "Beta",' \
+            '"x": 6000, "y": 7000, "stype": "green dwarf", "extra": ""} ' \
+            '], "quasispace": [' \
+            '{"label": "A", "x": 438, "y": 6373, "qs_x": 500, "qs_y": 500}]}'
+        s = Systems.load_from_stream(io.StringIO(json_str))
+        self.assertEqual(len(s.system_list), 2)
+        self.assertEqual(s.get('A').qs_x, 500)
+        self.assertEqual(s.get(2).planets[0].mineral.exotic, 7)
+        self.assertEqual(s.planet_types, set(['Acid']))
+        self.assertEqual(s.connections, [(s.get(1), s.get(2))])
+        self.assertEqual(s.agg_max_value, 176)
+
+    def test_load_from_stream_empty_hash(self):
+        """
+        Tests loading from a JSON stream when passed an empty hash
+        """
+        with self.assertRaises(KeyError) as cm:
+            Systems.load_from_stream(io.StringIO('{}'))
+
+    def test_load_from_file_stream(self):
+        """
+        Test streaming our main default datafile, and make sure that we end up
+        with the same data as the regular loader.
+        """
+        s = Systems.load_from_file()
+        t = Systems.load_from_file(stream=True)
+        self.assertEqual(len(t.systems), len(s.systems))
+        self.assertEqual(len(t.connections), len(s.connections))
+        self.assertEqual(t.planet_types, s.planet_types)
+        self.assertEqual(t.agg_max_value, s.agg_max_value)
+        for system in s.system_list:
+            other = t.get(system.idnum)
+            self.assertEqual([p.name for p in other.planets], [p.name for p in system.planets])
+            self.assertEqual(other.mineral_agg_full.value(), system.mineral_agg_full.value())
+
+    def derived_data(self):
+        """
+        Returns a JSON data dict with two systems and planets, plus its
+        derived data
+        """
+        from uqm_map.derived import derive
+        data = {
+            'systems': [
+                {'sid': 1, 'name': 'System', 'position': 'Alpha', 'x': 5000, 'y': 6000,
+                    'stype': 'green dwarf', 'extra': ''},
+                {'sid': 2, 'name': 'Other', 'position': 'Beta', 'x': 6000, 'y': 7000,
+                    'stype': 'green dwarf', 'extra': ''},
+                ],
+            'quasispace': [],
+            'planets': [
+                {'pid': 3, 'sid': 2, 'pname': 'Planet I', 'ptype': 'Acid World', 'tectonics': 2,
+                    'weather': 3, 'temp': 400, 'gravity': 1, 'bio': 100, 'bio_danger': 50, 'mineral': 8,
+                    'min_common': 1, 'min_corrosive': 0, 'min_base': 0, 'min_noble': 0,
+                    'min_rare': 0, 'min_precious': 0, 'min_radio': 0, 'min_exotic': 7},
+                {'pid': 4, 'sid': 1, 'pname': 'Planet I', 'ptype': 'StarBase', 'tectonics': 1,
+                    'weather': 1, 'temp': 20, 'gravity': 1, 'bio': 0, 'bio_danger': 0, 'mineral': 2,
+                    'min_common': 2, 'min_corrosive': 0, 'min_base': 0, 'min_noble': 0,
+                    'min_rare': 0, 'min_precious': 0, 'min_radio': 0, 'min_exotic': 0},
+                ],
+            'constellations': {'1': [2]},
+            }
+        data['derived'] = derive(data)
+        return data
+
+    def test_load_from_json_derived(self):
+        """
+        Tests that derived data in the JSON is used as-is, in each of our
+        loading modes
+        """
+        data = self.derived_data()
+        # Doctor the derived data, so we can tell it's been used
+        data['derived']['planet_types'].append('Fake')
+        data['derived']['full_aggregates']['bio'][0] = 12
+        json_str = json.dumps(data)
+        for s in [Systems.load_from_json(json_str), Systems.load_from_json(json_str, columnar=True),
+                Systems.load_from_json(json_str, lazy=True),
+                Systems.load_from_stream(io.StringIO(json_str))]:
+            self.assertEqual(s.planet_types, set(['Acid', 'StarBase', 'Fake']))
+            self.assertEqual(s.constellation_names, set(['System', 'Other']))
+            self.assertEqual(s.connections, [(s.get(1), s.get(2))])
+            self.assertEqual(s.get(1).bio_agg_full, 12)
+            self.assertEqual(s.get(2).mineral_agg_full.exotic, 7)
+            self.assertEqual(s.get(2).bio_danger_agg_full, 50)
+            self.assertEqual(s.types.lookup('Acid'), set([1]))
+            self.assertEqual(s.types.lookup('Star'), set([0]))
+            self.assertEqual(s.agg_max_value, 176)
+
+    def test_load_from_json_derived_matches(self):
+        """
+        Tests that loading with derived data gives the same results as
+        working it all out at load time
+        """
+        data = self.derived_data()
+        with_derived = json.dumps(data)
+        del data['derived']
+        without = json.dumps(data)
+        for columnar in [False, True]:
+            s = Systems.load_from_json(with_derived, columnar=columnar)
+            t = Systems.load_from_json(without, columnar=columnar)
+            self.assertEqual(s.planet_types, t.planet_types)
+            self.assertEqual(s.constellation_names, t.constellation_names)
+            self.assertEqual([(a.idnum, b.idnum) for (a, b) in s.connections],
+                [(a.idnum, b.idnum) for (a, b) in t.connections])
+            self.assertEqual(s.types.types, t.types.types)
+            self.assertEqual(s.full_sums, t.full_sums)
+            for (system, other) in zip(s.system_list, t.system_list):
+                self.assertEqual(system.mineral_agg_full.value(), other.mineral_agg_full.value())
+                self.assertEqual(system.bio_agg_full, other.bio_agg_full)
+            self.assertEqual(s.agg_max_value, t.agg_max_value)
+            self.assertEqual(s.bio_agg_max_value, t.bio_agg_max_value)
+
+    def test_load_from_json_derived_stale(self):
+        """
+        Tests that derived data from another version (or for a different set
+        of systems) is ignored
+        """
+        for (key, value) in [('version', derived_version + 1), ('systems', 5)]:
+            data = self.derived_data()
+            data['derived']['planet_types'].append('Fake')
+            data['derived'][key] = value
+            s = Systems.load_from_json(json.dumps(data))
+            self.assertEqual(s.planet_types, set(['Acid', 'StarBase']))
+            self.assertEqual(len(s.connections), 1)
+
+    def test_build_columns(self):
+        """
+        Tests packing our planets into columns after adding them the usual way
+        """
+        sys1 = self.s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys2 = self.s.add_system(2, 'System', 'Beta', 5500, 5500, 'blue dwarf', '')
+        sys3 = self.s.add_system(3, 'System', 'Gamma', 6000, 6000, 'blue dwarf', '')
+        sys1.addplanet(Planet(1, 'Acid', 'Acid World', 1, 1, 100, 1, 10, 5, MinData(base=3)))
+        sys3.addplanet(Planet(2, 'Acid', 'Acid World', 2, 1, 100, 1, 5, 0, MinData(radioactive=3)))
+        sys3.addplanet(Planet(3, 'Acid', 'Acid World', 3, 1, 100, 1, 0, 0, MinData(exotic=3)))
+        c = self.s.build_columns()
+        self.assertEqual(self.s.columns, c)
+        self.assertEqual(len(c), 3)
+        self.assertEqual(list(c.system_offsets), [0, 1, 1, 3])
+        self.assertEqual(list(c.tectonics), [1, 2, 3])
+        self.assertEqual(sys2.planets, [])
+        self.assertEqual([p.idnum for p in sys3.planets], [2, 3])
+        self.assertEqual(sys3.planets[1].mineral.exotic, 3)
+
+    def test_load_from_json_columnar(self):
+        """
+        Tests loading from JSON into planet columns
+        """
+        json_str = '{"systems": [' \
+            '{"sid": 1, "name": "System", "position": "Alpha",' \
+            '"x": 5000, "y": 6000, "stype": "green dwarf", "extra": ""}, ' \
+            '{"sid": 2, "name": "System", "position": "Beta",' \
+            '"x": 6000, "y": 7000, "stype": "green dwarf", "extra": ""} ' \
+            '], "quasispace": [], "planets": [' \
+            '{"pid": 3, "sid": 2, "pname": "Planet I", "ptype": "Acid World", "tectonics": 2, ' \
+            '"weather": 3, "temp": 400, "gravity": 1, "bio": 100, "bio_danger": 50, "mineral": 8, ' \
+            '"min_common": 1, "min_corrosive": 0, "min_base": 0, "min_noble": 0, ' \
+            '"min_rare": 0, "min_precious": 0, "min_radio": 0, "min_exotic": 7}, ' \
+            '{"pid": 4, "sid": 1, "pname": "Planet I", "ptype": "Water World", "tectonics": 1, ' \
+            '"weather": 1, "temp": 20, "gravity": 1, "bio": 0, "bio_danger": 0, "mineral": 2, ' \
+            '"min_common": 2, "min_corrosive": 0, "min_base": 0, "min_noble": 0, ' \
+            '"min_rare": 0, "min_precious": 0, "min_radio": 0, "min_exotic": 0} ' \
+            '], "constellations": {}}'
+        s = Systems.load_from_json(json_str, columnar=True)
+        self.assertEqual(len(s.columns), 2)
+        self.assertEqual(list(s.columns.system_offsets), [0, 1, 2])
+        p = s.get(2).planets[0]
+        self.assertEqual(p.idnum, 3)
+        self.assertEqual(p.tectonics, 2)
+        self.assertEqual(p.mineral.exotic, 7)
+        self.assertEqual(s.get(1).planets[0].ptype, 'Water World')
+        self.assertEqual(s.planet_types, set(['Acid', 'Water']))
+        self.assertEqual(s.agg_max_value, 176)
+
+    def test_load_from_json_columnar_unknown_system(self):
+        """
+        Tests loading from JSON into planet columns when a planet references
+        a system which doesn't exist
+        """
+        json_str = '{"systems": [], "quasispace": [], "planets": [' \
+            '{"pid": 3, "sid": 2, "pname": "Planet I", "ptype": "Acid World", "tectonics": 2, ' \
+            '"weather": 3, "temp": 400, "gravity": 1, "bio": 100, "bio_danger": 50, "mineral": 8, ' \
+            '"min_common": 1, "min_corrosive": 0, "min_base": 0, "min_noble": 0, ' \
+            '"min_rare": 0, "min_precious": 0, "min_radio": 0, "min_exotic": 7} ' \
+            '], "constellations": {}}'
+        with self.assertRaises(KeyError) as cm:
+            Systems.load_from_json(json_str, columnar=True)
+
+    def test_load_from_file_columnar(self):
+        """
+        Test loading our main default datafile into columns, and make sure
+        that we end up with the same data as the object-based loader.
+        """
+        s = Systems.load_from_file()
+        c = Systems.load_from_file(columnar=True)
+        self.assertEqual(len(c.columns), 3806)
+        self.assertEqual(c.planet_types, s.planet_types)
+        self.assertEqual(c.agg_min_value, s.agg_min_value)
+        self.assertEqual(c.agg_max_value, s.agg_max_value)
+        self.assertEqual(c.bio_agg_max_value, s.bio_agg_max_value)
+        for system in s.system_list:
+            other = c.get(system.idnum)
+            self.assertEqual([p.idnum for p in other.planets], [p.idnum for p in system.planets])
+            self.assertEqual(other.mineral_agg_full.value(), system.mineral_agg_full.value())
+
+    def test_load_from_file_lazy(self):
+        """
+        Test loading our main default datafile with lazy planets, and make sure
+        that aggregates are ready before any planets are built, and that the
+        planets match the object-based loader once they are.
+        """
+        s = Systems.load_from_file()
+        c = Systems.load_from_file(lazy=True)
+        self.assertEqual(len(c.columns), 3806)
+        self.assertEqual(c.planet_types, s.planet_types)
+        self.assertEqual(c.agg_max_value, s.agg_max_value)
+        for system in c.system_list:
+            self.assertEqual(system.planet_list, None)
+            self.assertEqual(system.mineral_agg_full.value(), s.get(system.idnum).mineral_agg_full.value())
+            self.assertEqual(system.bio_agg, s.get(system.idnum).bio_agg)
+        for system in s.system_list:
+            other = c.get(system.idnum)
+            self.assertEqual([(p.idnum, p.name, p.temp, p.mineral.value()) for p in other.planets],
+                [(p.idnum, p.name, p.temp, p.mineral.value()) for p in system.planets])
+
+    def test_process_aggregates_columnar_matches_objects(self):
+        """
+        Makes sure that the columnar aggregate processing matches the
+        object-based reference implementation, with filters in place.
+        """
+        s = Systems.load_from_file()
+        s.build_columns()
+        f = SafetyAggFilter()
+        f.set_tectonics(4)
+        f.set_temp(200, False)
+        s.aggfilter.add(f)
+        s.dispfilter.add(NameDispFilter('a', False))
+        s.process_aggregates_objects()
+        expected = {}
+        for system in s.system_list:
+            expected[system.idnum] = (system.highlight, system.mineral_agg.value(),
+                system.mineral_agg.exotic, system.mineral_agg_full.value(),
+                system.bio_agg, system.bio_agg_full,
+                system.bio_danger_agg, system.bio_danger_agg_full)
+        ranges = (s.agg_min_value, s.agg_max_value, s.agg_spread,
+            s.bio_agg_min_value, s.bio_agg_max_value, s.bio_agg_spread)
+        s.process_aggregates_columnar()
+        for system in s.system_list:
+            self.assertEqual((system.highlight, system.mineral_agg.value(),
+                system.mineral_agg.exotic, system.mineral_agg_full.value(),
+                system.bio_agg, system.bio_agg_full,
+                system.bio_danger_agg, system.bio_danger_agg_full), expected[system.idnum])
+        self.assertEqual((s.agg_min_value, s.agg_max_value, s.agg_spread,
+            s.bio_agg_min_value, s.bio_agg_max_value, s.bio_agg_spread), ranges)
+
+    def test_process_aggregates_columnar_single_lookup(self):
+        """
+        Makes sure that the columnar aggregate processing only looks up each
+        display filter's matches once
+        """
+        s = Systems.load_from_file()
+        s.build_columns()
+        s.dispfilter.add(NameDispFilter('a', False))
+        searches = []
+        search = s.names.search
+        def counting_search(*args):
+            searches.append(args)
+            return search(*args)
+        s.names.search = counting_search
+        s.process_aggregates_columnar()
+        self.assertEqual(len(searches), 1)
+        self.assertTrue(any([system.highlight for system in s.system_list]))
+
+    def test_process_aggregates_columnar_no_systems(self):
+        """
+        Process aggregates in columnar mode when there are no systems
+        """
+        self.s.build_columns()
+        self.s.process_aggregates()
+        self.assertEqual(self.s.agg_min_value, 0)
+        self.assertEqual(self.s.agg_max_value, 0)
+        self.assertEqual(self.s.agg_spread, 0)
+        self.assertEqual(self.s.bio_agg_min_value, 0)
+        self.assertEqual(self.s.bio_agg_max_value, 0)
+        self.assertEqual(self.s.bio_agg_spread, 0)
+
+    def test_compute_full_aggregates(self):
+        """
+        Tests computing our unfiltered aggregates, with and without columns
+        """
+        sys1 = self.s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys1.addplanet(Planet(1, 'Acid', 'Acid World', 1, 1, 100, 1, 10, 5, MinData(base=3)))
+        sys1.addplanet(Planet(2, 'Acid', 'Acid World', 1, 1, 100, 1, 5, 0, MinData(radioactive=3)))
+        self.s.compute_full_aggregates()
+        self.assertEqual(self.s.full_sums, None)
+        self.assertEqual(sys1.mineral_agg_full.value(), 33)
+        self.assertEqual(sys1.bio_agg_full, 15)
+        self.assertEqual(sys1.bio_danger_agg_full, 5)
+        self.s.build_columns()
+        self.s.compute_full_aggregates()
+        self.assertEqual(self.s.full_sums['value'], [33])
+        self.assertEqual(sys1.mineral_agg_full.value(), 33)
+        self.assertEqual(sys1.bio_agg_full, 15)
+        self.assertEqual(sys1.bio_danger_agg_full, 5)
+
+    def test_process_aggregates_keeps_full_aggregates(self):
+        """
+        Tests that changing filters and reprocessing aggregates on a loaded
+        map doesn't rebuild the unfiltered aggregates
+        """
+        for columnar in [False, True]:
+            s = Systems.load_from_file(columnar=columnar)
+            sys = s.get(2250)
+            full = sys.mineral_agg_full
+            f = SafetyAggFilter()
+            f.set_tectonics(0)
+            s.aggfilter.add(f)
+            s.process_aggregates()
+            self.assertIs(sys.mineral_agg_full, full)
+
+    def test_process_aggregates_incremental(self):
+        """
+        Tests that incrementally updating aggregates as a single safety filter
+        changes gives the same results as the reference implementation.
+        """
+        s = Systems.load_from_file(columnar=True)
+        f = SafetyAggFilter()
+        s.aggfilter.add(f)
+        s.process_aggregates()
+        changes = [
+            (f.set_tectonics, 5, True), (f.set_tectonics, 4, True), (f.set_tectonics, 7, True),
+            (f.set_weather, 2, True), (f.set_temp, 300, True), (f.set_bio, 0, True),
+            (f.set_bio, 400, True), (f.set_temp, 100, False), (f.set_tectonics, 2, True),
+            ]
+        for (setter, val, less_than) in changes:
+            setter(val, less_than)
+            s.process_aggregates_columnar()
+            incremental = dict([(system.idnum, (system.mineral_agg.value(),
+                system.mineral_agg.exotic, system.bio_agg, system.bio_danger_agg))
+                for system in s.system_list])
+            ranges = (s.agg_min_value, s.agg_max_value, s.bio_agg_min_value, s.bio_agg_max_value)
+            s.process_aggregates_objects()
+            for system in s.system_list:
+                self.assertEqual(incremental[system.idnum], (system.mineral_agg.value(),
+                    system.mineral_agg.exotic, system.bio_agg, system.bio_danger_agg))
+            self.assertEqual(ranges, (s.agg_min_value, s.agg_max_value,
+                s.bio_agg_min_value, s.bio_agg_max_value))
+
+    def test_apply_safety_delta(self):
+        """
+        Tests doing an incremental aggregate update directly, to make sure
+        only the systems whose planets have changed are touched
+        """
+        f = SafetyAggFilter()
+        self.s.aggfilter.add(f)
+        sys1 = self.s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys1.addplanet(Planet(1, 'Acid', 'Acid World', 5, 1, 100, 1, 10, 5, MinData(base=3)))
+        sys1.addplanet(Planet(2, 'Acid', 'Acid World', 1, 1, 100, 1, 5, 0, MinData(radioactive=3)))
+        sys2 = self.s.add_system(2, 'System', 'Beta', 5500, 5500, 'blue dwarf', '')
+        sys2.addplanet(Planet(3, 'Acid', 'Acid World', 2, 1, 100, 1, 0, 0, MinData(exotic=3)))
+        self.s.build_columns()
+        self.s.process_aggregates()
+        old = f.state()
+        f.set_tectonics(4)
+        self.assertEqual(self.s.apply_safety_delta(old, f.state()), True)
+        self.assertEqual(self.s.agg_changed, [sys1])
+        self.assertEqual(self.s.agg_sums['value'], [24, 75])
+        self.assertEqual(self.s.agg_sums['bio'], [5, 0])
+        self.assertEqual(list(self.s.planet_mask), [0, 1, 1])
+        old = f.state()
+        f.set_tectonics(4, False)
+        self.assertEqual(self.s.apply_safety_delta(old, f.state()), False)
+
+    def test_within(self):
+        """
+        Tests finding systems and quasispace exits within a given radius
+        """
+        sys1 = self.s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys2 = self.s.add_system(2, 'System', 'Beta', 5500, 5000, 'blue dwarf', '')
+        sys3 = self.s.add_system(3, 'System', 'Gamma', 9000, 9000, 'blue dwarf', '')
+        q = self.s.add_quasi(4900, 4900, 3000, 3000, 'C')
+        self.assertEqual(len(self.s.spatial), 4)
+        self.assertEqual(sorted(self.s.within(sys1, 50), key=id), sorted([sys1, sys2, q], key=id))
+        self.assertEqual(sorted(self.s.within(sys1, 49), key=id), sorted([sys1, q], key=id))
+        self.assertEqual(self.s.within(sys3, 10), [sys3])
+
+    def test_within_matches_distance(self):
+        """
+        Makes sure that using the spatial index on our main datafile gives
+        the same results as checking distances to everything
+        """
+        s = Systems.load_from_file()
+        for center in [s.get(2250), s.get('A'), s.get(2097)]:
+            for radius in [0, 10, 75, 300]:
+                expected = [system for system in s.getall() if system.distance_to(center) <= radius]
+                self.assertEqual(sorted(s.within(center, radius), key=id), sorted(expected, key=id))
+
+    def test_process_aggregates_prox_filter(self):
+        """
+        Process aggregates with a proximity filter, which should get
+        its matches from our spatial index
+        """
+        sys1 = self.s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys2 = self.s.add_system(2, 'System', 'Beta', 5500, 5500, 'blue dwarf', '')
+        pdf = ProxDispFilter(sys1, 50)
+        self.s.dispfilter.add(pdf)
+        self.s.process_aggregates()
+        self.assertEqual(pdf.matches, set([sys1]))
+        self.assertEqual(sys1.highlight, True)
+        self.assertEqual(sys2.highlight, False)
+
+    def test_name_index_matches_scan(self):
+        """
+        Makes sure that name searches using our n-gram index on the main
+        datafile match a straightforward scan of every system
+        """
+        s = Systems.load_from_file()
+        for query in ['', 'a', 'al', 'alpha', 'serpentis', 'homeworld', 'starbase', 'lpha v', 'zzz']:
+            for special in [False, True]:
+                ndf = NameDispFilter(query, special)
+                expected = set([system for system in s.getall() if ndf.approve(system)])
+                ndf.prepare(s)
+                self.assertEqual(ndf.matches, expected)
+
+    def test_name_index_lazy(self):
+        """
+        Tests that our name index is only built when it's first used, and
+        kept up to date after that
+        """
+        self.s.add_system(1, 'Alpha', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.assertIsNone(self.s.name_index)
+        self.assertEqual(self.s.names.search('alpha'), set([0]))
+        self.assertIsNotNone(self.s.name_index)
+        self.s.add_system(2, 'Beta', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.assertEqual(self.s.names.search('alpha'), set([0, 1]))
+
+    def test_build_type_index(self):
+        """
+        Tests building our planet type index, with and without columns
+        """
+        sys1 = self.s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys1.addplanet(Planet(1, 'Acid', 'Acid World', 1, 1, 100, 1, 10, 5, MinData()))
+        sys2 = self.s.add_system(2, 'System', 'Beta', 5500, 5500, 'blue dwarf', '')
+        sys2.addplanet(Planet(2, 'Acid', 'Acid World', 1, 1, 100, 1, 10, 5, MinData()))
+        sys2.addplanet(Planet(3, 'Water', 'Water World', 1, 1, 100, 1, 10, 5, MinData()))
+        for columnar in [False, True]:
+            if columnar:
+                self.s.build_columns()
+            types = self.s.build_type_index()
+            self.assertEqual(self.s.types, types)
+            self.assertEqual(types.lookup('Acid'), set([0, 1]))
+            self.assertEqual(types.lookup('Water'), set([1]))
+
+    def test_type_index_matches_scan(self):
+        """
+        Makes sure that type searches using our type index on the main
+        datafile match a scan through all the planets
+        """
+        s = Systems.load_from_file()
+        self.assertNotEqual(s.types, None)
+        for ptype in list(s.planet_types) + ['', 'S', 'Water World', 'Nonexistent']:
+            tdf = TypeDispFilter(ptype)
+            expected = set([system for system in s.system_list if tdf.approve(system)])
+            tdf.prepare(s)
+            self.assertEqual(tdf.matches, expected)
+
+    def test_constellation_index(self):
+        """
+        Tests our constellation membership index
+        """
+        self.s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        self.s.add_system(2, 'Other', 'Alpha', 5500, 5500, 'blue dwarf', '')
+        self.s.add_system(3, 'System', 'Beta', 6000, 6000, 'blue dwarf', '')
+        self.assertEqual(self.s.constellations, {'System': [0, 2], 'Other': [1]})
+        self.assertEqual(self.s.constellation_mask('System'), 0b101)
+        self.assertEqual(self.s.constellation_mask('Other'), 0b010)
+        self.assertEqual(self.s.constellation_mask('Nothing'), 0)
+        self.s.add_system(4, 'Other', 'Beta', 6000, 6000, 'blue dwarf', '')
+        self.assertEqual(self.s.constellation_mask('Other'), 0b1010)
+
+    def test_system_mask_matches_approve(self):
+        """
+        Makes sure that intersecting per-filter bitsets on the main datafile
+        gives the same results as approving each system in turn
+        """
+        s = Systems.load_from_file()
+        chains = [
+            [],
+            [NameDispFilter('a', False)],
+            [NameDispFilter('home', True), ProxDispFilter(s.get(2250), 400)],
+            [TypeDispFilter('Water'), ConstDispFilter('Serpentis')],
+            [ProxDispFilter(s.get('A'), 250), TypeDispFilter('Acid'), NameDispFilter('alpha', False)],
+            ]
+        for chain in chains:
+            f = Filter()
+            for fil in chain:
+                f.add(fil)
+            expected = bitset_from_flags([f.approve(system) for system in s.system_list])
+            self.assertEqual(f.system_mask(s), expected)
+
     def test_load_from_file_invalid_file(self):
         """
         Tests loading from an invalid filename (ie: this test file)
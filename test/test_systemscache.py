@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+import unittest.mock
+
+from uqm_map.data import NameDispFilter
+from uqm_map.cache import SystemsCache
+
+class SystemsCacheTests(unittest.TestCase):
+    """
+    Tests for our `SystemsCache` class, which keeps loaded `Systems` objects
+    in an on-disk cache.
+    """
+
+    def setUp(self):
+        """
+        Gives us a temporary cache directory, and a copy of our main datafile
+        which we're free to modify.
+        """
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tempdir, 'cache')
+        self.filename = os.path.join(self.tempdir, 'uqm.json.gz')
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'data', 'uqm.json.gz'), self.filename)
+        self.c = SystemsCache(self.cache_dir)
+
+    def tearDown(self):
+        """
+        Cleans up our temporary directory
+        """
+        shutil.rmtree(self.tempdir)
+
+    def test_load_cold_and_warm(self):
+        """
+        Tests loading a datafile once to populate the cache, and then again
+        from the cache.
+        """
+        s = self.c.load(self.filename)
+        self.assertEqual(len(self.c.entries()), 1)
+        t = self.c.load(self.filename)
+        self.assertIsNot(s, t)
+        self.assertEqual(len(t.systems), len(s.systems))
+        self.assertEqual(t.agg_max_value, s.agg_max_value)
+        self.assertEqual(t.planet_types, s.planet_types)
+        for system in s.system_list:
+            other = t.get(system.idnum)
+            self.assertEqual([p.name for p in other.planets], [p.name for p in system.planets])
+            self.assertEqual(other.mineral_agg_full.value(), system.mineral_agg_full.value())
+
+    def test_load_filters_after_cache(self):
+        """
+        Makes sure that filters still work on a `Systems` object which came
+        from the cache
+        """
+        self.c.load(self.filename)
+        s = self.c.load(self.filename)
+        self.assertEqual(s.dispfilter.compiled, None)
+        s.dispfilter.add(NameDispFilter('sol', False))
+        s.process_aggregates()
+        self.assertEqual([system.fullname for system in s.system_list if system.highlight], ['Sol'])
+
+    def test_key_options(self):
+        """
+        Tests that different load options get different cache entries
+        """
+        self.assertNotEqual(self.c.key(self.filename), self.c.key(self.filename, lazy=True))
+        self.assertEqual(self.c.key(self.filename, lazy=True), self.c.key(self.filename, lazy=True))
+
+    def test_key_changed_file(self):
+        """
+        Tests that modifying a datafile changes its cache key
+        """
+        key = self.c.key(self.filename)
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertNotEqual(self.c.key(self.filename), key)
+
+    def test_get_missing(self):
+        """
+        Tests getting a key which isn't in the cache
+        """
+        os.makedirs(self.cache_dir)
+        self.assertEqual(self.c.get('missing'), None)
+
+    def test_get_corrupt(self):
+        """
+        Tests getting a cache entry which can't be unpickled, which should
+        be removed.
+        """
+        os.makedirs(self.cache_dir)
+        with open(self.c.path('corrupt'), 'wb') as df:
+            df.write(b'not a pickle')
+        self.assertEqual(self.c.get('corrupt'), None)
+        self.assertFalse(os.path.exists(self.c.path('corrupt')))
+
+    def test_evict(self):
+        """
+        Tests that the least-recently-used entries are removed once the
+        cache gets too large
+        """
+        self.c.max_size = 1
+        self.c.put('first', [1])
+        os.utime(self.c.path('first'), (0, 0))
+        self.c.put('second', [2])
+        self.assertFalse(os.path.exists(self.c.path('first')))
+        self.assertEqual(self.c.get('second'), [2])
+
+    def test_evict_lru(self):
+        """
+        Tests that reading an entry counts as using it, for eviction purposes
+        """
+        self.c.put('first', [1])
+        self.c.put('second', [2])
+        os.utime(self.c.path('first'), (0, 0))
+        os.utime(self.c.path('second'), (1, 1))
+        self.c.get('first')
+        self.c.max_size = os.path.getsize(self.c.path('first'))
+        self.c.evict()
+        self.assertTrue(os.path.exists(self.c.path('first')))
+        self.assertFalse(os.path.exists(self.c.path('second')))
+
+    def test_load_mmap_not_cached(self):
+        """
+        Tests that memory-mapped loads skip the cache
+        """
+        from uqm_map import datafile
+        binary = os.path.join(self.tempdir, 'uqm.bin')
+        datafile.convert(self.filename, binary)
+        s = self.c.load(binary, mmap=True)
+        self.assertEqual(len(s.systems), 518)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_default_cache_dir_without_xdg(self):
+        """
+        Tests working out our cache directory when the XDG modules aren't
+        available
+        """
+        blocked = {'xdg': None, 'xdg.BaseDirectory': None, 'uqm_map.xdg': None}
+        with unittest.mock.patch.dict(sys.modules, blocked):
+            with unittest.mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.tempdir}):
+                self.assertEqual(SystemsCache.default_cache_dir(), os.path.join(self.tempdir, 'uqm_map'))
+            with unittest.mock.patch.dict(os.environ, {'XDG_CACHE_HOME': 'relative', 'HOME': self.tempdir}):
+                self.assertEqual(SystemsCache.default_cache_dir(),
+                    os.path.join(self.tempdir, '.cache', 'uqm_map'))
+
+    def test_load_no_cache_dir(self):
+        """
+        Tests that loads go straight through when there's no cache directory
+        """
+        c = SystemsCache(self.cache_dir)
+        c.cache_dir = None
+        s = c.load(self.filename)
+        self.assertEqual(len(s.system_list), 502)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_default_load_without_xdg(self):
+        """
+        Tests the default (cached) query loading path in a fresh interpreter
+        with the XDG modules blocked, which should use `$XDG_CACHE_HOME`
+        """
+        code = 'import sys\n' \
+            'sys.modules["xdg"] = None\n' \
+            'sys.modules["xdg.BaseDirectory"] = None\n' \
+            'from uqm_map import query\n' \
+            'systems = query.load_systems(sys.argv[1], cache=True)\n' \
+            'print(len(systems.system_list))\n'
+        env = dict(os.environ, XDG_CACHE_HOME=self.tempdir)
+        output = subprocess.check_output([sys.executable, '-c', code, self.filename],
+            cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'), env=env)
+        self.assertEqual(output.decode('utf-8').strip(), '502')
+        self.assertEqual(len(SystemsCache(os.path.join(self.tempdir, 'uqm_map')).entries()), 1)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from uqm_map.data import Systems
+from uqm_map.route import RoutePlanner
+from uqm_map.tour import TourBuilder, distance_matrix, neighbour_lists, \
+    nearest_neighbour, two_opt, or_opt, tour_length
+
+class Point(object):
+    """
+    Just a position, for testing the tour functions directly
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+class TourBuilderTests(unittest.TestCase):
+    """
+    Tests for our `TourBuilder` class, which finds short tours through the
+    highlighted systems.
+    """
+
+    def setUp(self):
+        """
+        Some vars we might need on (nearly) every test.  Our systems sit
+        along a line, added out of order, with another pair off on their
+        own which aren't highlighted.
+        """
+        self.s = Systems()
+        self.start = self.s.add_system(1, 'System', 'Start', 0, 0, 'blue dwarf', '')
+        self.line = {}
+        for (idnum, x) in enumerate([3000, 1000, 5000, 2000, 4000], 2):
+            self.line[x] = self.s.add_system(idnum, 'System', 'X{}'.format(x), x, 0, 'blue dwarf', '')
+        for (idnum, y) in enumerate([1000, 2000], 10):
+            system = self.s.add_system(idnum, 'System', 'Y{}'.format(y), 0, y, 'blue dwarf', '')
+            system.highlight = False
+
+    def test_points(self):
+        """
+        Tests that we tour just the highlighted systems, after our start
+        """
+        b = TourBuilder(self.s, self.start)
+        self.assertIs(b.points[0], self.start)
+        self.assertEqual(set(b.points[1:]), set(self.line.values()))
+        self.assertEqual(len(b.matrix), 6)
+        self.assertEqual(b.matrix[0][1], 300)
+
+    def test_build_one_way(self):
+        """
+        Tests a one-way tour, which should head straight along the line
+        """
+        tour = TourBuilder(self.s, self.start).build(restarts=3, time_limit=None)
+        self.assertEqual(tour.stops, [self.line[x] for x in [1000, 2000, 3000, 4000, 5000]])
+        self.assertAlmostEqual(tour.length, 500)
+
+    def test_build_round_trip(self):
+        """
+        Tests a round trip, including systems off the line
+        """
+        for system in self.s.system_list:
+            system.highlight = True
+        tour = TourBuilder(self.s, self.start, round_trip=True).build(restarts=3, time_limit=None)
+        self.assertEqual(len(tour.stops), 7)
+        self.assertAlmostEqual(tour.length, 700+(500**2+200**2)**0.5)
+
+    def test_build_from_quasispace(self):
+        """
+        Tests a tour starting from a quasispace exit, which is already
+        highlighted
+        """
+        qs = self.s.add_quasi(6000, 0, 500, 500, 'A')
+        qs.highlight = True
+        tour = TourBuilder(self.s, qs).build(restarts=1, time_limit=None)
+        self.assertEqual(tour.stops, [self.line[x] for x in [5000, 4000, 3000, 2000, 1000]] + [self.start])
+        self.assertAlmostEqual(tour.length, 600)
+
+    def test_build_nothing(self):
+        """
+        Tests a tour with nothing highlighted
+        """
+        for system in self.line.values():
+            system.highlight = False
+        tour = TourBuilder(self.s, self.start).build(restarts=1, time_limit=None)
+        self.assertEqual(tour.stops, [])
+        self.assertEqual(tour.length, 0)
+
+    def test_build_planner(self):
+        """
+        Tests a tour using route costs, which can take shortcuts through
+        quasispace
+        """
+        self.s.add_quasi(0, 0, 500, 500, 'A')
+        self.s.add_quasi(5000, 0, 501, 500, 'B')
+        b = TourBuilder(self.s, self.start, planner=RoutePlanner(self.s))
+        self.assertAlmostEqual(b.matrix[0][b.points.index(self.line[5000])], 1)
+        tour = b.build(restarts=1, time_limit=None)
+        self.assertAlmostEqual(tour.length, 401)
+
+    def test_build_processes(self):
+        """
+        Tests that spreading restarts across processes gives the same tour
+        """
+        b = TourBuilder(self.s, self.start, round_trip=True)
+        serial = b.build(restarts=4, time_limit=None, seed=2)
+        pooled = b.build(restarts=4, time_limit=None, seed=2, processes=2)
+        self.assertEqual(serial.to_dict(), pooled.to_dict())
+
+    def test_build_time_limit(self):
+        """
+        Tests a build limited just by time, which still finishes a restart
+        """
+        tour = TourBuilder(self.s, self.start).build(time_limit=0)
+        self.assertAlmostEqual(tour.length, 500)
+
+    def test_build_no_limits(self):
+        """
+        Tests that we refuse to search forever
+        """
+        b = TourBuilder(self.s, self.start)
+        with self.assertRaises(ValueError) as cm:
+            b.build(restarts=None, time_limit=None)
+        with self.assertRaises(ValueError) as cm:
+            b.build(restarts=0)
+
+    def test_to_dict(self):
+        """
+        Tests our JSON-friendly tour description
+        """
+        for system in self.line.values():
+            system.highlight = system.x < 3000
+        info = TourBuilder(self.s, self.start).build(restarts=1, time_limit=None).to_dict()
+        self.assertEqual(info, {'start': 'Start System', 'stops': ['X1000 System', 'X2000 System'],
+            'length': 200, 'round_trip': False})
+
+    def test_neighbour_lists(self):
+        """
+        Tests finding each point's nearest neighbours
+        """
+        matrix = distance_matrix([Point(0, 0), Point(100, 0), Point(300, 0), Point(1000, 0)])
+        self.assertEqual(matrix[1][3], 90)
+        self.assertEqual(neighbour_lists(matrix, 2), [[1, 2], [0, 2], [1, 0], [2, 1]])
+
+    def test_nearest_neighbour(self):
+        """
+        Tests building our starting tour
+        """
+        matrix = distance_matrix([Point(0, 0), Point(300, 0), Point(100, 0), Point(1000, 0)])
+        self.assertEqual(nearest_neighbour(matrix, neighbour_lists(matrix, 1)), [0, 2, 1, 3])
+
+    def test_two_opt(self):
+        """
+        Tests uncrossing a tour
+        """
+        matrix = distance_matrix([Point(0, 0), Point(1000, 1000), Point(0, 1000), Point(1000, 0)])
+        order = [0, 1, 2, 3]
+        self.assertTrue(two_opt(order, matrix, neighbour_lists(matrix, 3), round_trip=True))
+        self.assertAlmostEqual(tour_length(order, matrix, round_trip=True), 400)
+        self.assertFalse(two_opt(order, matrix, neighbour_lists(matrix, 3), round_trip=True))
+
+    def test_or_opt(self):
+        """
+        Tests moving a misplaced point
+        """
+        matrix = distance_matrix([Point(x, 0) for x in [0, 1000, 2000, 3000, 4000]])
+        order = [0, 2, 1, 3, 4]
+        self.assertTrue(or_opt(order, matrix, neighbour_lists(matrix, 2)))
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+        self.assertFalse(or_opt(order, matrix, neighbour_lists(matrix, 2)))
+
+    def test_tour_length(self):
+        """
+        Tests measuring tours
+        """
+        matrix = distance_matrix([Point(0, 0), Point(300, 400), Point(300, 0)])
+        self.assertAlmostEqual(tour_length([0, 1, 2], matrix), 90)
+        self.assertAlmostEqual(tour_length([0, 1, 2], matrix, round_trip=True), 120)
+        self.assertEqual(tour_length([], matrix, round_trip=True), 0)
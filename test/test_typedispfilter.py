@@ -20,7 +20,7 @@
 
 import unittest
 
-from uqm_map.data import TypeDispFilter, System, Planet, MinData
+from uqm_map.data import TypeDispFilter, System, Systems, Planet, MinData
 
 class TypeDispFilterTests(unittest.TestCase):
     """
@@ -101,3 +101,47 @@ class TypeDispFilterTests(unittest.TestCase):
         tdf = TypeDispFilter('Acid World')
         system = System(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
         self.assertEqual(tdf.approve(system), False)
+
+    def test_predicate(self):
+        """
+        Tests using our standalone predicate function
+        """
+        system = System(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        system.addplanet(self.planet_acid)
+        system.addplanet(self.planet_dust)
+        self.assertEqual(TypeDispFilter('Dust').predicate()(system), True)
+        self.assertEqual(TypeDispFilter('Emerald').predicate()(system), False)
+
+    def test_prepare(self):
+        """
+        Tests matching after being prepared with a `Systems` object, so
+        that our matches come from the planet type index
+        """
+        s = Systems()
+        sys1 = s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys1.addplanet(self.planet_acid)
+        sys1.addplanet(self.planet_dust)
+        sys2 = s.add_system(2, 'System', 'Beta', 5000, 5000, 'blue dwarf', '')
+        sys2.addplanet(self.planet_chlorine)
+        sys3 = s.add_system(3, 'System', 'Gamma', 5000, 5000, 'blue dwarf', '')
+        tdf = TypeDispFilter('Dust')
+        tdf.prepare(s)
+        self.assertNotEqual(s.types, None)
+        self.assertEqual(tdf.matches, set([sys1]))
+        self.assertEqual(tdf.approve(sys1), True)
+        self.assertEqual(tdf.approve(sys2), False)
+        self.assertEqual(tdf.approve(sys3), False)
+
+    def test_system_mask(self):
+        """
+        Tests getting a bitset of matching systems
+        """
+        s = Systems()
+        sys1 = s.add_system(1, 'System', 'Alpha', 5000, 5000, 'blue dwarf', '')
+        sys1.addplanet(self.planet_acid)
+        sys2 = s.add_system(2, 'System', 'Beta', 5000, 5000, 'blue dwarf', '')
+        sys2.addplanet(self.planet_chlorine)
+        sys3 = s.add_system(3, 'System', 'Gamma', 5000, 5000, 'blue dwarf', '')
+        sys3.addplanet(self.planet_acid)
+        self.assertEqual(TypeDispFilter('Acid').system_mask(s), 0b101)
+        self.assertEqual(TypeDispFilter('Dust').system_mask(s), 0)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+from uqm_map.index import TypeIndex
+
+class TypeIndexTests(unittest.TestCase):
+    """
+    Tests for our `TypeIndex` class, which maps planet types (and their
+    prefixes) to the systems containing them.
+    """
+
+    def setUp(self):
+        """
+        Some vars we might need on (nearly) every test
+        """
+        self.i = TypeIndex()
+        self.i.add(0, 'Acid World')
+        self.i.add(0, 'Chlorine World')
+        self.i.add(1, 'Acid World')
+        self.i.add(2, 'StarBase')
+        self.i.add(3, 'Chondrite World')
+
+    def test_init(self):
+        """
+        Tests our basic initialization routine
+        """
+        i = TypeIndex()
+        self.assertEqual(i.types, {})
+        self.assertEqual(i.lookup('Acid'), set())
+
+    def test_add(self):
+        """
+        Tests adding types to the index
+        """
+        self.assertEqual(self.i.types['Acid World'], set([0, 1]))
+        self.assertEqual(self.i.prefixes['Acid'], set(['Acid World']))
+        self.assertEqual(self.i.prefixes['Ch'], set(['Chlorine World', 'Chondrite World']))
+
+    def test_add_all(self):
+        """
+        Tests adding several systems for a type at once
+        """
+        self.i.add_all([4, 5], 'Acid World')
+        self.i.add_all([6], 'Sapphire World')
+        self.i.add_all([], 'Water World')
+        self.assertEqual(self.i.types['Acid World'], set([0, 1, 4, 5]))
+        self.assertEqual(self.i.lookup('S'), set([2, 6]))
+        self.assertEqual(self.i.lookup('Water'), set())
+
+    def test_lookup(self):
+        """
+        Tests looking up types
+        """
+        self.assertEqual(self.i.lookup('Acid'), set([0, 1]))
+        self.assertEqual(self.i.lookup('Acid World'), set([0, 1]))
+        self.assertEqual(self.i.lookup('StarBase'), set([2]))
+        self.assertEqual(self.i.lookup('Ch'), set([0, 3]))
+        self.assertEqual(self.i.lookup('Chlorine World!'), set())
+        self.assertEqual(self.i.lookup('acid'), set())
+        self.assertEqual(self.i.lookup(''), set([0, 1, 2, 3]))
+
+    def test_lookup_after_add(self):
+        """
+        Tests that cached lookups are updated when new data comes in
+        """
+        self.assertEqual(self.i.lookup('Acid'), set([0, 1]))
+        self.i.add(4, 'Acid World')
+        self.assertEqual(self.i.lookup('Acid'), set([0, 1, 4]))
+
+    def test_lookup_misses_not_cached(self):
+        """
+        Tests that looking up prefixes which don't match anything doesn't
+        grow our cache
+        """
+        self.i.lookup('Acid')
+        for n in range(10):
+            self.assertEqual(self.i.lookup('Nothing {}'.format(n)), set())
+        self.assertEqual(list(self.i.cache.keys()), ['Acid'])
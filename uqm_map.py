@@ -21,7 +21,6 @@
 import os
 import sys
 import argparse
-from uqm_map.gui import Application
 
 # TODO: Figure out a reasonable way to do this so it works both as a
 # checked-out git project and something that's been installed properly
@@ -38,10 +37,16 @@ parser.add_argument('-d', '--datafile',
         type=str,
         default=datafile_default,
         help='Datafile to load for starmap')
+parser.add_argument('-n', '--no-cache',
+        dest='cache',
+        action='store_false',
+        help='Don\'t use (or update) the cache of parsed datafiles')
 
 # Parse arguments
 args = parser.parse_args()
 
-# Run the GUI
-gui = Application(args.datafile)
+# Run the GUI.  Qt is only imported at this point, so that everything above
+# (and the data classes themselves) stay cheap to import.
+from uqm_map.gui import Application
+gui = Application(args.datafile, cache=args.cache)
 sys.exit(gui.exec_())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+An on-disk cache of fully-loaded `Systems` objects, so that starting up
+doesn't have to decompress, parse and aggregate the same datafile every
+time.  Cache entries are pickles stored in our XDG cache directory, named
+after a fingerprint of the datafile (its path, size, mtime and a hash of
+its contents) plus the options it was loaded with, so a changed datafile
+simply won't find its old entry.  The cache is kept under a maximum total
+size by removing the least-recently-used entries.
+"""
+
+import os
+import gc
+import pickle
+import hashlib
+import tempfile
+
+from uqm_map.data import Systems
+
+# Bump this whenever the layout of the data classes changes, so that old
+# pickles stop being used.
+cache_version = 1
+
+class SystemsCache(object):
+    """
+    Class to load `Systems` objects through our on-disk cache.  If `cache_dir`
+    isn't given, our XDG cache directory will be used (see
+    `default_cache_dir`).  If there's no cache directory at all, loads just
+    go straight through to `Systems.load_from_file`.
+    """
+
+    suffix = '.pickle'
+
+    def __init__(self, cache_dir=None, max_size=256*1024*1024):
+        if cache_dir is None:
+            cache_dir = self.default_cache_dir()
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def default_cache_dir():
+        """
+        Returns our XDG cache directory.  The XDG modules are optional, so
+        without them we work out the same place ourselves, from
+        `$XDG_CACHE_HOME` or `~/.cache`.  Returns `None` if there's no
+        sensible place to put the cache.
+        """
+        try:
+            # Imported here so the XDG modules are only needed when we
+            # actually use the default location
+            from uqm_map import xdg
+            return xdg.base_cache_dir
+        except (ImportError, OSError):
+            pass
+        base = os.environ.get('XDG_CACHE_HOME')
+        if not base or not os.path.isabs(base):
+            home = os.path.expanduser('~')
+            if not os.path.isabs(home):
+                return None
+            base = os.path.join(home, '.cache')
+        return os.path.join(base, 'uqm_map')
+
+    @staticmethod
+    def fingerprint(filename):
+        """
+        Returns a string which identifies the current contents of the
+        given datafile.
+        """
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        content = hashlib.sha256()
+        with open(filename, 'rb') as df:
+            for chunk in iter(lambda: df.read(1024*1024), b''):
+                content.update(chunk)
+        return '{}\0{}\0{}\0{}'.format(filename, stat.st_size, stat.st_mtime_ns, content.hexdigest())
+
+    def key(self, filename, **options):
+        """
+        Returns the cache key for the given datafile, loaded with the
+        given `Systems.load_from_file` options.
+        """
+        key = hashlib.sha256()
+        key.update('{}\0{}\0{}'.format(cache_version, self.fingerprint(filename),
+            sorted(options.items())).encode('utf-8'))
+        return key.hexdigest()
+
+    def path(self, key):
+        """
+        Returns the path of the cache entry for the given key
+        """
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key):
+        """
+        Returns the cached `Systems` object for the given key, or `None` if
+        we don't have a usable one.
+        """
+        path = self.path(key)
+        # Unpickling creates a huge number of objects at once, which would
+        # otherwise trigger the cyclic garbage collector over and over.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, 'rb') as df:
+                systems = pickle.load(df)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A corrupt or stale entry; just get rid of it
+            self.remove(path)
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        # Mark as recently used
+        os.utime(path)
+        return systems
+
+    def put(self, key, systems):
+        """
+        Stores the given `Systems` object in the cache under the given key,
+        and then trims the cache down to size.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        (fd, temp_path) = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as df:
+                pickle.dump(systems, df, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path(key))
+        except Exception:
+            self.remove(temp_path)
+            raise
+        self.evict()
+
+    def remove(self, path):
+        """
+        Removes the given cache file, if it's still around
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        """
+        Returns a list of `(mtime, size, path)` tuples for each of our cache
+        entries, least-recently-used first.
+        """
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(self.suffix):
+                path = os.path.join(self.cache_dir, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """
+        Removes least-recently-used entries until the cache fits in `max_size`.
+        The most recent entry is always kept.
+        """
+        entries = self.entries()
+        total = sum([size for (mtime, size, path) in entries])
+        for (mtime, size, path) in entries[:-1]:
+            if total <= self.max_size:
+                break
+            self.remove(path)
+            total -= size
+
+    def load(self, filename=None, **options):
+        """
+        Returns a `Systems` object for the given datafile, from the cache if
+        possible, or via `Systems.load_from_file` (storing the result in the
+        cache) if not.  Memory-mapped loads can't be cached, and are just
+        passed straight through, as is everything if we have no cache
+        directory.
+        """
+        if not filename:
+            filename = Systems.default_datafile()
+        if options.get('mmap') or self.cache_dir is None:
+            return Systems.load_from_file(filename, **options)
+        key = self.key(filename, **options)
+        systems = self.get(key)
+        if systems is None:
+            systems = Systems.load_from_file(filename, **options)
+            try:
+                self.put(key, systems)
+            except OSError:
+                # Not being able to write the cache shouldn't stop us
+                pass
+        return systems
@@ -18,14 +18,24 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import io
 import os
 import sys
 import math
-import gzip
-import json
+import array
+import bisect
 import string
+import operator
+import itertools
 import os.path
 
+from uqm_map.index import SpatialIndex, NameIndex, TypeIndex, bitset_from_indexes, bitset_to_flags
+
+# Version of the derived data layout which exporters can embed in datafiles
+# (see `uqm_map.derived`).  Bump this whenever it changes, so that older
+# datafiles get their derived data recomputed at load time instead.
+derived_version = 1
+
 class MinData(object):
     """
     A class to hold mineral data.  Each planet has one of these, and each
@@ -34,6 +44,10 @@ class MinData(object):
 
     min_vals = [ 'common', 'corrosive', 'base', 'noble', 'rare', 'precious', 'radioactive', 'exotic' ]
 
+    # RU value per unit of each mineral type, in the same order as `min_vals`.
+    # (`value()` has these hardcoded, for speed.)
+    min_ru = [ 1, 2, 3, 4, 5, 6, 8, 25 ]
+
     def __init__(self, common=0, corrosive=0, base=0, noble=0, rare=0, precious=0, radioactive=0, exotic=0):
         self.common = common
         self.corrosive = corrosive
@@ -100,9 +114,256 @@ class Planet(object):
         self.bio_danger = bio_danger
         self.mineral = mineral
 
+class PlanetColumns(object):
+    """
+    Columnar ("struct of arrays") storage for planet data.  Rather than keeping
+    a `Planet` and a `MinData` object around for every single planet, we keep
+    one typed array per numeric planet attribute, with the planets for each
+    system stored contiguously.  `system_offsets` holds the first row for each
+    system (indexed by `System.index`) plus a final entry for the total row
+    count, so the planets for system `i` live in the rows between
+    `system_offsets[i]` and `system_offsets[i+1]`.
+
+    Bulk code can read the columns directly.  Everything else gets at the data
+    via `PlanetView` objects, which look just like `Planet` objects.
+    """
+
+    typecode = 'i'
+    int_cols = [ 'tectonics', 'weather', 'temp', 'gravity', 'bio', 'bio_danger' ]
+
+    def __init__(self):
+        self.idnum = []
+        self.name = []
+        self.ptype = []
+        for col in self.int_cols:
+            setattr(self, col, array.array(self.typecode))
+        self.minerals = {}
+        for col in MinData.min_vals:
+            self.minerals[col] = array.array(self.typecode)
+        self.system_offsets = array.array(self.typecode, [0])
+        self.sorted_cache = {}
+
+    def __len__(self):
+        """
+        Returns the number of planets we're storing
+        """
+        return len(self.tectonics)
+
+    def num_systems(self):
+        """
+        Returns the number of systems we have planet ranges for
+        """
+        return len(self.system_offsets) - 1
+
+    def add_planet(self, idnum, name, ptype, tectonics, weather, temp, gravity, bio, bio_danger, minerals):
+        """
+        Adds a new planet row to the end of our columns, for the system which is
+        currently being filled in (see `end_system`).  `minerals` should be a
+        sequence of mineral weights, in the order given by `MinData.min_vals`.
+        Returns the new row number.
+        """
+        row = len(self)
+        self.idnum.append(idnum)
+        self.name.append(name)
+        self.ptype.append(ptype)
+        self.tectonics.append(tectonics)
+        self.weather.append(weather)
+        self.temp.append(temp)
+        self.gravity.append(gravity)
+        self.bio.append(bio)
+        self.bio_danger.append(bio_danger)
+        for (col, val) in zip(MinData.min_vals, minerals):
+            self.minerals[col].append(val)
+        self.sorted_cache = {}
+        return row
+
+    def end_system(self):
+        """
+        Closes off the planet range for the current system; any planets added
+        afterwards will belong to the next system.  Returns the index of the
+        system which was just closed off.
+        """
+        self.system_offsets.append(len(self))
+        return self.num_systems() - 1
+
+    def rows(self, index):
+        """
+        Returns the range of planet rows belonging to the system with the
+        given index.
+        """
+        return range(self.system_offsets[index], self.system_offsets[index+1])
+
+    def planets(self, index):
+        """
+        Returns a list of `PlanetView` objects for the system with the given
+        index.
+        """
+        return [PlanetView(self, row) for row in self.rows(index)]
+
+    def mineral(self, row):
+        """
+        Returns a new `MinData` object holding the minerals for the given row.
+        """
+        return MinData(*[self.minerals[col][row] for col in MinData.min_vals])
+
+    def materialize(self, index):
+        """
+        Returns a list of new, standalone `Planet` objects for the system with
+        the given index.
+        """
+        return [Planet(self.idnum[row], self.name[row], self.ptype[row],
+                self.tectonics[row], self.weather[row], self.temp[row], self.gravity[row],
+                self.bio[row], self.bio_danger[row], self.mineral(row))
+            for row in self.rows(index)]
+
+    def sorted_rows(self, col):
+        """
+        Returns a tuple containing the values of the named column in sorted
+        order, and the row numbers corresponding to each of those values.
+        Used to find all the planets whose values fall in a given range,
+        with `bisect`.  These are built on first use and then cached.
+        """
+        if col not in self.sorted_cache:
+            column = getattr(self, col)
+            rows = sorted(range(len(column)), key=column.__getitem__)
+            self.sorted_cache[col] = (
+                array.array(self.typecode, map(column.__getitem__, rows)),
+                array.array(self.typecode, rows),
+                )
+        return self.sorted_cache[col]
+
+    def row_system(self, row):
+        """
+        Returns the index of the system which the given row belongs to
+        """
+        return bisect.bisect_right(self.system_offsets, row) - 1
+
+    def group_sums(self, column, mask=None):
+        """
+        Returns a list of per-system sums of the given column (one entry per
+        system index).  If `mask` is passed in, it should be a sequence of 0/1
+        values, one per row, and only rows whose mask value is 1 will be
+        counted.  This is done with a single prefix-sum pass over the column,
+        rather than looping over each system's planets.
+        """
+        if mask is not None:
+            column = map(operator.mul, column, mask)
+        prefix = list(itertools.accumulate(column, initial=0))
+        ends = list(map(prefix.__getitem__, self.system_offsets))
+        return list(map(operator.sub, ends[1:], ends[:-1]))
+
+    def aggregate(self, mask=None):
+        """
+        Returns a dict of per-system sums for `bio`, `bio_danger`, each mineral
+        type in `MinData.min_vals`, and the total mineral RU `value`.  `mask`
+        behaves as in `group_sums`.  This doesn't alter any state, so it's
+        safe to call with any number of different masks.
+        """
+        sums = {}
+        sums['bio'] = self.group_sums(self.bio, mask)
+        sums['bio_danger'] = self.group_sums(self.bio_danger, mask)
+        value = [0]*self.num_systems()
+        for (col, ru) in zip(MinData.min_vals, MinData.min_ru):
+            sums[col] = self.group_sums(self.minerals[col], mask)
+            value = list(map(operator.add, value, map(ru.__mul__, sums[col])))
+        sums['value'] = value
+        return sums
+
+    def aggregate_systems(self, indexes, approve=None):
+        """
+        Returns the same sums as `aggregate`, but only for the systems with the
+        given indexes, as dicts keyed by system index rather than lists.  This
+        only looks at those systems' rows, so it's much quicker than `aggregate`
+        when there's just a few systems to look at.  If `approve` is passed in,
+        it should be a function which takes a row number, and only rows it
+        returns true for will be counted.
+        """
+        cols = [('bio', self.bio), ('bio_danger', self.bio_danger)]
+        cols.extend([(col, self.minerals[col]) for col in MinData.min_vals])
+        sums = dict([(col, {}) for (col, column) in cols])
+        sums['value'] = {}
+        for idx in indexes:
+            rows = self.rows(idx)
+            if approve is not None:
+                rows = list(filter(approve, rows))
+            for (col, column) in cols:
+                sums[col][idx] = sum(map(column.__getitem__, rows))
+            sums['value'][idx] = sum([sums[col][idx]*ru for (col, ru) in zip(MinData.min_vals, MinData.min_ru)])
+        return sums
+
+class PlanetView(object):
+    """
+    A lightweight read-only stand-in for `Planet`, which reads all its data
+    out of a row in a `PlanetColumns` object rather than storing it itself.
+    """
+
+    __slots__ = ('columns', 'row')
+
+    def __init__(self, columns, row):
+        self.columns = columns
+        self.row = row
+
+    @property
+    def idnum(self):
+        return self.columns.idnum[self.row]
+
+    @property
+    def name(self):
+        return self.columns.name[self.row]
+
+    @property
+    def ptype(self):
+        return self.columns.ptype[self.row]
+
+    @property
+    def tectonics(self):
+        return self.columns.tectonics[self.row]
+
+    @property
+    def weather(self):
+        return self.columns.weather[self.row]
+
+    @property
+    def temp(self):
+        return self.columns.temp[self.row]
+
+    @property
+    def gravity(self):
+        return self.columns.gravity[self.row]
+
+    @property
+    def bio(self):
+        return self.columns.bio[self.row]
+
+    @property
+    def bio_danger(self):
+        return self.columns.bio_danger[self.row]
+
+    @property
+    def mineral(self):
+        return self.columns.mineral(self.row)
+
+def and_masks(first, second):
+    """
+    Combines two masks (`bytes` objects of 0/1 values, of the same length)
+    with a logical AND, returning a new mask.  Either mask may be `None`,
+    meaning "approve everything."
+    """
+    if first is None:
+        return second
+    if second is None:
+        return first
+    length = len(first)
+    return (int.from_bytes(first, 'little') & int.from_bytes(second, 'little')).to_bytes(length, 'little')
+
 class Filter(object):
     """
     A class to hold filters that we'll use to limit systems/planets.
+
+    Rather than looping over our filters on every `approve()` call, we
+    "compile" the chain into a single fused predicate function the first
+    time it's needed (see `compile`).  That only gets redone when the chain
+    itself changes, or when the filters get prepared with new data.
     """
 
     def __init__(self):
@@ -116,12 +377,23 @@ class Filter(object):
         Resets the individual filters to None
         """
         self.filters = []
+        self.compiled = None
 
     def add(self, new_filter):
         """
         Adds a new filter to the filter chain.
         """
         self.filters.append(new_filter)
+        self.compiled = None
+
+    def __getstate__(self):
+        """
+        Our compiled predicate can't be pickled, so leave it out; it'll just
+        get compiled again when it's next needed.
+        """
+        state = self.__dict__.copy()
+        state['compiled'] = None
+        return state
 
     def filtering(self):
         """
@@ -129,25 +401,134 @@ class Filter(object):
         """
         return (len(self.filters) > 0)
 
+    def prepare(self, systems):
+        """
+        Gives each of our filters the chance to do any up-front work they'd
+        like to do with the given `Systems` object (such as consulting its
+        indexes) before we start calling `approve()` on its systems.
+        """
+        for fil in self.filters:
+            fil.prepare(systems)
+        self.compiled = None
+
+    @staticmethod
+    def predicate_cost(fil):
+        """
+        Returns a rough relative cost for calling the given filter's
+        predicate, so that `compile` can try the cheap ones first.  Filters
+        which have been prepared just do a set lookup, which is as cheap as
+        it gets; otherwise each filter class has its own `predicate_cost`.
+        """
+        if getattr(fil, 'matches', None) is not None:
+            return 0
+        return getattr(fil, 'predicate_cost', 1)
+
+    def compile(self):
+        """
+        Fuses our chain of filters into a single predicate function, which
+        takes an object and returns `True` if all our filters approve of it.
+        Each filter supplies its own `predicate()` function, with all of the
+        filter parameters it needs already bound, so evaluating the fused
+        predicate doesn't involve any per-filter method dispatch.  The
+        cheapest predicates (see `predicate_cost`) are tried first, so that
+        the expensive ones only get called on objects which have passed the
+        rest.  The result is stored in `compiled` and returned.
+        """
+        predicates = [fil.predicate() for fil in sorted(self.filters, key=self.predicate_cost)]
+        if len(predicates) == 0:
+            self.compiled = lambda obj: True
+        elif len(predicates) == 1:
+            self.compiled = predicates[0]
+        else:
+            def approve(obj):
+                for predicate in predicates:
+                    if not predicate(obj):
+                        return False
+                return True
+            self.compiled = approve
+        return self.compiled
+
+    def system_mask(self, systems):
+        """
+        Returns a bitset (see `uqm_map.index.bitset_from_flags`) with one bit per
+        system in the given `Systems` object's `system_list`, set for each system
+        which is approved by our filters.  Each filter produces its own bitset
+        straight from the indexes in `systems`, so we just need to intersect
+        them, rather than evaluating each system against each filter.
+        """
+        mask = (1 << len(systems.system_list)) - 1
+        for fil in self.filters:
+            mask &= fil.system_mask(systems)
+        return mask
+
+    def planet_mask(self, columns):
+        """
+        Returns a mask (as `bytes`) with one 0/1 entry for every row in the
+        given `PlanetColumns` object, showing which planets are approved by
+        all of our filters.  Only usable when all our filters are planet
+        filters which support `mask()` (ie: `SafetyAggFilter`).  Returns `None`
+        if we're not filtering at all.
+        """
+        mask = None
+        for fil in self.filters:
+            mask = and_masks(mask, fil.mask(columns))
+        return mask
+
     def approve(self, obj):
         """
         Returns true if the given object is approved, false if denied.
         """
-        for fil in self.filters:
-            if (not fil.approve(obj)):
-                return False
-        return True
+        if self.compiled is None:
+            self.compile()
+        return self.compiled(obj)
 
 class ProxDispFilter(object):
     """
     A class to hold filter information related to system proximity.
     """
 
+    # One distance calculation per system (see `Filter.predicate_cost`)
+    predicate_cost = 1
+
     def __init__(self, from_system, radius):
         self.from_system = from_system
         self.radius = radius
+        self.matches = None
+
+    def prepare(self, systems):
+        """
+        Finds everything within our radius using the spatial index in `systems`,
+        so that `approve()` only needs to do a set lookup.
+        """
+        if self.from_system:
+            self.matches = set(systems.within(self.from_system, self.radius))
+        else:
+            self.matches = set()
+
+    def system_mask(self, systems):
+        """
+        Returns a bitset of the matching systems in `systems` (see `Filter.system_mask`)
+        """
+        if not self.from_system:
+            return 0
+        return bitset_from_indexes([obj.index for obj in systems.within(self.from_system, self.radius)
+            if not obj.is_quasispace], len(systems.system_list))
+
+    def predicate(self):
+        """
+        Returns a standalone function which does the same job as `approve()`
+        """
+        if self.matches is not None:
+            return self.matches.__contains__
+        if not self.from_system:
+            return lambda system: False
+        from_system = self.from_system
+        radius = self.radius
+        return lambda system: system.distance_to(from_system) <= radius
 
     def approve(self, system):
+        if self.matches is not None:
+            return (system in self.matches)
         return (self.from_system and system.distance_to(self.from_system) <= self.radius)
 
 class TypeDispFilter(object):
@@ -157,15 +538,54 @@ class TypeDispFilter(object):
     the planets ourselves.
     """
 
+    # Has to look through every planet in the system (see `Filter.predicate_cost`)
+    predicate_cost = 3
+
     def __init__(self, ptype):
         self.ptype = ptype
         self.typelen = len(self.ptype)
+        self.matches = None
+
+    def prepare(self, systems):
+        """
+        Looks up the matching systems in the planet type index in `systems`,
+        so that `approve()` only needs to do a set lookup, no matter how many
+        planets each system has.
+        """
+        if systems.types is None:
+            systems.build_type_index()
+        self.matches = set([systems.system_list[idx] for idx in systems.types.lookup(self.ptype)])
+
+    def system_mask(self, systems):
+        """
+        Returns a bitset of the matching systems in `systems` (see `Filter.system_mask`)
+        """
+        if systems.types is None:
+            systems.build_type_index()
+        return bitset_from_indexes(systems.types.lookup(self.ptype), len(systems.system_list))
+
+    def predicate(self):
+        """
+        Returns a standalone function which does the same job as `approve()`
+        """
+        if self.matches is not None:
+            return self.matches.__contains__
+        ptype = self.ptype
+        typelen = self.typelen
+        def approve(system):
+            for planet in system.planets:
+                if (planet.ptype[:typelen] == ptype):
+                    return True
+            return False
+        return approve
 
     def approve(self, system):
         """
         Returns true if the system contains a planet of the given type,
         or false if not.
         """
+        if self.matches is not None:
+            return (system in self.matches)
         for planet in system.planets:
             if (planet.ptype[:self.typelen] == self.ptype):
                 return True
@@ -177,29 +597,101 @@ class NameDispFilter(object):
     also search in the 'extra' field if the 'special info' box is checked.
     """
 
+    # Substring searches through the system's text (see `Filter.predicate_cost`)
+    predicate_cost = 2
+
     def __init__(self, name, specialchecked):
         self.name = name.lower()
         self.specialchecked = specialchecked
+        self.matches = None
 
-    def approve(self, system):
+    def prepare(self, systems):
         """
-        Returns true if the system matches the given name, false if not.
+        Finds all matching systems using the n-gram name index in `systems`,
+        so that `approve()` only needs to do a set lookup.  Quasispace exits
+        aren't in the index, but there's few enough of them to just check.
+        """
+        self.matches = set([systems.system_list[idx] for idx in
+            systems.names.search(self.name, self.specialchecked)])
+        for quasi in systems.quasispace:
+            if self.match_text(quasi):
+                self.matches.add(quasi)
+
+    def system_mask(self, systems):
+        """
+        Returns a bitset of the matching systems in `systems` (see `Filter.system_mask`)
+        """
+        return bitset_from_indexes(systems.names.search(self.name, self.specialchecked),
+            len(systems.system_list))
+
+    def match_text(self, system):
+        """
+        Checks the given system's text directly, without using an index
         """
         return (system.fullname.lower().find(self.name) > -1 or
                 (self.specialchecked and system.extra.lower().find(self.name) > -1))
 
+    def predicate(self):
+        """
+        Returns a standalone function which does the same job as `approve()`
+        """
+        if self.matches is not None:
+            return self.matches.__contains__
+        name = self.name
+        if self.specialchecked:
+            return lambda system: (name in system.fullname.lower() or name in system.extra.lower())
+        else:
+            return lambda system: (name in system.fullname.lower())
+
+    def approve(self, system):
+        """
+        Returns true if the system matches the given name, false if not.
+        """
+        if self.matches is not None:
+            return (system in self.matches)
+        return self.match_text(system)
+
 class ConstDispFilter(object):
     """
     A class to hold filter information which matches constellation names.
     """
 
+    # Just a string comparison (see `Filter.predicate_cost`)
+    predicate_cost = 0
+
     def __init__(self, name):
         self.name = name
+        self.matches = None
+
+    def prepare(self, systems):
+        """
+        Looks up our constellation's systems in the constellation index in
+        `systems`, so that `approve()` only needs to do a set lookup.
+        """
+        self.matches = set([systems.system_list[idx] for idx in
+            systems.constellations.get(self.name, [])])
+
+    def system_mask(self, systems):
+        """
+        Returns a bitset of the matching systems in `systems` (see `Filter.system_mask`)
+        """
+        return systems.constellation_mask(self.name)
+
+    def predicate(self):
+        """
+        Returns a standalone function which does the same job as `approve()`
+        """
+        if self.matches is not None:
+            return self.matches.__contains__
+        name = self.name
+        return lambda system: (system.name == name)
 
     def approve(self, system):
         """
         Returns true if the system matches the given constellation name, false if not.
         """
+        if self.matches is not None:
+            return (system in self.matches)
         return (system.name == self.name)
 
 class SafetyAggFilter(object):
@@ -208,6 +700,12 @@ class SafetyAggFilter(object):
     mineral and bio data aggregates easier.
     """
 
+    # A handful of comparisons per planet (see `Filter.predicate_cost`)
+    predicate_cost = 1
+
+    # The planet attributes we check, in the same order as `state()`
+    state_cols = [ 'tectonics', 'weather', 'temp', 'bio_danger' ]
+
     def __init__(self):
         """
         Initial filter will end up accepting all planets on the map
@@ -223,6 +721,7 @@ class SafetyAggFilter(object):
         is `True`, we'll use a <= match.  Otherwise, >=.
         """
         self.tectonics_val = tectonics_val
+        self.tectonics_less_than = less_than
         if less_than:
             self.tectonics = self.tectonics_lte
         else:
@@ -234,6 +733,7 @@ class SafetyAggFilter(object):
         is `True`, we'll use a <= match.  Otherwise, >=.
         """
         self.weather_val = weather_val
+        self.weather_less_than = less_than
         if less_than:
             self.weather = self.weather_lte
         else:
@@ -245,6 +745,7 @@ class SafetyAggFilter(object):
         is `True`, we'll use a <= match.  Otherwise, >=.
         """
         self.temp_val = temp_val
+        self.temp_less_than = less_than
         if less_than:
             self.temp = self.temp_lte
         else:
@@ -256,17 +757,87 @@ class SafetyAggFilter(object):
         is `True`, we'll use a <= match.  Otherwise, >=.
         """
         self.bio_val = bio_val
+        self.bio_less_than = less_than
         if less_than:
             self.bio = self.bio_lte
         else:
             self.bio = self.bio_gte
 
+    def predicate(self):
+        """
+        Returns a standalone function which does the same job as `approve()`
+        """
+        return self.approve
+
     def approve(self, planet):
         """
         Returns true if the given planet is approved, false if denied.
         """
         return (self.tectonics(planet) and self.weather(planet) and self.temp(planet) and self.bio(planet))
 
+    def state(self):
+        """
+        Returns a tuple describing our current limits, with one `(value, less_than)`
+        tuple for each of the planet columns named in `state_cols`.
+        """
+        return (
+            (self.tectonics_val, self.tectonics_less_than),
+            (self.weather_val, self.weather_less_than),
+            (self.temp_val, self.temp_less_than),
+            (self.bio_val, self.bio_less_than),
+            )
+
+    def mask(self, columns):
+        """
+        Returns a mask (as `bytes`) with one 0/1 entry for every row in the
+        given `PlanetColumns` object, showing which planets we approve.  This
+        is equivalent to calling `approve()` on each planet in turn.
+        """
+        mask = None
+        for (col, (val, less_than)) in zip(SafetyAggFilter.state_cols, self.state()):
+            if less_than:
+                test = operator.le
+            else:
+                test = operator.ge
+            mask = and_masks(mask, bytes(map(test, getattr(columns, col), itertools.repeat(val))))
+        return mask
+
+    @staticmethod
+    def approve_row(columns, row, state):
+        """
+        Returns true if the given row in a `PlanetColumns` object would be
+        approved by a filter with the given `state` (see `state()`).
+        """
+        for (col, (val, less_than)) in zip(SafetyAggFilter.state_cols, state):
+            if less_than:
+                if getattr(columns, col)[row] > val:
+                    return False
+            elif getattr(columns, col)[row] < val:
+                return False
+        return True
+
+    @staticmethod
+    def changed_rows(columns, col, old, new):
+        """
+        Given an old and new `(value, less_than)` limit for the named planet
+        column, returns a sequence of the rows whose values fall between the
+        two limits, and whose approval for that column has therefore changed.
+        Returns `None` if the match direction has changed, since in that case
+        we'd have to look at more or less everything anyway.
+        """
+        ((old_val, old_lt), (new_val, new_lt)) = (old, new)
+        if old_lt != new_lt:
+            return None
+        (values, rows) = columns.sorted_rows(col)
+        low = min(old_val, new_val)
+        high = max(old_val, new_val)
+        if old_lt:
+            # <= matches, so values in (low, high] have changed
+            return rows[bisect.bisect_right(values, low):bisect.bisect_right(values, high)]
+        else:
+            # >= matches, so values in [low, high) have changed
+            return rows[bisect.bisect_left(values, low):bisect.bisect_left(values, high)]
+
     # The various functions for testing follow
     def tectonics_lte(self, planet):
         return (planet.tectonics <= self.tectonics_val)
@@ -296,6 +867,8 @@ class System(object):
     def __init__(self, idnum, name, position, x, y, stype, extra):
         self.is_quasispace = False
         self.idnum = idnum
+        # Dense index assigned by `Systems`, used for our planet columns
+        self.index = None
         self.name = name
         self.x = x
         self.y = y
@@ -306,7 +879,9 @@ class System(object):
         self.stype = stype
         self.extra = extra
         self.highlight = True
-        self.planets = []
+        self.planet_list = []
+        # Set when our planets are to be built lazily from planet columns
+        self.planet_columns = None
         self.mineral_agg = None
         self.mineral_agg_full = None
         self.bio_agg = None
@@ -318,14 +893,46 @@ class System(object):
         else:
             self.fullname = self.name
 
+    @property
+    def planets(self):
+        """
+        Our list of planets.  If we've been attached lazily to planet columns
+        (see `Systems.attach_columns`), the `Planet` objects are only built the
+        first time they're asked for.
+        """
+        if self.planet_list is None:
+            self.planet_list = self.planet_columns.materialize(self.index)
+        return self.planet_list
+
+    @planets.setter
+    def planets(self, planets):
+        self.planet_list = planets
+        self.planet_columns = None
+
     def addplanet(self, planet):
         """
         Adds a planet to the system; only used when initially importing the data.
         Returns the Planet object again, for convenience.
         """
         self.planets.append(planet)
+        self.mineral_agg_full = None
         return planet
 
+    def compute_full_aggregates(self):
+        """
+        Computes our "full" aggregates (ie: those which ignore the safety
+        filters).  These never change once our planets are loaded, so this
+        is only done once, rather than on every `apply_filters` call.  The
+        resulting objects are shared, and shouldn't be modified.
+        """
+        self.mineral_agg_full = MinData()
+        self.bio_agg_full = 0
+        self.bio_danger_agg_full = 0
+        for planet in self.planets:
+            self.bio_agg_full += planet.bio
+            self.bio_danger_agg_full += planet.bio_danger
+            self.mineral_agg_full.add(planet.mineral)
+
     def distance_to(self, system):
         """
         Returns the distance between this system and the specified one
@@ -338,21 +945,19 @@ class System(object):
         our internal `highlight` variable to indicate whether the system
         should be highlighted (ie: it succeeds in passing the `dispfilter`),
         and sets the internal aggregate variables based on the safety
-        parameters defined by `aggfilter`.  Returns a tuple with two elements:
+        parameters defined by `aggfilter`.  The "full" aggregates are only
+        computed the first time through (see `compute_full_aggregates`).
+        Returns a tuple with two elements:
             1) The total mineral value, when `aggfilter` is taken into account
             2) The total bio value, when `aggfilter` is taken into account
         """
         self.highlight = dispfilter.approve(self)
+        if self.mineral_agg_full is None:
+            self.compute_full_aggregates()
         self.mineral_agg = MinData()
-        self.mineral_agg_full = MinData()
         self.bio_agg = 0
-        self.bio_agg_full = 0
         self.bio_danger_agg = 0
-        self.bio_danger_agg_full = 0
         for planet in self.planets:
-            self.bio_agg_full += planet.bio
-            self.bio_danger_agg_full += planet.bio_danger
-            self.mineral_agg_full.add(planet.mineral)
             if (aggfilter.approve(planet)):
                 self.bio_agg += planet.bio
                 self.bio_danger_agg += planet.bio_danger
@@ -399,12 +1004,23 @@ class Systems(object):
     on planets (ie: the saftey filter), and the other to filter highlighting of
     systems (ie: proximity, etc).  By default these will be empty, and approve
     all systems/planets.
+
+    Planet data can optionally be stored in columnar form (see `PlanetColumns`),
+    in which case `columns` will be populated and each system's planets will
+    be `PlanetView` objects.
     """
 
     def __init__(self):
         self.dispfilter = Filter()
         self.aggfilter = Filter()
         self.systems = {}
+        self.system_list = []
+        self.columns = None
+        self.datafile = None
+        self.full_sums = None
+        self.agg_sums = None
+        self.agg_state = None
+        self.planet_mask = None
         self.agg_min_value = 9999
         self.agg_max_value = 0
         self.agg_spread = 0
@@ -413,8 +1029,13 @@ class Systems(object):
         self.bio_agg_spread = 0
         self.connections = []
         self.quasispace = []
+        self.spatial = SpatialIndex()
+        self.name_index = None
+        self.types = None
 
         self.constellation_names = set()
+        self.constellations = {}
+        self.constellation_masks = {}
         self.planet_types = set()
 
     def add_system(self, idnum, name, position, x, y, stype, extra):
@@ -422,9 +1043,17 @@ class Systems(object):
         Add a new system, only used during the initial import.  Returns
         the new System object.
         """
-        self.systems[idnum] = System(idnum, name, position, x, y, stype, extra)
+        system = System(idnum, name, position, x, y, stype, extra)
+        system.index = len(self.system_list)
+        self.systems[idnum] = system
+        self.system_list.append(system)
+        self.spatial.add(system)
+        if self.name_index is not None:
+            self.name_index.add(system.index, system.fullname, system.extra)
         self.constellation_names.add(name)
-        return self.systems[idnum]
+        self.constellations.setdefault(name, []).append(system.index)
+        self.constellation_masks.pop(name, None)
+        return system
 
     def add_quasi(self, x, y, qs_x, qs_y, label):
         """
@@ -432,18 +1061,186 @@ class Systems(object):
         """
         self.systems[label] = Quasispace(x, y, qs_x, qs_y, label)
         self.quasispace.append(self.systems[label])
+        self.spatial.add(self.systems[label])
         return self.systems[label]
 
+    @staticmethod
+    def type_name(ptype):
+        """
+        Returns the name we use in `planet_types` for the given planet type
+        (ie: without any " World" suffix)
+        """
+        if ptype[-6:] == ' World':
+            return ptype[:-6]
+        return ptype
+
     def add_planet_type(self, planet):
         """
         Adds a new planet type to our main set of planet types.  Used mostly just
         for the GUI to draw a selection dropdown.  This is only really ever called
         from `load_from_json`.
         """
-        if planet.ptype[-6:] == ' World':
-            self.planet_types.add(planet.ptype[:-6])
+        self.planet_types.add(Systems.type_name(planet.ptype))
+
+    def build_columns(self):
+        """
+        Packs the planets of all our systems into a new `PlanetColumns` object,
+        and replaces each system's planets with `PlanetView` objects which
+        read from it.  Planets added to systems after this point will not be
+        included in the columns, so this should only be called once all the
+        data has been loaded.
+        """
+        columns = PlanetColumns()
+        for system in self.system_list:
+            for planet in system.planets:
+                columns.add_planet(planet.idnum, planet.name, planet.ptype,
+                    planet.tectonics, planet.weather, planet.temp, planet.gravity,
+                    planet.bio, planet.bio_danger,
+                    [getattr(planet.mineral, col) for col in MinData.min_vals])
+            columns.end_system()
+        return self.attach_columns(columns)
+
+    def attach_columns(self, columns, lazy=False):
+        """
+        Starts using the given `PlanetColumns` object for our planet data,
+        replacing each system's planets with `PlanetView` objects.  If `lazy`
+        is `True`, each system's planets will instead be built as `Planet`
+        objects the first time they're accessed.  The columns should have one
+        planet range for each system in `system_list`.  Returns the columns,
+        for convenience.
+        """
+        if columns.num_systems() != len(self.system_list):
+            raise ValueError('Planet columns have {} systems, expected {}'.format(
+                columns.num_systems(), len(self.system_list)))
+        for system in self.system_list:
+            if lazy:
+                system.planet_list = None
+                system.planet_columns = columns
+            else:
+                system.planets = columns.planets(system.index)
+        self.columns = columns
+        self.full_sums = None
+        self.agg_sums = None
+        self.types = None
+        return columns
+
+    def constellation_mask(self, name):
+        """
+        Returns a bitset (see `uqm_map.index.bitset_from_flags`) of the systems
+        in the named constellation.  These are built from `constellations` on
+        first use, and cached.  Unknown constellations aren't cached.
+        """
+        if name not in self.constellations:
+            return 0
+        if name not in self.constellation_masks:
+            self.constellation_masks[name] = bitset_from_indexes(
+                self.constellations.get(name, []), len(self.system_list))
+        return self.constellation_masks[name]
+
+    @property
+    def names(self):
+        """
+        Our n-gram name index (see `NameIndex`).  Building it is one of the
+        slower parts of loading a big map, and plenty of uses never search
+        by name, so it's only built on first use.
+        """
+        if self.name_index is None:
+            self.build_name_index()
+        return self.name_index
+
+    def build_name_index(self):
+        """
+        Builds our name index from the systems we currently have.  Systems
+        added afterwards are added to it as they come in.
+        """
+        self.name_index = NameIndex()
+        for system in self.system_list:
+            self.name_index.add(system.index, system.fullname, system.extra)
+        return self.name_index
+
+    def build_type_index(self):
+        """
+        Builds our planet type index (see `TypeIndex`) from the planets which
+        are currently in our systems.  This is done at the end of
+        `load_from_json`, or on demand by `TypeDispFilter`.  Like our planet
+        columns, planets added afterwards won't show up in it.
+        """
+        self.types = TypeIndex()
+        if self.columns is not None:
+            ptypes = self.columns.ptype
+            for system in self.system_list:
+                for row in self.columns.rows(system.index):
+                    self.types.add(system.index, ptypes[row])
+        else:
+            for system in self.system_list:
+                for planet in system.planets:
+                    self.types.add(system.index, planet.ptype)
+        return self.types
+
+    def compute_full_aggregates(self):
+        """
+        Computes the "full" (unfiltered) aggregates for all of our systems.
+        These don't depend on any of our filters, so this only needs to be
+        done once, after all the data's been loaded.  Filter changes will
+        then only need to recompute the filtered aggregates.  When using
+        planet columns, the per-system sums are also kept in `full_sums`.
+        """
+        if self.columns is not None:
+            self.full_sums = full = self.columns.aggregate()
+            for system in self.system_list:
+                idx = system.index
+                system.mineral_agg_full = MinData(*[full[col][idx] for col in MinData.min_vals])
+                system.bio_agg_full = full['bio'][idx]
+                system.bio_danger_agg_full = full['bio_danger'][idx]
         else:
-            self.planet_types.add(planet.ptype)
+            for system in self.system_list:
+                system.compute_full_aggregates()
+
+    def check_derived(self, derived):
+        """
+        Returns `True` if the given derived data dict (see `uqm_map.derived`)
+        can be used by `use_derived`: it needs to be of the current
+        `derived_version`, and to cover all of our systems.
+        """
+        if not derived or derived.get('version') != derived_version:
+            return False
+        if derived.get('systems') != len(self.system_list):
+            return False
+        return True
+
+    def use_derived(self, derived):
+        """
+        Takes our planet types, constellation names and connections, full
+        aggregates and type index from the given derived data dict rather
+        than computing them ourselves.  The data isn't checked beyond
+        `check_derived`; it's trusted to match what we'd have computed.
+        Planets should already have been loaded (though they need not have
+        been added to `planet_types`), and constellation links shouldn't be.
+        """
+        self.planet_types = set(derived['planet_types'])
+        self.constellation_names = set(derived['constellation_names'])
+        for (system_id, link_id) in derived['connections']:
+            self.add_connection(system_id, link_id)
+
+        full = derived['full_aggregates']
+        if self.columns is not None:
+            self.full_sums = full
+        for (system, bio, bio_danger, minerals) in zip(self.system_list, full['bio'],
+                full['bio_danger'], zip(*[full[col] for col in MinData.min_vals])):
+            system.mineral_agg_full = MinData(*minerals)
+            system.bio_agg_full = bio
+            system.bio_danger_agg_full = bio_danger
+
+        self.types = TypeIndex()
+        for (ptype, indexes) in derived['types'].items():
+            self.types.add_all(indexes, ptype)
+
+    def within(self, center, radius):
+        """
+        Returns a list of all systems and quasispace exits within `radius`
+        of the `center` system (or quasispace exit), using our spatial index.
+        """
+        return self.spatial.within(center, radius)
 
     def get(self, idnum):
         """
@@ -466,7 +1263,23 @@ class Systems(object):
         given filters.  Will also set the "highlight" var for each system
         accordingly.  Will only calculate min/max values for planets which
         are set to be highlighted (so that the color spread will be accurate)
+
+        If our planets are stored in columns, this will use the much faster
+        `process_aggregates_columnar`, otherwise `process_aggregates_objects`.
+        """
+        if self.columns is not None:
+            self.process_aggregates_columnar()
+        else:
+            self.process_aggregates_objects()
+
+    def process_aggregates_objects(self):
         """
+        Calculates aggregates by looping through each system and calling
+        `System.apply_filters` on it.  This is the reference implementation
+        for `process_aggregates`, and works whether or not our planets have
+        been packed into columns.
+        """
+        self.dispfilter.prepare(self)
         self.agg_min_value = 9999
         self.agg_max_value = 0
         self.agg_spread = 0
@@ -487,6 +1300,118 @@ class Systems(object):
                 if (bio > self.bio_agg_max_value):
                     self.bio_agg_max_value = bio
 
+        self.finish_agg_ranges()
+
+    def process_aggregates_columnar(self):
+        """
+        Calculates aggregates using our planet columns.  Rather than looping
+        over planets in Python, we compute the safety filter mask for every
+        planet at once and then do grouped sums over the columns to get the
+        per-system aggregates, which are then stored on each `System` just
+        like `System.apply_filters` would.
+
+        If we only have a single `SafetyAggFilter` and its limits have changed
+        since the last call (as happens when the user drags a slider), we
+        just adjust the previous aggregates for the planets whose status has
+        changed (see `apply_safety_delta`), rather than starting from scratch.
+        """
+        columns = self.columns
+        if self.full_sums is None:
+            self.compute_full_aggregates()
+        state = [fil.state() for fil in self.aggfilter.filters]
+        if self.agg_sums is not None and state == self.agg_state:
+            # Safety filters haven't changed since last time
+            changed = []
+        elif (self.agg_sums is not None and len(state) == 1 and len(self.agg_state) == 1
+                and self.apply_safety_delta(self.agg_state[0], state[0])):
+            changed = self.agg_changed
+        else:
+            mask = self.aggfilter.planet_mask(columns)
+            if mask is not None:
+                mask = bytearray(mask)
+            self.planet_mask = mask
+            if mask is None:
+                # Nothing's filtered, so we've already got these.  They get
+                # adjusted in place by `apply_safety_delta`, hence the copy.
+                self.agg_sums = dict([(col, list(sums)) for (col, sums) in self.full_sums.items()])
+            else:
+                self.agg_sums = columns.aggregate(mask)
+            changed = self.system_list
+        self.agg_state = state
+
+        sums = self.agg_sums
+        for system in changed:
+            idx = system.index
+            system.mineral_agg = MinData(*[sums[col][idx] for col in MinData.min_vals])
+            system.bio_agg = sums['bio'][idx]
+            system.bio_danger_agg = sums['bio_danger'][idx]
+
+        # No need to `prepare()` the display filter here: `system_mask` goes
+        # straight to our indexes, so preparing would just look everything
+        # up twice
+        flags = bitset_to_flags(self.dispfilter.system_mask(self), len(self.system_list))
+        for (system, flag) in zip(self.system_list, flags):
+            system.highlight = (flag == 1)
+        minerals = list(itertools.compress(sums['value'], flags))
+        bios = list(itertools.compress(sums['bio'], flags))
+        self.agg_min_value = min(minerals + [9999])
+        self.agg_max_value = max(minerals + [0])
+        self.agg_spread = 0
+        self.bio_agg_min_value = min(bios + [9999])
+        self.bio_agg_max_value = max(bios + [0])
+        self.bio_agg_spread = 0
+        self.finish_agg_ranges()
+
+    def apply_safety_delta(self, old_state, new_state):
+        """
+        Incrementally updates our per-system aggregate sums (and planet mask)
+        when a single `SafetyAggFilter` has changed from `old_state` to
+        `new_state` (see `SafetyAggFilter.state`).  Only the planets whose
+        values lie between the old and new limits are looked at, and only
+        those whose overall approval has actually changed get added to or
+        subtracted from their systems' aggregates.  The systems which changed
+        are stored in `agg_changed`.  Returns `False` without doing anything
+        if the change can't be done incrementally.
+        """
+        columns = self.columns
+        if self.planet_mask is None:
+            return False
+        candidates = []
+        for (col, old, new) in zip(SafetyAggFilter.state_cols, old_state, new_state):
+            if old != new:
+                rows = SafetyAggFilter.changed_rows(columns, col, old, new)
+                if rows is None:
+                    return False
+                candidates.append(rows)
+
+        mask = self.planet_mask
+        sums = self.agg_sums
+        changed = set()
+        for row in itertools.chain.from_iterable(candidates):
+            approved = SafetyAggFilter.approve_row(columns, row, new_state)
+            if approved == mask[row]:
+                continue
+            mask[row] = approved
+            if approved:
+                sign = 1
+            else:
+                sign = -1
+            idx = columns.row_system(row)
+            changed.add(idx)
+            sums['bio'][idx] += sign*columns.bio[row]
+            sums['bio_danger'][idx] += sign*columns.bio_danger[row]
+            for (col, ru) in zip(MinData.min_vals, MinData.min_ru):
+                amount = sign*columns.minerals[col][row]
+                sums[col][idx] += amount
+                sums['value'][idx] += ru*amount
+        self.agg_changed = [self.system_list[idx] for idx in changed]
+        return True
+
+    def finish_agg_ranges(self):
+        """
+        Final cleanup of our aggregate min/max values once they've been found,
+        setting our spread values.
+        """
         # The checks in here would only occur if no systems have been loaded,
         # or if no systems match the given filters
         if self.agg_min_value == 9999 and self.agg_max_value == 0:
@@ -518,10 +1443,49 @@ class Systems(object):
         else:
             return (system.bio_agg-self.bio_agg_min_value)/self.bio_agg_spread
 
+    def load_columns(self, planets, lazy=False, planet_types=True):
+        """
+        Loads a list of planet dicts (in the format described by `load_from_json`)
+        straight into a new `PlanetColumns` object, without creating any
+        intermediate `Planet` objects.  `lazy` is passed through to
+        `attach_columns`.  If `planet_types` is `False`, the planets won't be
+        added to `planet_types`.  Only really called from `load_from_json`.
+        """
+        by_system = {}
+        for planet in planets:
+            if planet['sid'] not in self.systems:
+                raise KeyError('Planet {} has unknown system ID {}'.format(planet['pid'], planet['sid']))
+            by_system.setdefault(planet['sid'], []).append(planet)
+        # Put the planets in system order, then fill in each column in one go
+        ordered = []
+        columns = PlanetColumns()
+        for system in self.system_list:
+            ordered.extend(by_system.get(system.idnum, []))
+            columns.system_offsets.append(len(ordered))
+        columns.idnum = list(map(operator.itemgetter('pid'), ordered))
+        columns.name = list(map(operator.itemgetter('pname'), ordered))
+        columns.ptype = list(map(operator.itemgetter('ptype'), ordered))
+        for col in PlanetColumns.int_cols:
+            getattr(columns, col).extend(map(operator.itemgetter(col), ordered))
+        for (col, key) in zip(MinData.min_vals, ['min_common', 'min_corrosive', 'min_base',
+                'min_noble', 'min_rare', 'min_precious', 'min_radio', 'min_exotic']):
+            columns.minerals[col].extend(map(operator.itemgetter(key), ordered))
+
+        # Planet types only need one planet of each type to look at
+        if planet_types:
+            for row in dict([(ptype, row) for (row, ptype) in enumerate(columns.ptype)]).values():
+                self.add_planet_type(PlanetView(columns, row))
+        return self.attach_columns(columns, lazy=lazy)
+
     @staticmethod
-    def load_from_json(json_string):
-        """
-        Returns a new `Systems` objects based on a JSON string passed in.  The
+    def load_from_json(json_string, columnar=False, lazy=False):
+        """
+        Returns a new `Systems` objects based on a JSON string passed in.  If
+        `columnar` is `True`, planet data will be loaded straight into a
+        `PlanetColumns` object rather than into individual `Planet` objects.
+        If `lazy` is `True`, planet data is loaded into columns in the same
+        way, but each system's `Planet` objects are only built the first time
+        its planets are accessed; aggregates are available immediately.  The
         JSON string should have a top-level dict, laid out in pseudostructure
         like so:
 
@@ -611,9 +1575,17 @@ class Systems(object):
 
         ... and the order of each of those pairs could be reversed, as well.
 
+        Exporters may also include a `derived` dict of data which we'd
+        otherwise work out at load time (see `uqm_map.derived`).  If its
+        `version` matches our `derived_version`, it's used without being
+        recomputed; otherwise it's ignored.
+
         """
 
-        # Process the JSON string
+        # Process the JSON string.  `json` is imported here rather than at
+        # the top, since it's fairly expensive to import and we don't need it
+        # for binary datafiles or cached data.
+        import json
         data = json.loads(json_string)
 
         # Create our systems
@@ -625,56 +1597,182 @@ class Systems(object):
         for quasi in data['quasispace']:
             systems.add_quasi(quasi['x'], quasi['y'], quasi['qs_x'], quasi['qs_y'], quasi['label'])
 
+        # Precomputed data from the exporter saves us some work below
+        derived = data.get('derived')
+        trusted = systems.check_derived(derived)
+
         # ... and now a list of planets
-        for planet in data['planets']:
-            p = systems.get(planet['sid']).addplanet(Planet(
-                    planet['pid'], planet['pname'], planet['ptype'], planet['tectonics'], planet['weather'], planet['temp'], planet['gravity'],
-                    planet['bio'], planet['bio_danger'],
-                    MinData(planet['min_common'], planet['min_corrosive'], planet['min_base'], planet['min_noble'],
-                        planet['min_rare'], planet['min_precious'], planet['min_radio'], planet['min_exotic'])
-                    )
-                )
-            systems.add_planet_type(p)
+        if columnar or lazy:
+            systems.load_columns(data['planets'], lazy=lazy, planet_types=not trusted)
+        else:
+            for planet in data['planets']:
+                systems.add_planet_dict(planet, planet_type=not trusted)
 
         # Let's process our constellation connection information too.
-        for (system_id, link_ids) in data['constellations'].items():
-            # JSON dict keys cannot be ints, so we've gotta cast here.
-            system_id = int(system_id)
-            system = systems.systems[system_id]
-            for link_id in link_ids:
-                link_system = systems.systems[link_id]
-                systems.connections.append((system, link_system))
+        if trusted:
+            systems.use_derived(derived)
+        else:
+            for (system_id, link_ids) in data['constellations'].items():
+                # JSON dict keys cannot be ints, so we've gotta cast here.
+                system_id = int(system_id)
+                for link_id in link_ids:
+                    systems.add_connection(system_id, link_id)
 
         # ... this should happen automatically, but regardless:
         data = None
 
-        # Run through aggregates and calc min/max
-        systems.process_aggregates()
-
         # ... and return the systems object
-        return systems
+        return systems.finish_load(derived=trusted)
 
     @staticmethod
-    def load_from_file(filename=None):
+    def load_from_stream(fileobj):
         """
-        Returns a new `Systems` object based on data from the specified `filename`.
-        If `filename` is not passed in, we will attempt to find our main data
-        file.
+        Returns a new `Systems` object based on JSON read incrementally from
+        the text file object `fileobj`, in the same format as `load_from_json`.
+        Objects are built as each record is parsed, so the full document is
+        never held in memory.  Planets and constellation links which show up
+        before the systems they refer to are held until the end of the file.
+        """
+        from uqm_map.jsonstream import JSONStream
+
+        systems = Systems()
+        seen = set()
+        pending_planets = []
+        constellations = {}
+        derived = None
+        ptypes = {}
+        for (key, record) in JSONStream(fileobj).items():
+            seen.add(key)
+            if record is None:
+                continue
+            if key == 'systems':
+                systems.add_system(record['sid'], record['name'], record['position'],
+                    record['x'], record['y'], record['stype'], record['extra'])
+            elif key == 'quasispace':
+                systems.add_quasi(record['x'], record['y'], record['qs_x'], record['qs_y'], record['label'])
+            elif key == 'planets':
+                # The derived data comes last, so planet types are only
+                # worked out at the end, if need be
+                if record['sid'] in systems.systems:
+                    ptypes.setdefault(record['ptype'], systems.add_planet_dict(record, planet_type=False))
+                else:
+                    pending_planets.append(record)
+            elif key == 'constellations':
+                constellations = record
+            elif key == 'derived':
+                derived = record
+
+        for key in ['systems', 'planets', 'quasispace', 'constellations']:
+            if key not in seen:
+                raise KeyError(key)
+
+        for planet in pending_planets:
+            ptypes.setdefault(planet['ptype'], systems.add_planet_dict(planet, planet_type=False))
+        trusted = systems.check_derived(derived)
+        if trusted:
+            systems.use_derived(derived)
+        else:
+            for planet in ptypes.values():
+                systems.add_planet_type(planet)
+            for (system_id, link_ids) in constellations.items():
+                for link_id in link_ids:
+                    systems.add_connection(int(system_id), link_id)
+
+        return systems.finish_load(derived=trusted)
+
+    def add_planet_dict(self, planet, planet_type=True):
+        """
+        Adds a new planet from a dict in the format described by `load_from_json`,
+        only used during the initial import.  The planet is also added to
+        `planet_types` unless `planet_type` is `False`.  Returns the new Planet
+        object.
+        """
+        p = self.get(planet['sid']).addplanet(Planet(
+                planet['pid'], planet['pname'], planet['ptype'], planet['tectonics'], planet['weather'], planet['temp'], planet['gravity'],
+                planet['bio'], planet['bio_danger'],
+                MinData(planet['min_common'], planet['min_corrosive'], planet['min_base'], planet['min_noble'],
+                    planet['min_rare'], planet['min_precious'], planet['min_radio'], planet['min_exotic'])
+                )
+            )
+        if planet_type:
+            self.add_planet_type(p)
+        return p
+
+    def add_connection(self, system_id, link_id):
+        """
+        Adds a constellation connection between the two given system IDs,
+        only used during the initial import.
+        """
+        self.connections.append((self.systems[system_id], self.systems[link_id]))
 
-        The file should be gzipped JSON, encoded with utf-8, in the format
-        described by `load_from_json`.
+    def finish_load(self, derived=False):
+        """
+        Does all the processing which needs to happen once all our data has
+        been loaded.  If `derived` is `True`, `use_derived` has already
+        filled in our full aggregates and type index.  Returns ourselves,
+        for convenience.
         """
+        # The unfiltered aggregates and planet types never change, so compute
+        # them just once
+        if not derived:
+            self.compute_full_aggregates()
+            self.build_type_index()
+
+        # Run through aggregates and calc min/max
+        self.process_aggregates()
+        return self
 
+    @staticmethod
+    def default_datafile():
+        """
+        Returns the path to our main data file.  A binary datafile alongside
+        the JSON will be used in preference to it, if it exists (see
+        `generate_data/json_to_binary.py`).
+        """
         # TODO: This bit should be modified to work if we ever get around to
         # packaging this properly with a setup.py, so it can find that data
         # dir.
+        data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
+        filename = os.path.join(data_dir, 'uqm.bin')
+        if not os.path.exists(filename):
+            filename = os.path.join(data_dir, 'uqm.json.gz')
+        return filename
+
+    @staticmethod
+    def load_from_file(filename=None, columnar=False, mmap=False, stream=False, lazy=False):
+        """
+        Returns a new `Systems` object based on data from the specified `filename`.
+        If `filename` is not passed in, we will attempt to find our main data
+        file.  `columnar` and `lazy` are passed through to `load_from_json`
+        (`lazy` applies to binary datafiles as well).  If `mmap` is
+        `True`, the file must be an uncompressed binary datafile, which will be
+        memory-mapped rather than read in (see `uqm_map.datafile.load_mmap`).
+        If `stream` is `True`, gzipped JSON will be parsed incrementally with
+        `load_from_stream` rather than being read in all at once.
+
+        The file should either be gzipped JSON, encoded with utf-8, in the format
+        described by `load_from_json`, or a binary datafile as described in
+        `uqm_map.datafile` (optionally gzipped).  The format is detected
+        automatically.  Binary datafiles are always loaded into planet columns.
+        """
+
+        import gzip
+        from uqm_map import datafile
+
         if not filename:
-            filename = os.path.join(
-                os.path.dirname(__file__),
-                '..',
-                'data',
-                'uqm.json.gz',
-                )
+            filename = Systems.default_datafile()
+
+        if mmap:
+            return datafile.load_mmap(filename, lazy=lazy)
+
+        with open(filename, 'rb') as df:
+            if df.read(len(datafile.magic)) == datafile.magic:
+                df.seek(0)
+                return datafile.load_from_buffer(df.read(), lazy=lazy)
 
         with gzip.GzipFile(filename, 'r') as df:
-            return Systems.load_from_json(df.read().decode('utf-8'))
+            if df.peek(len(datafile.magic))[:len(datafile.magic)] == datafile.magic:
+                return datafile.load_from_buffer(df.read(), lazy=lazy)
+            if stream:
+                return Systems.load_from_stream(io.TextIOWrapper(df, encoding='utf-8'))
+            return Systems.load_from_json(df.read().decode('utf-8'), columnar=columnar, lazy=lazy)
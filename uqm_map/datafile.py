@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+A compact binary datafile format for starmap data, which loads far more
+quickly than gzipped JSON.  All integers are little-endian.  The file
+starts with a 32-byte header:
+
+    magic (4 bytes, "UQMB")
+    format version (uint32)
+    number of strings (uint32)
+    number of systems (uint32)
+    number of planets (uint32)
+    number of quasispace exits (uint32)
+    number of constellation links (uint32)
+    number of type index entries (uint32, version 2 onwards)
+
+... followed by these sections, in order, each padded out to a multiple
+of 8 bytes:
+
+    string offsets: int64 x (strings+1), offsets into the string data
+    string data: utf-8 encoded strings, stored back to back
+    one int32 column of length `systems` per entry in `system_cols`
+    planet offsets: int32 x (systems+1), as in `PlanetColumns.system_offsets`
+    one int32 column of length `planets` per entry in `planet_cols`
+    one int32 column of length `quasispace` per entry in `quasi_cols`
+    one int32 column of length `links` per entry in `link_cols`
+
+From version 2, derived data (see `uqm_map.derived`) follows, so the
+loader doesn't have to compute it:
+
+    one int32 column of length `systems` per entry in `derived.agg_cols`,
+        holding each system's unfiltered aggregates
+    one int32 column of length `types` per entry in `type_cols`, listing
+        the (planet type, system index) pairs of the planet type index
+
+Columns which hold text (see `string_cols`) store indexes into the string
+table.  Planets are stored grouped by system, in system order, so they
+can be used directly as `PlanetColumns`.  Data is the same as described
+in `Systems.load_from_json`, except that the redundant `mineral` total
+isn't stored.
+"""
+
+import sys
+import mmap
+import array
+import shutil
+import struct
+import tempfile
+
+from uqm_map.data import Systems, PlanetColumns, PlanetView, MinData, derived_version
+from uqm_map.derived import DerivedBuilder, agg_cols
+
+magic = b'UQMB'
+version = 2
+header = struct.Struct('<4sIIIIIII')
+header_size = 32
+
+system_cols = [ 'sid', 'name', 'position', 'x', 'y', 'stype', 'extra' ]
+planet_cols = [ 'pid', 'pname', 'ptype', 'tectonics', 'weather', 'temp', 'gravity',
+    'bio', 'bio_danger', 'min_common', 'min_corrosive', 'min_base', 'min_noble',
+    'min_rare', 'min_precious', 'min_radio', 'min_exotic' ]
+quasi_cols = [ 'label', 'x', 'y', 'qs_x', 'qs_y' ]
+link_cols = [ 'sid', 'link' ]
+type_cols = [ 'ptype', 'system' ]
+string_cols = set([ 'name', 'position', 'stype', 'extra', 'pname', 'ptype', 'label' ])
+
+# Planet columns which map onto `PlanetColumns.minerals`
+mineral_cols = dict(zip(planet_cols[9:], MinData.min_vals))
+
+def padding(length):
+    """
+    Returns the number of padding bytes needed after a section of the
+    given length
+    """
+    return (8 - (length % 8)) % 8
+
+def to_bytes(typecode, values):
+    """
+    Returns the given values as little-endian bytes of the given array
+    typecode
+    """
+    arr = array.array(typecode, values)
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr.tobytes()
+
+class DatafileReader(object):
+    """
+    Class to read the sections out of a binary datafile which has already
+    been read (or mapped) into memory.  Columns are returned as `memoryview`
+    objects over the original buffer, so no data gets copied until the
+    caller decides to.
+    """
+
+    def __init__(self, buf):
+        self.buf = memoryview(buf)
+        if len(self.buf) < header_size:
+            raise ValueError('Datafile is too short to be valid')
+        (file_magic, self.version, self.num_strings, self.num_systems,
+            self.num_planets, self.num_quasi, self.num_links, self.num_types) = header.unpack_from(self.buf)
+        if file_magic != magic:
+            raise ValueError('Not a binary starmap datafile')
+        if array.array('i').itemsize != 4 or array.array('q').itemsize != 8:
+            raise ValueError('Binary datafiles are not supported on this platform')
+        if self.version > version:
+            raise ValueError('Datafile version {} is newer than supported version {}'.format(
+                self.version, version))
+        self.pos = header_size
+        self.string_offsets = self.section('q', self.num_strings+1)
+        self.string_data = self.buf[self.pos:self.pos+self.string_offsets[-1]]
+        self.pos += self.string_offsets[-1] + padding(self.string_offsets[-1])
+        self.systems = self.columns(system_cols, self.num_systems)
+        self.planet_offsets = self.section('i', self.num_systems+1)
+        self.planets = self.columns(planet_cols, self.num_planets)
+        self.quasi = self.columns(quasi_cols, self.num_quasi)
+        self.links = self.columns(link_cols, self.num_links)
+        # Version 1 files didn't have derived data (and left `num_types` as
+        # padding)
+        self.aggregates = None
+        self.types = None
+        if self.version >= 2:
+            self.aggregates = self.columns(agg_cols, self.num_systems)
+            self.types = self.columns(type_cols, self.num_types)
+        if self.pos > len(self.buf):
+            raise ValueError('Datafile is truncated')
+
+    def section(self, typecode, count):
+        """
+        Returns the next section in the file, as a `memoryview` of `count`
+        values of the given typecode.
+        """
+        size = array.array(typecode).itemsize * count
+        view = self.buf[self.pos:self.pos+size]
+        if len(view) != size:
+            raise ValueError('Datafile is truncated')
+        self.pos += size + padding(size)
+        if sys.byteorder != 'little':
+            arr = array.array(typecode, view.tobytes())
+            arr.byteswap()
+            return memoryview(arr)
+        return view.cast(typecode)
+
+    def columns(self, names, count):
+        """
+        Returns a dict of int32 column sections for each of the given names
+        """
+        return dict([(name, self.section('i', count)) for name in names])
+
+    def strings(self):
+        """
+        Returns a list of all the strings in our string table
+        """
+        data = self.string_data.tobytes()
+        offsets = self.string_offsets
+        return [data[offsets[idx]:offsets[idx+1]].decode('utf-8') for idx in range(self.num_strings)]
+
+    def derived(self, strings):
+        """
+        Returns the derived data dict stored in the file (see
+        `uqm_map.derived`), or `None` if this version of the format doesn't
+        have any.  `strings` should be the list returned by `strings`.
+        """
+        if self.aggregates is None:
+            return None
+        types = {}
+        for (ptype, system) in zip(self.types['ptype'], self.types['system']):
+            types.setdefault(strings[ptype], []).append(system)
+        return {
+            'version': derived_version,
+            'systems': self.num_systems,
+            'planet_types': set([Systems.type_name(ptype) for ptype in types.keys()]),
+            'constellation_names': set([strings[idx] for idx in set(self.systems['name'])]),
+            'connections': zip(self.links['sid'], self.links['link']),
+            'full_aggregates': dict([(col, self.aggregates[col].tolist()) for col in agg_cols]),
+            'types': types,
+            }
+
+class ColumnSpool(object):
+    """
+    An int32 column which is spooled out to a temporary file as it's
+    appended to, so that `DatafileWriter` doesn't need to hold whole
+    columns in memory.
+    """
+
+    flush_size = 16384
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.pending = array.array('i')
+        self.count = 0
+
+    def append(self, value):
+        """
+        Adds a value to the end of the column
+        """
+        self.pending.append(value)
+        self.count += 1
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes any pending values out to our temporary file
+        """
+        if self.pending:
+            self.file.write(to_bytes('i', self.pending))
+            self.pending = array.array('i')
+
+    def copy_to(self, df):
+        """
+        Copies the whole column (plus padding) into the file object `df`,
+        and discards our temporary file.
+        """
+        self.flush()
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, df)
+        df.write(b'\0' * padding(self.count * 4))
+        self.file.close()
+
+class DatafileWriter(object):
+    """
+    Class to write out a binary datafile to `filename` a row at a time.
+    All systems must be added before any planets, and planets must be added
+    grouped by system, in the same order as the systems were.  Columns are
+    spooled to temporary files until `close` is called to write out the
+    datafile itself, so memory use doesn't grow with the number of planets
+    (only with the number of distinct strings, and 4 bytes per system).
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.strings = {}
+        self.system_sids = array.array('i')
+        self.system_idx = -1
+        self.planet_offsets = ColumnSpool()
+        self.systems = self.spools(system_cols)
+        self.planets = self.spools(planet_cols)
+        self.quasi = self.spools(quasi_cols)
+        self.links = self.spools(link_cols)
+        self.derived = DerivedBuilder()
+
+    @staticmethod
+    def spools(names):
+        """
+        Returns a list of `(name, ColumnSpool)` tuples for the given names
+        """
+        return [(name, ColumnSpool()) for name in names]
+
+    def string_id(self, text):
+        """
+        Returns the index of `text` in our string table, adding it if need be
+        """
+        if text not in self.strings:
+            self.strings[text] = len(self.strings)
+        return self.strings[text]
+
+    def add_row(self, spools, row):
+        """
+        Appends the values from the dict `row` to the given spools
+        """
+        for (name, spool) in spools:
+            if name in string_cols:
+                spool.append(self.string_id(row[name]))
+            else:
+                spool.append(row[name])
+
+    def add_system(self, system):
+        """
+        Adds a system dict, in the format described by `Systems.load_from_json`
+        """
+        if self.system_idx >= 0:
+            raise ValueError('Systems must all be added before any planets')
+        self.add_row(self.systems, system)
+        self.system_sids.append(system['sid'])
+        self.derived.add_system(system)
+
+    def add_planet(self, planet):
+        """
+        Adds a planet dict, in the format described by `Systems.load_from_json`
+        """
+        sid = planet['sid']
+        while self.system_idx < 0 or self.system_sids[self.system_idx] != sid:
+            self.system_idx += 1
+            if self.system_idx >= len(self.system_sids):
+                raise KeyError('Planet {} found for unknown system ID {} (or out of system order)'.format(
+                    planet['pid'], sid))
+            self.planet_offsets.append(self.planets[0][1].count)
+        self.add_row(self.planets, planet)
+        self.derived.add_planet(planet)
+
+    def add_quasi(self, quasi):
+        """
+        Adds a quasispace exit dict, in the format described by
+        `Systems.load_from_json`
+        """
+        self.add_row(self.quasi, quasi)
+
+    def add_link(self, system_id, link_id):
+        """
+        Adds a constellation link between the two given system IDs
+        """
+        self.add_row(self.links, {'sid': system_id, 'link': link_id})
+
+    def close(self):
+        """
+        Writes out the datafile itself
+        """
+        num_planets = self.planets[0][1].count
+        while self.system_idx < len(self.system_sids):
+            self.planet_offsets.append(num_planets)
+            self.system_idx += 1
+
+        # Connections are already stored as our links
+        derived = self.derived.data({})
+        sums = derived['full_aggregates']
+        derived_sections = [to_bytes('i', sums[col]) for col in agg_cols]
+        type_rows = [(self.string_id(ptype), idx) for (ptype, indexes) in derived['types'].items()
+            for idx in indexes]
+        for col in range(len(type_cols)):
+            derived_sections.append(to_bytes('i', [row[col] for row in type_rows]))
+
+        encoded = [text.encode('utf-8') for text in self.strings.keys()]
+        string_offsets = [0]
+        for text in encoded:
+            string_offsets.append(string_offsets[-1] + len(text))
+
+        with open(self.filename, 'wb') as df:
+            df.write(header.pack(magic, version, len(self.strings), len(self.system_sids),
+                num_planets, self.quasi[0][1].count, self.links[0][1].count, len(type_rows)))
+            df.write(b'\0' * (header_size - header.size))
+            for section in [to_bytes('q', string_offsets), b''.join(encoded)]:
+                df.write(section)
+                df.write(b'\0' * padding(len(section)))
+            for (name, spool) in self.systems + [(None, self.planet_offsets)] + \
+                    self.planets + self.quasi + self.links:
+                spool.copy_to(df)
+            for section in derived_sections:
+                df.write(section)
+                df.write(b'\0' * padding(len(section)))
+
+def write_datafile(data, filename):
+    """
+    Writes out a binary datafile to `filename`, given a `data` dict in the
+    format described by `Systems.load_from_json` (ie: the decoded JSON).
+    """
+
+    # Group planets by system, in system order
+    by_system = {}
+    for planet in data['planets']:
+        by_system.setdefault(planet['sid'], []).append(planet)
+    planets = []
+    for system in data['systems']:
+        planets.extend(by_system.pop(system['sid'], []))
+    if by_system:
+        raise KeyError('Planets found for unknown system IDs: {}'.format(sorted(by_system.keys())))
+
+    writer = DatafileWriter(filename)
+    for system in data['systems']:
+        writer.add_system(system)
+    for planet in planets:
+        writer.add_planet(planet)
+    for quasi in data['quasispace']:
+        writer.add_quasi(quasi)
+    for (system_id, link_ids) in data['constellations'].items():
+        for link_id in link_ids:
+            writer.add_link(int(system_id), link_id)
+    writer.close()
+
+def convert(json_filename, filename):
+    """
+    Converts a gzipped JSON datafile into a binary datafile
+    """
+    # Only needed here, so don't make loading binary datafiles pay for them
+    import gzip
+    import json
+
+    with gzip.GzipFile(json_filename, 'r') as df:
+        data = json.loads(df.read().decode('utf-8'))
+    write_datafile(data, filename)
+
+def load_from_reader(reader, copy=True, lazy=False):
+    """
+    Returns a new `Systems` object using the data from the given
+    `DatafileReader`.  If `copy` is `True`, the planet columns will be
+    copied out of the reader's buffer into arrays; otherwise they'll be
+    left as views into the buffer, and the reader will be kept around
+    as `Systems.datafile`, so its system columns are available too.
+    `lazy` is passed through to `Systems.attach_columns`.
+    """
+    strings = reader.strings()
+
+    systems = Systems()
+    cols = reader.systems
+    for (sid, name, position, x, y, stype, extra) in zip(*[cols[name] for name in system_cols]):
+        systems.add_system(sid, strings[name], strings[position], x, y, strings[stype], strings[extra])
+
+    cols = reader.quasi
+    for (label, x, y, qs_x, qs_y) in zip(*[cols[name] for name in quasi_cols]):
+        systems.add_quasi(x, y, qs_x, qs_y, strings[label])
+
+    def column(view):
+        if copy:
+            arr = array.array(PlanetColumns.typecode)
+            arr.frombytes(view.cast('B'))
+            return arr
+        return view
+
+    cols = reader.planets
+    columns = PlanetColumns()
+    columns.idnum = cols['pid'].tolist()
+    columns.name = [strings[idx] for idx in cols['pname']]
+    columns.ptype = [strings[idx] for idx in cols['ptype']]
+    for name in PlanetColumns.int_cols:
+        setattr(columns, name, column(cols[name]))
+    for (name, mineral) in mineral_cols.items():
+        columns.minerals[mineral] = column(cols[name])
+    columns.system_offsets = column(reader.planet_offsets)
+    systems.attach_columns(columns, lazy=lazy)
+    if not copy:
+        systems.datafile = reader
+
+    derived = reader.derived(strings)
+    if derived is not None:
+        systems.use_derived(derived)
+        return systems.finish_load(derived=True)
+
+    # Planet types only need one planet of each type to look at
+    for row in dict([(ptype, row) for (row, ptype) in enumerate(cols['ptype'])]).values():
+        systems.add_planet_type(PlanetView(columns, row))
+
+    cols = reader.links
+    for (system_id, link_id) in zip(cols['sid'], cols['link']):
+        systems.add_connection(system_id, link_id)
+
+    return systems.finish_load()
+
+def load_from_buffer(buf, lazy=False):
+    """
+    Returns a new `Systems` object using the binary datafile data in `buf`.
+    `lazy` is passed through to `Systems.attach_columns`.
+    """
+    return load_from_reader(DatafileReader(buf), lazy=lazy)
+
+def load_mmap(filename, lazy=False):
+    """
+    Returns a new `Systems` object by memory-mapping the uncompressed binary
+    datafile at `filename`.  The planet columns (and `Systems.datafile`'s
+    system columns) are read-only views straight into the mapping, so pages
+    are only read in from disk as they're used, and processes which map the
+    same file share a single copy in the page cache.  `lazy` is passed
+    through to `Systems.attach_columns`.
+    """
+    with open(filename, 'rb') as df:
+        mapping = mmap.mmap(df.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(magic)] != magic:
+        mapping.close()
+        raise ValueError('Only uncompressed binary datafiles can be memory-mapped')
+    return load_from_reader(DatafileReader(mapping), copy=False, lazy=lazy)
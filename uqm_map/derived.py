@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Derived tables which `Systems` would otherwise work out for itself every
+time a datafile is loaded (planet type names, constellation names and
+connections, each system's unfiltered aggregates, and the planet type
+index).  Our exporters build these up as the rows go past and embed them
+in the datafile, tagged with `data.derived_version`, and the loader uses
+them as-is (see `Systems.use_derived`) when the version matches.
+"""
+
+import operator
+
+from uqm_map.data import Systems, MinData, derived_version
+
+# Per-system aggregate columns, in the order they're stored
+agg_cols = [ 'bio', 'bio_danger' ] + MinData.min_vals + [ 'value' ]
+
+# Planet dict keys for each entry in `MinData.min_vals`
+mineral_keys = [ 'min_common', 'min_corrosive', 'min_base', 'min_noble',
+    'min_rare', 'min_precious', 'min_radio', 'min_exotic' ]
+
+class DerivedBuilder(object):
+    """
+    Class to build up the derived tables for a datafile from its system and
+    planet dicts (in the format described by `Systems.load_from_json`).
+    All systems must be added before any planets, in the order they'll be
+    stored in the datafile.  Memory use only depends on the number of
+    systems, so this is fine to use while streaming out a datafile.
+    """
+
+    def __init__(self):
+        self.indexes = {}
+        self.constellation_names = set()
+        self.planet_types = set()
+        self.types = {}
+        self.sums = dict([(col, []) for col in agg_cols[:-1]])
+
+    def add_system(self, system):
+        """
+        Adds a system dict
+        """
+        self.indexes[system['sid']] = len(self.indexes)
+        self.constellation_names.add(system['name'])
+        for column in self.sums.values():
+            column.append(0)
+
+    def add_planet(self, planet):
+        """
+        Adds a planet dict.  Raises `KeyError` if its system is unknown.
+        """
+        idx = self.indexes[planet['sid']]
+        sums = self.sums
+        sums['bio'][idx] += planet['bio']
+        sums['bio_danger'][idx] += planet['bio_danger']
+        for (col, key) in zip(MinData.min_vals, mineral_keys):
+            sums[col][idx] += planet[key]
+        ptype = planet['ptype']
+        if ptype not in self.types:
+            self.types[ptype] = set()
+            self.planet_types.add(Systems.type_name(ptype))
+        self.types[ptype].add(idx)
+
+    def data(self, constellations):
+        """
+        Returns the derived data dict to store in the datafile, given the
+        datafile's `constellations` dict
+        """
+        sums = dict(self.sums)
+        value = [0]*len(self.indexes)
+        for (col, ru) in zip(MinData.min_vals, MinData.min_ru):
+            value = list(map(operator.add, value, map(ru.__mul__, sums[col])))
+        sums['value'] = value
+        connections = []
+        for (system_id, link_ids) in constellations.items():
+            for link_id in link_ids:
+                connections.append([int(system_id), link_id])
+        return {
+            'version': derived_version,
+            'systems': len(self.indexes),
+            'planet_types': sorted(self.planet_types),
+            'constellation_names': sorted(self.constellation_names),
+            'connections': connections,
+            'full_aggregates': sums,
+            'types': dict([(ptype, sorted(indexes)) for (ptype, indexes) in sorted(self.types.items())]),
+            }
+
+def derive(data):
+    """
+    Returns the derived data dict for a whole `data` dict, in the format
+    described by `Systems.load_from_json`
+    """
+    builder = DerivedBuilder()
+    for system in data['systems']:
+        builder.add_system(system)
+    for planet in data['planets']:
+        builder.add_planet(planet)
+    return builder.data(data['constellations'])
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Exporting starmap data out of a database of systems and planets (as
+populated by `import.pl`, or by `import_planetinfo` here) into either a
+gzipped JSON datafile or a binary datafile.  Rows are read in batches from
+a DB-API cursor and written out as they arrive, so memory use stays flat
+however large the tables get; with MySQL, pass in a connection which uses
+server-side cursors (`MySQLdb.cursors.SSCursor`) so the client library
+doesn't buffer the whole result set either.  A SQLite database works just
+as well, which makes the whole pipeline runnable without a server.
+"""
+
+import io
+
+from uqm_map import planetinfo
+
+system_cols = [ 'sid', 'name', 'position', 'x', 'y', 'stype', 'extra' ]
+planet_cols = [ 'pid', 'sid', 'pname', 'ptype' ] + planetinfo.planet_attrs
+
+# Table definitions, in a form SQLite is happy with
+schema = [
+    'create table system (sid integer primary key, name varchar(64), position varchar(16), ' +
+        'x integer, y integer, stype varchar(32), extra varchar(64))',
+    'create table planet (pid integer primary key, sid integer, pname varchar(64), ptype varchar(32), ' +
+        ', '.join(['{} integer'.format(col) for col in planetinfo.planet_attrs]) + ')',
+    'create index planet_sid on planet (sid, pid)',
+    ]
+
+def create_tables(conn):
+    """
+    Creates our `system` and `planet` tables in the given (SQLite) database
+    connection, dropping any existing ones.
+    """
+    cursor = conn.cursor()
+    cursor.execute('drop table if exists planet')
+    cursor.execute('drop table if exists system')
+    for statement in schema:
+        cursor.execute(statement)
+    cursor.close()
+    conn.commit()
+
+def insert_query(table, cols):
+    """
+    Returns an insert statement (with SQLite-style placeholders) for the
+    given table and columns
+    """
+    return 'insert into {} ({}) values ({})'.format(table, ', '.join(cols), ', '.join(['?'] * len(cols)))
+
+def import_planetinfo(conn, planetinfo_file, batch_size=1000):
+    """
+    Fills in fresh `system` and `planet` tables in the given (SQLite)
+    database connection from a `PlanetInfo` dump, in the same way that
+    `import.pl` does for MySQL.  The dump is read as a stream, and rows are
+    inserted in batches of `batch_size`.  Returns a tuple of the number of
+    systems and planets imported.
+    """
+    create_tables(conn)
+    cursor = conn.cursor()
+    queries = {
+        'system': (insert_query('system', system_cols), system_cols),
+        'planet': (insert_query('planet', planet_cols), planet_cols),
+        }
+    batches = { 'system': [], 'planet': [] }
+    counts = { 'system': 0, 'planet': 0 }
+    with open(planetinfo_file, 'r', encoding='utf-8', errors='replace') as df:
+        for (kind, record) in planetinfo.PlanetInfoParser(df).records():
+            (query, cols) = queries[kind]
+            batch = batches[kind]
+            batch.append([record[col] for col in cols])
+            counts[kind] += 1
+            if len(batch) >= batch_size:
+                cursor.executemany(query, batch)
+                del batch[:]
+    for (kind, batch) in batches.items():
+        if batch:
+            cursor.executemany(queries[kind][0], batch)
+    cursor.close()
+    conn.commit()
+    return (counts['system'], counts['planet'])
+
+def rows(conn, table, cols, order, batch_size=1000):
+    """
+    Generator which yields each row of the given table as a dict of the
+    given columns, in the given order, fetching `batch_size` rows at a time.
+    The cursor is closed once all rows have been read, so that (with MySQL
+    server-side cursors) the connection is free for the next query.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute('select {} from {} order by {}'.format(', '.join(cols), table, order))
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                yield dict(zip(cols, row))
+    finally:
+        cursor.close()
+
+def systems(conn, positioned, builder=None, batch_size=1000):
+    """
+    Generator which yields each system from the database, in ID order.
+    Systems with a position are also appended to the `positioned` list
+    (with just the fields `planetinfo.resolve_constellations` needs), so
+    the constellations can be resolved once everything's been written.
+    Each system is also added to the `derived.DerivedBuilder` `builder`,
+    if there is one.
+    """
+    for system in rows(conn, 'system', system_cols, 'sid', batch_size):
+        if system['position']:
+            positioned.append({'sid': system['sid'], 'name': system['name'],
+                'position': system['position']})
+        if builder is not None:
+            builder.add_system(system)
+        yield system
+
+def planets(conn, builder=None, batch_size=1000):
+    """
+    Generator which yields each planet from the database, grouped by system
+    in system ID order (as `datafile.DatafileWriter` needs them).  Each
+    planet is also added to the `derived.DerivedBuilder` `builder`, if
+    there is one.
+    """
+    for planet in rows(conn, 'planet', planet_cols, 'sid, pid', batch_size):
+        if builder is not None:
+            builder.add_planet(planet)
+        yield planet
+
+def export_json(conn, filename, constellation_file, batch_size=1000):
+    """
+    Exports the database to a gzipped JSON datafile at `filename`, writing
+    it out incrementally, with the derived data (see `uqm_map.derived`)
+    built up along the way and written at the end.  Returns a tuple of the
+    number of systems and planets written, and the list of any
+    constellation warnings.
+    """
+    import gzip
+    from uqm_map.jsonstream import JSONStreamWriter
+    from uqm_map.derived import DerivedBuilder
+
+    positioned = []
+    builder = DerivedBuilder()
+    # As with `planetinfo.convert`, the default compression level is far
+    # slower for very little gain
+    with gzip.GzipFile(filename, 'w', compresslevel=6, mtime=0) as gz:
+        with io.TextIOWrapper(gz, encoding='utf-8') as df:
+            writer = JSONStreamWriter(df, batch_size)
+            num_systems = writer.write_list('systems', systems(conn, positioned, builder, batch_size))
+            num_planets = writer.write_list('planets', planets(conn, builder, batch_size))
+            writer.write_value('quasispace', planetinfo.quasispace)
+            (constellations, warnings) = planetinfo.resolve_constellations(positioned, constellation_file)
+            writer.write_value('constellations', constellations)
+            writer.write_value('derived', builder.data(constellations))
+            writer.close()
+    return (num_systems, num_planets, warnings)
+
+def export_binary(conn, filename, constellation_file, batch_size=1000):
+    """
+    Exports the database to a binary datafile at `filename`, writing it out
+    incrementally (`DatafileWriter` takes care of the derived data).
+    Returns a tuple of the number of systems and planets written, and the
+    list of any constellation warnings.
+    """
+    from uqm_map.datafile import DatafileWriter
+
+    positioned = []
+    writer = DatafileWriter(filename)
+    num_systems = 0
+    for system in systems(conn, positioned, batch_size=batch_size):
+        writer.add_system(system)
+        num_systems += 1
+    num_planets = 0
+    for planet in planets(conn, batch_size=batch_size):
+        writer.add_planet(planet)
+        num_planets += 1
+    for quasi in planetinfo.quasispace:
+        writer.add_quasi(quasi)
+    (constellations, warnings) = planetinfo.resolve_constellations(positioned, constellation_file)
+    for (system_id, link_ids) in constellations.items():
+        for link_id in link_ids:
+            writer.add_link(system_id, link_id)
+    writer.close()
+    return (num_systems, num_planets, warnings)
@@ -21,7 +21,8 @@
 from PyQt5 import QtWidgets, QtGui, QtCore
 
 from uqm_map import app_version
-from uqm_map.data import *
+from uqm_map.data import Systems
+from uqm_map.cache import SystemsCache
 
 class Constants(object):
     """
@@ -195,11 +196,15 @@ class Application(QtWidgets.QApplication):
     Main application GUI class
     """
 
-    def __init__(self, datafile):
+    def __init__(self, datafile, cache=True):
         """
-        Initialization
+        Initialization.  If `cache` is `True`, the datafile will be loaded
+        through our on-disk cache (see `uqm_map.cache`).
         """
 
         super().__init__([])
-        systems = Systems.load_from_file(datafile)
+        if cache:
+            systems = SystemsCache().load(datafile)
+        else:
+            systems = Systems.load_from_file(datafile)
         self.app = GUI(systems)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import math
+
+class SpatialIndex(object):
+    """
+    A uniform grid over hyperspace coordinates, used to answer "what's near
+    here" questions without having to compute the distance to every single
+    system on the map.  Anything with `x` and `y` attributes can be added
+    (in practice, `System` and `Quasispace` objects).  Hyperspace coordinates
+    run from 0 to 9999, so the default cell size gives us a 40x40 grid.
+
+    Note that radii passed in here are in the same units as
+    `System.distance_to`, which is to say a tenth of the raw coordinates.
+    """
+
+    def __init__(self, cell_size=250):
+        self.cell_size = cell_size
+        self.cells = {}
+        # Bounds of the occupied cells, as (min_x, min_y, max_x, max_y)
+        self.bounds = None
+
+    def __len__(self):
+        """
+        Returns the number of objects in the index
+        """
+        return sum([len(cell) for cell in self.cells.values()])
+
+    def cell_for(self, x, y):
+        """
+        Returns the grid cell key for the given raw coordinates
+        """
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def add(self, obj):
+        """
+        Adds a new object to the index
+        """
+        (cell_x, cell_y) = self.cell_for(obj.x, obj.y)
+        self.cells.setdefault((cell_x, cell_y), []).append(obj)
+        if self.bounds is None:
+            self.bounds = (cell_x, cell_y, cell_x, cell_y)
+        else:
+            (min_x, min_y, max_x, max_y) = self.bounds
+            self.bounds = (min(min_x, cell_x), min(min_y, cell_y),
+                max(max_x, cell_x), max(max_y, cell_y))
+
+    def candidates(self, x, y, radius):
+        """
+        Yields all objects in the grid cells which overlap the bounding box
+        of the given circle (centered on raw coordinates `x`, `y`).  Some of
+        these may be outside the circle itself.  An infinite radius covers
+        everything, and a NaN one raises a `ValueError`.
+
+        The box is clipped to the occupied part of the grid, and if it still
+        covers more cells than are actually occupied, we just check each of
+        the occupied ones instead, so huge radii don't cost us anything.
+        """
+        if math.isnan(radius):
+            raise ValueError('Radius must be a number')
+        if self.bounds is None or radius < 0:
+            return
+        if math.isinf(radius):
+            for cell in self.cells.values():
+                yield from cell
+            return
+        raw = radius*10
+        (bound_min_x, bound_min_y, bound_max_x, bound_max_y) = self.bounds
+        (min_x, min_y) = self.cell_for(max(x-raw, bound_min_x*self.cell_size),
+            max(y-raw, bound_min_y*self.cell_size))
+        (max_x, max_y) = self.cell_for(min(x+raw, bound_max_x*self.cell_size),
+            min(y+raw, bound_max_y*self.cell_size))
+        if (max_x-min_x+1)*(max_y-min_y+1) > len(self.cells):
+            for ((cell_x, cell_y), cell) in self.cells.items():
+                if min_x <= cell_x <= max_x and min_y <= cell_y <= max_y:
+                    yield from cell
+            return
+        for cell_x in range(min_x, max_x+1):
+            for cell_y in range(min_y, max_y+1):
+                yield from self.cells.get((cell_x, cell_y), [])
+
+    def within(self, center, radius):
+        """
+        Returns a list of all objects which are within `radius` of the
+        `center` object, using the same distance calculation as
+        `System.distance_to`.
+        """
+        return [obj for obj in self.candidates(center.x, center.y, radius)
+            if obj.distance_to(center) <= radius]
+
+class NameIndex(object):
+    """
+    An inverted n-gram (trigram, by default) index over the lowercased
+    `fullname` and `extra` text of each system, used to speed up substring
+    searches.  Any string containing our query must also contain every
+    n-gram of our query, so we can intersect the posting sets for those
+    n-grams to get a small set of candidates, which then get verified with
+    a real substring check.  Systems are referred to by their index.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.fullnames = []
+        self.extras = []
+        self.fullname_grams = {}
+        self.extra_grams = {}
+
+    def __len__(self):
+        """
+        Returns the number of systems in the index
+        """
+        return len(self.fullnames)
+
+    def grams(self, text):
+        """
+        Returns the set of n-grams found in the given text
+        """
+        return set([text[idx:idx+self.n] for idx in range(len(text)-self.n+1)])
+
+    def add(self, index, fullname, extra):
+        """
+        Adds a system's text to the index.  Systems must be added in
+        index order.
+        """
+        fullname = fullname.lower()
+        extra = extra.lower()
+        self.fullnames.append(fullname)
+        self.extras.append(extra)
+        for gram in self.grams(fullname):
+            self.fullname_grams.setdefault(gram, set()).add(index)
+        for gram in self.grams(extra):
+            self.extra_grams.setdefault(gram, set()).add(index)
+
+    def search_texts(self, query, texts, postings):
+        """
+        Returns the set of indexes whose entry in `texts` contains `query`,
+        using the n-gram `postings` to narrow things down where we can.
+        """
+        if len(query) < self.n:
+            candidates = range(len(texts))
+        else:
+            sets = [postings.get(gram, set()) for gram in self.grams(query)]
+            sets.sort(key=len)
+            candidates = sets[0].intersection(*sets[1:])
+        return set([idx for idx in candidates if query in texts[idx]])
+
+    def search(self, query, include_extra=False):
+        """
+        Returns the set of system indexes whose `fullname` contains the given
+        (case-insensitive) query string.  If `include_extra` is `True`, systems
+        whose `extra` text contains the query will be included as well.
+        """
+        query = query.lower()
+        matches = self.search_texts(query, self.fullnames, self.fullname_grams)
+        if include_extra:
+            matches |= self.search_texts(query, self.extras, self.extra_grams)
+        return matches
+
+class TypeIndex(object):
+    """
+    An index from planet types to the systems which contain a planet of
+    that type.  `TypeDispFilter` matches on any prefix of the planet type
+    (the GUI offers types with their " World" suffix stripped, as in
+    `Systems.add_planet_type`), so we also keep track of which full planet
+    types have each possible prefix.  Systems are referred to by their index.
+    """
+
+    def __init__(self):
+        self.types = {}
+        self.prefixes = {}
+        self.cache = {}
+
+    def type_set(self, ptype):
+        """
+        Returns the set of system indexes for the given planet type, adding
+        the type to the index if need be.
+        """
+        if ptype not in self.types:
+            self.types[ptype] = set()
+            for length in range(len(ptype)+1):
+                self.prefixes.setdefault(ptype[:length], set()).add(ptype)
+        return self.types[ptype]
+
+    def add(self, index, ptype):
+        """
+        Records that the system with the given index has a planet of the
+        given type.
+        """
+        self.type_set(ptype).add(index)
+        self.cache = {}
+
+    def add_all(self, indexes, ptype):
+        """
+        Records that each of the systems with the given indexes has a planet
+        of the given type.
+        """
+        self.type_set(ptype).update(indexes)
+        self.cache = {}
+
+    def lookup(self, prefix):
+        """
+        Returns the set of system indexes which have a planet whose type
+        starts with `prefix`.  Results are cached until the index changes.
+        Prefixes which don't match anything aren't cached, so the cache can
+        never hold more than one entry per real prefix, whatever we get
+        asked for.
+        """
+        if prefix not in self.prefixes:
+            return set()
+        if prefix not in self.cache:
+            matches = set()
+            for ptype in self.prefixes.get(prefix, []):
+                matches |= self.types[ptype]
+            self.cache[prefix] = matches
+        return self.cache[prefix]
+
+# Translation tables between 0/1 byte flags and ASCII binary digits
+flags_to_digits = bytes.maketrans(b'\x00\x01', b'01')
+digits_to_flags = bytes.maketrans(b'01', b'\x00\x01')
+
+def bitset_from_flags(flags):
+    """
+    Converts a sequence of 0/1 flags (one per system index) into a bitset,
+    stored as a Python int where bit `i` is set if `flags[i]` is.
+    """
+    if len(flags) == 0:
+        return 0
+    return int(bytes(flags).translate(flags_to_digits)[::-1], 2)
+
+def bitset_from_indexes(indexes, length):
+    """
+    Converts an iterable of system indexes into a bitset with those bits
+    set.  `length` is the total number of systems.
+    """
+    flags = bytearray(length)
+    for idx in indexes:
+        flags[idx] = 1
+    return bitset_from_flags(flags)
+
+def bitset_to_flags(bitset, length):
+    """
+    Converts a bitset back into `bytes` with one 0/1 flag per system
+    index, the reverse of `bitset_from_flags`.
+    """
+    if length == 0:
+        return b''
+    return format(bitset, 'b').zfill(length)[::-1].encode('ascii').translate(digits_to_flags)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import json
+
+class JSONStream(object):
+    """
+    Minimal incremental reader for a JSON document whose top level is a
+    dict, read from a text file object in chunks.  Top-level values which
+    are lists are yielded one element at a time, so the whole document
+    never needs to be held in memory at once.  Other top-level values are
+    decoded whole.
+    """
+
+    whitespace = ' \t\n\r'
+
+    # Characters which can legitimately follow a complete value
+    terminators = whitespace + ',:]}'
+
+    def __init__(self, fileobj, chunk_size=65536):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        """
+        Reads another chunk (of `size` characters, or our chunk size by
+        default) from our file into the buffer, discarding whatever we've
+        already consumed.  Returns `False` if there was nothing left to read.
+        """
+        if self.eof:
+            return False
+        chunk = self.fileobj.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, without consuming
+        it.  Returns an empty string at the end of the file.
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in self.whitespace:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        """
+        Consumes the next character, which must be one of `chars`, and
+        returns it.
+        """
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise ValueError('Expected one of "{}" at offset {} but found "{}"'.format(
+                chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decodes and returns the next complete JSON value.  If the value
+        doesn't fit in the buffer we read more and try again, at least
+        doubling the buffer each time, so that big values don't get decoded
+        over and over.
+        """
+        self.peek()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buf, self.pos)
+                # A number could have been cut off at the end of the buffer
+                # (even somewhere which looks like the end of a number, such
+                # as after the "1" in "1.5"), so only trust it if we can see
+                # what comes after it.
+                if (end < len(self.buf) and self.buf[end] in self.terminators) or \
+                        not self.fill(max(self.chunk_size, len(self.buf)-self.pos)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if not self.fill(max(self.chunk_size, len(self.buf)-self.pos)):
+                    raise
+
+    def items(self):
+        """
+        Generator which yields `(key, value)` tuples for each top-level key.
+        For list values, one tuple is yielded for each element of the list,
+        and an empty list yields `(key, None)` so that the key is still seen.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            if self.peek() == '[':
+                self.pos += 1
+                if self.peek() == ']':
+                    self.pos += 1
+                    yield (key, None)
+                else:
+                    while True:
+                        yield (key, self.value())
+                        if self.expect(',]') == ']':
+                            break
+            else:
+                yield (key, self.value())
+            if self.expect(',}') == '}':
+                return
+
+class JSONStreamWriter(object):
+    """
+    The counterpart to `JSONStream`: writes a JSON document whose top level
+    is a dict to a text file object, with list values written out one
+    element at a time from any iterable, so the whole document never needs
+    to be held in memory at once.  The output is identical to what
+    `json.dumps` would give for the equivalent dict.
+    """
+
+    def __init__(self, fileobj, batch_size=1000):
+        self.fileobj = fileobj
+        self.batch_size = batch_size
+        self.encoder = json.JSONEncoder()
+        self.count = 0
+        self.closed = False
+
+    def key(self, key):
+        """
+        Writes out the start of a new top-level key
+        """
+        if self.closed:
+            raise ValueError('Document has already been closed')
+        self.fileobj.write('{}{}: '.format('{' if self.count == 0 else ', ', self.encoder.encode(key)))
+        self.count += 1
+
+    def write_value(self, key, value):
+        """
+        Writes out a top-level key whose value is encoded all at once
+        """
+        self.key(key)
+        self.fileobj.write(self.encoder.encode(value))
+
+    def write_list(self, key, values):
+        """
+        Writes out a top-level key whose value is a list of the elements of
+        the iterable `values`, encoding them in batches of `batch_size`.
+        Returns the number of elements written.
+        """
+        self.key(key)
+        self.fileobj.write('[')
+        total = 0
+        batch = []
+        for value in values:
+            batch.append(self.encoder.encode(value))
+            if len(batch) >= self.batch_size:
+                self.fileobj.write('{}{}'.format(', ' if total else '', ', '.join(batch)))
+                total += len(batch)
+                batch = []
+        if batch:
+            self.fileobj.write('{}{}'.format(', ' if total else '', ', '.join(batch)))
+            total += len(batch)
+        self.fileobj.write(']')
+        return total
+
+    def close(self):
+        """
+        Finishes off the document.  The file object itself is left open.
+        """
+        if not self.closed:
+            self.fileobj.write('}' if self.count else '{}')
+            self.closed = True
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Planning mining runs: given a starting system, the room in our cargo holds
+and how far we're willing to fly, pick the systems whose minerals are worth
+the most in total.  This is an orienteering problem with a knapsack on top,
+so we go for a good answer rather than a provably perfect one.
+
+Each restart of the search builds a tour out from the start by cheapest
+insertion, favouring systems with plenty of value for the extra distance
+(with some random jitter after the first restart), until the travel budget
+is used up.  Every system on that tour can be reached within budget, and
+since dropping stops from a tour never makes it longer, any subset of them
+can be too - so a knapsack over their mineral weights picks the best cargo
+load exactly.  The tour is then rebuilt from just the chosen systems and
+topped up with anything else which still fits.
+
+Restarts are independent, so they're spread across a pool of worker
+processes, each of which keeps going until the time limit runs out.
+"""
+
+import os
+import math
+import time
+import random
+import itertools
+import concurrent.futures
+
+class MiningPlan(object):
+    """
+    The result of a mining run optimization: the systems to `stops` at, in
+    the order to visit them, along with the total mineral `value` and
+    `weight` collected and the `distance` flown (including the trip back to
+    `start`, if we're coming back).
+    """
+
+    def __init__(self, start, stops, value, weight, distance):
+        self.start = start
+        self.stops = stops
+        self.value = value
+        self.weight = weight
+        self.distance = distance
+
+    def to_dict(self):
+        """
+        Returns a JSON-friendly description of the plan
+        """
+        return {
+            'start': self.start.fullname,
+            'stops': [system.fullname for system in self.stops],
+            'value': self.value,
+            'weight': self.weight,
+            'distance': round(self.distance, 2),
+            }
+
+def distance(a, b):
+    """
+    Distance between two `(x, y)` hyperspace positions, in the same units as
+    `System.distance_to`
+    """
+    return math.hypot(a[0]-b[0], a[1]-b[1])/10
+
+def tour_length(start, points, tour, round_trip=True):
+    """
+    Returns the length of a tour from `start` through the given indexes into
+    `points`, and back to `start` if `round_trip` is set
+    """
+    total = 0
+    prev = start
+    for idx in tour:
+        total += distance(prev, points[idx])
+        prev = points[idx]
+    if round_trip:
+        total += distance(prev, start)
+    return total
+
+def cheapest_insertion(start, points, tour, idx, round_trip=True):
+    """
+    Returns a tuple of the position in `tour` at which inserting `idx` adds
+    the least distance, and how much distance that adds
+    """
+    point = points[idx]
+    best = (0, math.inf)
+    prev = start
+    for (pos, other) in enumerate(tour):
+        nxt = points[other]
+        delta = distance(prev, point) + distance(point, nxt) - distance(prev, nxt)
+        if delta < best[1]:
+            best = (pos, delta)
+        prev = nxt
+    if round_trip:
+        delta = distance(prev, point) + distance(point, start) - distance(prev, start)
+    else:
+        delta = distance(prev, point)
+    if delta < best[1]:
+        best = (len(tour), delta)
+    return best
+
+def insertion_delta(start, points, prev, nxt, idx, round_trip=True):
+    """
+    Returns how much distance inserting `idx` between the tour stops `prev`
+    and `nxt` adds.  Either can be `None`: `prev` for the start, and `nxt`
+    for the end of the tour (which leads back to the start, if we're making
+    a round trip).
+    """
+    point = points[idx]
+    prev = start if prev is None else points[prev]
+    if nxt is None:
+        if not round_trip:
+            return distance(prev, point)
+        nxt = start
+    else:
+        nxt = points[nxt]
+    return distance(prev, point) + distance(point, nxt) - distance(prev, nxt)
+
+def knapsack(items, values, weights, capacity, cells=2000, deadline=None):
+    """
+    Returns the subset of `items` (indexes into `values` and `weights`) with
+    the highest total value whose total weight fits in `capacity`, using the
+    usual dynamic programming table.  To keep the table to at most `cells`
+    columns, weights are scaled down, rounding item weights up and the
+    capacity down so that the answer always really does fit.  If the
+    `deadline` (a `time.perf_counter` value) passes before the table is
+    done, the items are picked greedily by value per unit weight instead.
+    """
+    scale = max(1, capacity/cells)
+    slots = int(capacity/scale)
+    best = [0]*(slots+1)
+    taken = []
+    for item in items:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return greedy_knapsack(items, values, weights, capacity)
+        weight = math.ceil(weights[item]/scale)
+        value = values[item]
+        if weight > slots:
+            taken.append(None)
+            continue
+        # Everything lighter than the item keeps its old value; for the rest,
+        # see whether taking the item beats leaving it
+        take = [best[slot-weight]+value > best[slot] for slot in range(weight, slots+1)]
+        best = best[:weight] + [best[slot-weight]+value if use else best[slot]
+            for (slot, use) in zip(range(weight, slots+1), take)]
+        taken.append((weight, take))
+
+    chosen = []
+    slot = slots
+    for (item, info) in zip(reversed(items), reversed(taken)):
+        if info is None:
+            continue
+        (weight, take) = info
+        if slot >= weight and take[slot-weight]:
+            chosen.append(item)
+            slot -= weight
+    chosen.reverse()
+    return chosen
+
+def greedy_knapsack(items, values, weights, capacity):
+    """
+    Returns a subset of `items` which fits in `capacity`, taking the most
+    valuable per unit weight first, in the same order as `items`.  This is
+    what `knapsack` falls back on when it runs out of time.
+    """
+    chosen = set()
+    weight = 0
+    for item in sorted(items, key=lambda item: -values[item]/max(weights[item], 1)):
+        if weight + weights[item] <= capacity:
+            chosen.add(item)
+            weight += weights[item]
+    return [item for item in items if item in chosen]
+
+def build_tour(start, points, values, weights, capacity, budget, round_trip,
+        tour=None, rng=None, jitter=0.5, ignore_capacity=False, deadline=None):
+    """
+    Greedily inserts candidates into `tour` (a new one, by default) while
+    there's travel budget (and, unless `ignore_capacity` is set, cargo
+    space) left for them, picking the candidate with the most value per unit
+    of extra distance each time.  If `rng` is given, scores are jittered by
+    up to `jitter` either way.  If the `deadline` (a `time.perf_counter`
+    value) passes, the tour built so far is returned as it is.  Returns a
+    tuple of the tour and its length.
+
+    Each candidate's cheapest insertion is kept as the stop it would go in
+    front of (`None` for the end of the tour) and the distance it adds.
+    Inserting a stop only replaces the one leg it lands on, so after that
+    just the two new legs need checking, apart from the candidates whose
+    best spot was that leg, which are worked out again from scratch.
+    """
+    if tour is None:
+        tour = []
+    length = tour_length(start, points, tour, round_trip)
+    weight = sum([weights[idx] for idx in tour])
+    insertions = {}
+    for idx in sorted(set(range(len(points))) - set(tour)):
+        if deadline is not None and time.perf_counter() >= deadline:
+            return (tour, length)
+        (pos, delta) = cheapest_insertion(start, points, tour, idx, round_trip)
+        insertions[idx] = (tour[pos] if pos < len(tour) else None, delta)
+    while insertions:
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        best = None
+        for (idx, (nxt, delta)) in insertions.items():
+            if not ignore_capacity and weight + weights[idx] > capacity:
+                continue
+            if length + delta > budget:
+                continue
+            score = values[idx]/(delta+1)
+            if rng is not None:
+                score *= rng.uniform(1-jitter, 1+jitter)
+            if best is None or score > best[0]:
+                best = (score, idx, nxt, delta)
+        if best is None:
+            break
+        (score, new, nxt, delta) = best
+        pos = len(tour) if nxt is None else tour.index(nxt)
+        prev = tour[pos-1] if pos > 0 else None
+        tour.insert(pos, new)
+        length += delta
+        weight += weights[new]
+        del insertions[new]
+        for (idx, (old_nxt, old_delta)) in insertions.items():
+            if old_nxt == nxt:
+                (pos, delta) = cheapest_insertion(start, points, tour, idx, round_trip)
+                insertions[idx] = (tour[pos] if pos < len(tour) else None, delta)
+                continue
+            delta = insertion_delta(start, points, prev, new, idx, round_trip)
+            if delta < old_delta:
+                (old_nxt, old_delta) = (new, delta)
+            delta = insertion_delta(start, points, new, nxt, idx, round_trip)
+            if delta < old_delta:
+                (old_nxt, old_delta) = (nxt, delta)
+            insertions[idx] = (old_nxt, old_delta)
+    return (tour, length)
+
+def restart(start, points, values, weights, capacity, budget, round_trip, seed, cells=2000,
+        deadline=None):
+    """
+    Runs a single restart of the search (see the module docs), returning a
+    tuple of the value collected, the distance flown and the tour.  Seed 0
+    is the plain greedy search, without any jitter.  If the `deadline` (a
+    `time.perf_counter` value) passes partway through, the best plan put
+    together so far is returned, which is still within budget.
+    """
+    rng = None if seed == 0 else random.Random(seed)
+    (pool, length) = build_tour(start, points, values, weights, capacity, budget,
+        round_trip, rng=rng, ignore_capacity=True, deadline=deadline)
+    chosen = set(knapsack(pool, values, weights, capacity, cells, deadline))
+    tour = [idx for idx in pool if idx in chosen]
+    (tour, length) = build_tour(start, points, values, weights, capacity, budget,
+        round_trip, tour=tour, deadline=deadline)
+    return (sum([values[idx] for idx in tour]), length, tour)
+
+def restart_seeds(worker, workers, restarts=None, seed=0):
+    """
+    Generator which yields the seeds for the restarts that worker number
+    `worker` (out of `workers`) should run: restarts `worker`,
+    `worker+workers`, `worker+2*workers` and so on, up to `restarts` (or
+    forever), so that the same restarts get run however many workers there
+    are.  Restart 0 always gets seed 0, the plain greedy search.
+    """
+    if restarts is None:
+        numbers = itertools.count(worker, workers)
+    else:
+        numbers = range(worker, restarts, workers)
+    for number in numbers:
+        yield 0 if number == 0 else seed*1000003 + number
+
+def search(start, points, values, weights, capacity, budget, round_trip,
+        worker=0, workers=1, restarts=None, seed=0, time_limit=None, cells=2000):
+    """
+    Runs this worker's share of the restarts (see `restart_seeds`), stopping
+    once `time_limit` seconds have passed (cutting the restart in progress
+    short, if need be), and returns the best result found as a tuple of
+    value, distance flown and tour.  Ties go to the shorter flight.
+    """
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    best = None
+    for restart_seed in restart_seeds(worker, workers, restarts, seed):
+        (value, length, tour) = restart(start, points, values, weights,
+            capacity, budget, round_trip, restart_seed, cells, deadline)
+        if best is None or (value, -length) > (best[0], -best[1]):
+            best = (value, length, tour)
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+    return best
+
+class MiningOptimizer(object):
+    """
+    Plans mining runs in a `Systems` object, starting from the `start`
+    system with room for `capacity` units of minerals and a travel budget of
+    `budget` (measured like `System.distance_to`).  By default we have to
+    make it back to `start` within the budget as well; set `round_trip` to
+    `False` for one-way trips.
+
+    Systems are valued by their (filtered) `mineral_agg`, so any filters
+    should be applied before the optimizer is created.  Only systems close
+    enough to ever be reachable are considered, using the spatial index, and
+    any whose minerals wouldn't fit in our holds anyway are ignored.
+    """
+
+    def __init__(self, systems, start, capacity, budget, round_trip=True):
+        self.systems = systems
+        self.start = start
+        self.capacity = capacity
+        self.budget = budget
+        self.round_trip = round_trip
+
+        radius = budget/2 if round_trip else budget
+        self.candidates = []
+        for system in systems.within(start, radius):
+            if system.is_quasispace:
+                continue
+            minerals = system.mineral_agg
+            if minerals is None:
+                minerals = system.mineral_agg_full
+            value = minerals.value()
+            weight = minerals.weight()
+            if value > 0 and weight <= capacity:
+                self.candidates.append((system, value, weight))
+        self.candidates.sort(key=lambda candidate: candidate[0].idnum)
+        self.points = [(system.x, system.y) for (system, value, weight) in self.candidates]
+        self.values = [value for (system, value, weight) in self.candidates]
+        self.weights = [weight for (system, value, weight) in self.candidates]
+
+    def optimize(self, restarts=None, time_limit=1.0, processes=1, seed=0, cells=2000):
+        """
+        Returns the best `MiningPlan` found within `time_limit` seconds (or
+        with no time limit, if that's `None`) and at most `restarts`
+        restarts.  At least one of the two has to be set.  The first restart
+        is always the plain greedy search, and the rest are jittered, seeded
+        from `seed`.  Restarts are shared out across `processes` worker
+        processes (`None` for one per CPU), or all run in this process if
+        `processes` is 1.  The knapsack table gets at most `cells` columns.
+        """
+        if restarts is None and time_limit is None:
+            raise ValueError('Either restarts or time_limit must be set')
+        if restarts is not None and restarts < 1:
+            raise ValueError('At least one restart is needed')
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if restarts is not None:
+            processes = max(1, min(processes, restarts))
+        start_xy = (self.start.x, self.start.y)
+        args = (start_xy, self.points, self.values, self.weights, self.capacity,
+            self.budget, self.round_trip)
+
+        if processes == 1:
+            results = [search(*args, restarts=restarts, seed=seed,
+                time_limit=time_limit, cells=cells)]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+                futures = [executor.submit(search, *args, worker, processes, restarts,
+                    seed, time_limit, cells) for worker in range(processes)]
+                results = [future.result() for future in futures]
+
+        best = None
+        for result in results:
+            if best is None or (result[0], -result[1]) > (best[0], -best[1]):
+                best = result
+        (value, length, tour) = best
+        return MiningPlan(self.start, [self.candidates[idx][0] for idx in tour],
+            value, sum([self.weights[idx] for idx in tour]), length)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Loading several datafiles side by side (different UQM versions, patched
+dumps, synthetic galaxies and so on), and querying across all of them at
+once.  Files are loaded concurrently in a pool of worker processes, since
+loading is almost entirely Python-level work which threads wouldn't help
+with, and the resulting `Systems` objects are sent back to us pickled.
+"""
+
+import gc
+import os
+import time
+import pickle
+import concurrent.futures
+
+from uqm_map.data import Systems
+from uqm_map import query
+
+def load_worker(filename, options):
+    """
+    Loads a single datafile in a worker process, returning a tuple of the
+    pickled `Systems` object and how long the load took.
+    """
+    start = time.perf_counter()
+    systems = Systems.load_from_file(filename, **options)
+    elapsed = time.perf_counter() - start
+    return (pickle.dumps(systems, protocol=pickle.HIGHEST_PROTOCOL), elapsed)
+
+class Datasets(object):
+    """
+    A collection of independently-loaded `Systems` objects, keyed by name.
+    `timings` holds a dict for each dataset with the seconds spent on `load`
+    (in the worker), `transfer` (unpickling it back here) and `total`, and
+    `total_time` holds the wall-clock time for loading everything.
+    """
+
+    def __init__(self):
+        self.systems = {}
+        self.timings = {}
+        self.total_time = 0
+
+    def __len__(self):
+        return len(self.systems)
+
+    def names(self):
+        """
+        Returns the names of our datasets, in the order they were given
+        """
+        return list(self.systems.keys())
+
+    def get(self, name):
+        """
+        Returns the `Systems` object for the named dataset
+        """
+        return self.systems[name]
+
+    @staticmethod
+    def dataset_names(filenames):
+        """
+        Returns a dict mapping dataset names to filenames, given either a
+        list of filenames (which will be named after their basenames) or a
+        dict which already does so.
+        """
+        if isinstance(filenames, dict):
+            return dict(filenames)
+        named = {}
+        for filename in filenames:
+            name = os.path.basename(filename)
+            base = name
+            count = 1
+            while name in named:
+                count += 1
+                name = '{} ({})'.format(base, count)
+            named[name] = filename
+        return named
+
+    @staticmethod
+    def load(filenames, processes=None, **options):
+        """
+        Returns a new `Datasets` object with each of the given datafiles
+        loaded (see `dataset_names` for what `filenames` can be).  Files are
+        loaded concurrently across `processes` worker processes (by default,
+        one per CPU), or all in this process if `processes` is 1.  Any other
+        options are passed through to `Systems.load_from_file`, except that
+        planets are loaded lazily by default.  Memory-mapped datasets can't be
+        sent between processes, so `mmap` can only be used with one process.
+        """
+        options.setdefault('lazy', True)
+        named = Datasets.dataset_names(filenames)
+        datasets = Datasets()
+        start = time.perf_counter()
+
+        if processes == 1:
+            for (name, filename) in named.items():
+                load_start = time.perf_counter()
+                datasets.systems[name] = Systems.load_from_file(filename, **options)
+                elapsed = time.perf_counter() - load_start
+                datasets.timings[name] = {'load': elapsed, 'transfer': 0, 'total': elapsed}
+        else:
+            if options.get('mmap'):
+                raise ValueError('Memory-mapped datasets can only be loaded with a single process')
+            with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+                futures = dict([(executor.submit(load_worker, filename, options), name)
+                    for (name, filename) in named.items()])
+                # Unpickle each dataset as soon as it's ready, so that its
+                # total time doesn't include waiting on the others
+                loaded = {}
+                for future in concurrent.futures.as_completed(futures):
+                    name = futures[future]
+                    (data, elapsed) = future.result()
+                    transfer_start = time.perf_counter()
+                    # As in `SystemsCache.get`, the collector only slows
+                    # unpickling down
+                    gc_enabled = gc.isenabled()
+                    gc.disable()
+                    try:
+                        loaded[name] = pickle.loads(data)
+                    finally:
+                        if gc_enabled:
+                            gc.enable()
+                    transfer = time.perf_counter() - transfer_start
+                    datasets.timings[name] = {'load': elapsed, 'transfer': transfer,
+                        'total': time.perf_counter() - start}
+            for name in named.keys():
+                datasets.systems[name] = loaded[name]
+
+        datasets.total_time = time.perf_counter() - start
+        return datasets
+
+    def query_each(self, spec):
+        """
+        Runs the given query spec (see `uqm_map.query`) against each of our
+        datasets, returning a dict of result lists keyed by dataset name.
+        An invalid spec raises `ValueError`, but errors which depend on the
+        data (such as a `near` system which only exists in some of the
+        datasets) are returned as a single result with an `error` key.
+        """
+        query.validate_spec(spec)
+        results = {}
+        for (name, systems) in self.systems.items():
+            try:
+                results[name] = query.run_query(systems, spec)
+            except ValueError as e:
+                results[name] = [{'query': spec.get('id'), 'error': str(e)}]
+        return results
+
+    def query(self, spec):
+        """
+        Runs the given query spec against all our datasets, and returns a
+        single combined list of results, ranked together by the spec's
+        `sort` and cut down to its `limit`.  Each result gets a `dataset` key
+        naming the dataset it came from, and its rank within that dataset is
+        kept as `dataset_rank`.  Datasets which can't run the query are
+        left out, unless none of them can, in which case the first error is
+        raised as a `ValueError`.
+        """
+        sort = spec.get('sort') or 'value'
+        combined = []
+        errors = []
+        for (name, results) in self.query_each(spec).items():
+            if results and 'error' in results[0]:
+                errors.append(results[0]['error'])
+                continue
+            for result in results:
+                result['dataset'] = name
+                result['dataset_rank'] = result['rank']
+                combined.append(result)
+        if errors and len(errors) == len(self.systems):
+            raise ValueError(errors[0])
+        if sort == 'name':
+            combined.sort(key=lambda result: (result['name'], result['dataset'], result['sid']))
+        else:
+            combined.sort(key=lambda result: (-result[sort], result['dataset'], result['sid']))
+        if spec.get('limit') is not None:
+            combined = combined[:spec['limit']]
+        for (rank, result) in enumerate(combined):
+            result['rank'] = rank + 1
+        return combined
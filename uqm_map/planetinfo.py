@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Reads the `PlanetInfo` file written out by UQM's `dumpUniverseToFile`
+debugging routine (as patched by `uqm-0.6.2-mineraldata_and_bio.patch`)
+straight into our datafile format, without the old detour through
+`import.pl` and MySQL.  The values are massaged in the same way as
+`import.pl` does, so the results should be identical apart from the
+system and planet ID numbers.  The file is read a line at a time, so
+dumps of any size can be processed.
+
+This also holds the bits of `exportdb.py` which don't depend on the
+database (the quasispace exits and constellation resolution), so both
+scripts can share them.
+"""
+
+import io
+import os
+import re
+import configparser
+
+# Quasispace exits aren't in the dump, so they're just hardcoded
+quasispace = [
+        { 'label': 'A', 'x': 438, 'y': 6373, 'qs_x': 500, 'qs_y': 500 },
+        { 'label': 'B', 'x': 111, 'y': 9409, 'qs_x': 520, 'qs_y': 514 },
+        { 'label': 'C', 'x': 5849, 'y': 6213, 'qs_x': 520, 'qs_y': 540 },
+        { 'label': 'D', 'x': 7752, 'y': 8906, 'qs_x': 530, 'qs_y': 528 },
+        { 'label': 'E', 'x': 368, 'y': 6332, 'qs_x': 544, 'qs_y': 532 },
+        { 'label': 'F', 'x': 3183, 'y': 4906, 'qs_x': 502, 'qs_y': 460 },
+        { 'label': 'G', 'x': 1909, 'y': 926, 'qs_x': 506, 'qs_y': 474 },
+        { 'label': 'H', 'x': 5673, 'y': 1207, 'qs_x': 516, 'qs_y': 466 },
+        { 'label': 'I', 'x': 4090, 'y': 7748, 'qs_x': 476, 'qs_y': 458 },
+        { 'label': 'J', 'x': 9210, 'y': 6104, 'qs_x': 468, 'qs_y': 464 },
+        { 'label': 'K', 'x': 6116, 'y': 4131, 'qs_x': 476, 'qs_y': 496 },
+        { 'label': 'L', 'x': 2302, 'y': 3988, 'qs_x': 466, 'qs_y': 514 },
+        { 'label': 'M', 'x': 5657, 'y': 9712, 'qs_x': 448, 'qs_y': 504 },
+        { 'label': 'N', 'x': 8607, 'y': 151, 'qs_x': 458, 'qs_y': 492 },
+        { 'label': 'O', 'x': 50, 'y': 1647, 'qs_x': 492, 'qs_y': 492 },
+        { 'label': 'P', 'x': 9735, 'y': 3153, 'qs_x': 488, 'qs_y': 538 },
+    ]
+
+# Mineral line names, and the datafile keys they go into
+mineral_keys = {
+        'Common': 'min_common',
+        'Corrosive': 'min_corrosive',
+        'Base Metal': 'min_base',
+        'Noble Gas': 'min_noble',
+        'Rare Earth': 'min_rare',
+        'Precious': 'min_precious',
+        'Radioactive': 'min_radio',
+        'Exotic': 'min_exotic',
+    }
+
+# Planet attributes which start out at zero, for worlds which don't report them
+planet_attrs = [ 'tectonics', 'weather', 'temp', 'gravity', 'bio', 'bio_danger', 'mineral' ] + \
+    list(mineral_keys.values())
+
+# Chunks of the file are split just after the newline which precedes this
+system_boundary = b'\nSystem\t'
+chunk_search_size = 65536
+
+header_prefixes = ('System\t', 'Planet\t', 'Moon\t')
+re_system = re.compile(r'^System\t(.*?)\t\((\d+), (\d+)\)\t(.*?)\t(.*?)$')
+re_world = re.compile(r'^(Planet|Moon)\t(.*?)\t(.*?)$')
+re_sysname = re.compile(r'(\w+) (\w+)')
+re_extra = re.compile(r'(.*)#(\d+)')
+
+# Attribute lines, in the order `import.pl` checks them.  Only the first
+# matching pattern on any given line is used.
+attr_patterns = [ (key, re.compile(pattern)) for (key, pattern) in [
+        ('tectonics', r'Tectonics:\s+(\S+)'),
+        ('weather', r'Weather:\s+(\S+)'),
+        ('gravity', r'Gravity:\s+(\S+)'),
+        ('temp', r'Temp:\s+(\S+)'),
+        ('bio', r'Bio: (\S+)\s+Min: (\S+)'),
+        ('bio_danger', r'Dangerous Bio: (\d+)'),
+    ] + [ (key, r'{} Minerals:\s+(\S+)'.format(name)) for (name, key) in mineral_keys.items() ] ]
+
+# Labels of the attribute lines as our patched UQM writes them out, so
+# that the usual lines can be handled without any regexes at all
+attr_labels = {
+        'Tectonics': 'tectonics',
+        'Weather': 'weather',
+        'Gravity': 'gravity',
+        'Temp': 'temp',
+        'Bio': 'bio',
+        'Dangerous Bio': 'bio_danger',
+    }
+attr_labels.update([ ('{} Minerals'.format(name), key) for (name, key) in mineral_keys.items() ])
+
+def to_int(text):
+    """
+    Converts a number from the dump to an int, truncating any fractional part
+    """
+    try:
+        return int(text)
+    except ValueError:
+        return int(float(text))
+
+class PlanetInfoParser(object):
+    """
+    Class to parse a `PlanetInfo` dump from a text file object.  System and
+    planet ID numbers are assigned sequentially, starting at `first_sid` and
+    `first_pid`.
+    """
+
+    def __init__(self, fileobj, first_sid=1, first_pid=1):
+        self.fileobj = fileobj
+        self.next_sid = first_sid
+        self.next_pid = first_pid
+        self.sid = None
+        self.planet_name = ''
+
+    def parse_system(self, match):
+        """
+        Returns a system dict given a match on a "System" line
+        """
+        (name, x, y, stype, extra) = match.groups()
+        position = ''
+        sysname = re_sysname.search(name)
+        if sysname:
+            (position, name) = sysname.groups()
+        extra_num = re_extra.match(extra)
+        if extra_num:
+            # UQM numbers the Melnorme traders from zero
+            extra = '{}#{}'.format(extra_num.group(1), int(extra_num.group(2)) + 1)
+        system = {
+            'sid': self.next_sid,
+            'name': name,
+            'position': position,
+            'x': int(x),
+            'y': int(y),
+            'stype': stype,
+            'extra': extra,
+            }
+        self.sid = self.next_sid
+        self.next_sid += 1
+        # Moons can't belong to a planet from some other system, and this
+        # keeps each system independent of the ones before it, for
+        # `parse_file`'s sake
+        self.planet_name = ''
+        return system
+
+    def start_planet(self, match):
+        """
+        Returns a new planet dict given a match on a "Planet" or "Moon" line.
+        Its attributes will be filled in by `parse_attr`.
+        """
+        (category, name, ptype) = match.groups()
+        if category == 'Planet':
+            self.planet_name = name
+        else:
+            name = '{} {}'.format(self.planet_name, name)
+        planet = {
+            'pid': self.next_pid,
+            'sid': self.sid,
+            'pname': name,
+            'ptype': ptype,
+            }
+        for attr in planet_attrs:
+            planet[attr] = 0
+        self.next_pid += 1
+        return planet
+
+    @staticmethod
+    def parse_attr(planet, line):
+        """
+        Reads any planet attributes from the given (stripped) line into the
+        `planet` dict.  Returns `True` if this line is the last one for the
+        planet.
+        """
+        if line == 'NoScan' or line == 'NoAttr':
+            return True
+        values = None
+        (label, sep, rest) = line.partition(':')
+        key = attr_labels.get(label)
+        if key is not None:
+            values = rest.split()
+            if key == 'bio':
+                if len(values) != 3 or values[1] != 'Min:':
+                    values = None
+                else:
+                    del values[1]
+            elif len(values) != 1:
+                values = None
+        if values is None:
+            # Anything unusual goes through the same patterns as import.pl
+            for (key, pattern) in attr_patterns:
+                match = pattern.search(line)
+                if match:
+                    values = match.groups()
+                    break
+        if values is not None:
+            PlanetInfoParser.set_attr(planet, key, values)
+        return ('Exotic' in line)
+
+    @staticmethod
+    def set_attr(planet, key, values):
+        """
+        Stores the attribute `key` in the `planet` dict, given the list of
+        values read for it.
+        """
+        if key == 'tectonics':
+            # UQM's tectonics are zero-based, whereas the game displays 'em from 1
+            planet[key] = to_int(values[0]) + 1
+        elif key == 'weather':
+            planet[key] = to_int(values[0])
+            if planet[key] > 0:
+                planet[key] += 1
+        elif key == 'bio':
+            planet['bio'] = to_int(values[0])
+            planet['mineral'] = to_int(values[1])
+        else:
+            planet[key] = to_int(values[0])
+
+    def records(self):
+        """
+        Generator which yields a `(kind, record)` tuple for each system and
+        planet in the dump, in order, where `kind` is either `'system'` or
+        `'planet'`, and `record` is a dict in the format described in
+        `Systems.load_from_json`.  A planet is finished once its last
+        attribute line has been seen (or the next System/Planet/Moon line,
+        if the dump has been cut short).
+        """
+        planet = None
+        for line in self.fileobj:
+            line = line.rstrip('\r\n')
+            system = None
+            world = None
+            # Attribute lines are indented, so this saves us some regex work
+            if line.startswith(header_prefixes):
+                system = re_system.match(line)
+                world = re_world.match(line)
+            if planet is not None:
+                if system or world:
+                    yield ('planet', planet)
+                    planet = None
+                elif self.parse_attr(planet, line.strip()):
+                    yield ('planet', planet)
+                    planet = None
+                    continue
+            if system:
+                yield ('system', self.parse_system(system))
+            elif world:
+                if self.sid is None:
+                    raise ValueError('Found {} "{}" before any system'.format(
+                        world.group(1).lower(), world.group(2)))
+                planet = self.start_planet(world)
+        if planet is not None:
+            yield ('planet', planet)
+
+def resolve_constellations(systems, constellation_file):
+    """
+    Returns a tuple containing the `constellations` dict for our datafile
+    (mapping system IDs to a list of linked system IDs), and a list of
+    warnings about stars which couldn't be found.  `systems` should be a
+    list of system dicts, and `constellation_file` the path to
+    `constellations.ini` (whose option names configparser conveniently
+    lowercases for us).
+    """
+    ids = {}
+    for system in systems:
+        if system['position']:
+            ids.setdefault(system['name'].lower(), {})[system['position'].lower()] = system['sid']
+
+    constellations = {}
+    warnings = []
+    cp = configparser.ConfigParser()
+    cp.read(constellation_file)
+    for const in cp.sections():
+        for (star, links) in cp.items(const):
+            const = const.lower()
+            star = star.lower()
+            if const in ids and star in ids[const]:
+                constellations[ids[const][star]] = []
+                for link in links.split(','):
+                    link = link.lower()
+                    if link in ids[const]:
+                        constellations[ids[const][star]].append(ids[const][link])
+                    else:
+                        warnings.append('No ID for link {} {}!'.format(link, const))
+            else:
+                warnings.append('No ID for starting point {} {}!'.format(star, const))
+    return (constellations, warnings)
+
+def read_records(parser):
+    """
+    Returns a tuple of the lists of system and planet dicts read by the
+    given `PlanetInfoParser`
+    """
+    systems = []
+    planets = []
+    for (kind, record) in parser.records():
+        if kind == 'system':
+            systems.append(record)
+        else:
+            planets.append(record)
+    return (systems, planets)
+
+def split_chunks(filename, count):
+    """
+    Returns a list of `(start, end)` byte ranges which split the given
+    `PlanetInfo` file into at most `count` roughly-equal chunks.  Every
+    chunk but the first starts on a "System" line, so each one can be
+    parsed on its own.
+    """
+    size = os.path.getsize(filename)
+    starts = [0]
+    with open(filename, 'rb') as df:
+        for i in range(1, count):
+            offset = max(size * i // count, starts[-1])
+            df.seek(offset)
+            # Lines are short, so the boundary will almost always be in
+            # the first read
+            while True:
+                data = df.read(chunk_search_size)
+                found = data.find(system_boundary)
+                if found >= 0:
+                    offset += found + 1
+                    break
+                if len(data) < chunk_search_size:
+                    offset = size
+                    break
+                # Don't miss a boundary which straddles the two reads
+                offset += len(data) - len(system_boundary) + 1
+                df.seek(offset)
+            if offset >= size:
+                break
+            if offset > starts[-1]:
+                starts.append(offset)
+    return list(zip(starts, starts[1:] + [size]))
+
+def parse_chunk(filename, start, end):
+    """
+    Parses the given byte range of a `PlanetInfo` file (as returned by
+    `split_chunks`), returning a tuple of the lists of system and planet
+    dicts found in it.  IDs are numbered from zero within the chunk; see
+    `parse_file` for how they're fixed up.
+    """
+    with open(filename, 'rb') as df:
+        df.seek(start)
+        text = df.read(end - start).decode('utf-8', errors='replace')
+    return read_records(PlanetInfoParser(io.StringIO(text, newline=None), first_sid=0, first_pid=0))
+
+def parse_file(filename, processes=None, first_sid=1, first_pid=1, min_chunk_size=4*1024*1024):
+    """
+    Parses the given `PlanetInfo` file, returning a tuple of the lists of
+    system and planet dicts found in it.  The file is split into chunks on
+    "System" lines (none smaller than `min_chunk_size` bytes), which are
+    parsed concurrently across `processes` worker processes (by default,
+    one per CPU), or all in this process if `processes` is 1.  The chunks
+    are merged back in file order, and IDs are assigned sequentially in
+    that order starting at `first_sid` and `first_pid`, so the results are
+    identical however many processes are used.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    # A few chunks per process evens out any differences in chunk density
+    count = min(processes * 4, os.path.getsize(filename) // min_chunk_size)
+    if processes == 1 or count < 2:
+        with open(filename, 'r', encoding='utf-8', errors='replace') as df:
+            results = [read_records(PlanetInfoParser(df, first_sid=0, first_pid=0))]
+    else:
+        import concurrent.futures
+        (starts, ends) = zip(*split_chunks(filename, count))
+        with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(parse_chunk, [filename]*len(starts), starts, ends))
+
+    systems = []
+    planets = []
+    for (chunk_systems, chunk_planets) in results:
+        sid_offset = first_sid + len(systems)
+        pid_offset = first_pid + len(planets)
+        for system in chunk_systems:
+            system['sid'] += sid_offset
+        for planet in chunk_planets:
+            planet['sid'] += sid_offset
+            planet['pid'] += pid_offset
+        systems.extend(chunk_systems)
+        planets.extend(chunk_planets)
+    return (systems, planets)
+
+def make_data(systems, planets, constellation_file):
+    """
+    Returns a tuple containing the full data dict for our datafile (as
+    described in `Systems.load_from_json`, including the derived data),
+    given the lists of system and planet dicts, and a list of any
+    constellation warnings.
+    """
+    from uqm_map.derived import derive
+
+    data = { 'systems': systems, 'planets': planets, 'quasispace': quasispace }
+    (data['constellations'], warnings) = resolve_constellations(systems, constellation_file)
+    data['derived'] = derive(data)
+    return (data, warnings)
+
+def build_data(fileobj, constellation_file, first_sid=1, first_pid=1):
+    """
+    Parses a `PlanetInfo` dump from the given text file object, and returns a
+    tuple containing the full data dict for our datafile and a list of any
+    constellation warnings (see `make_data`).
+    """
+    (systems, planets) = read_records(PlanetInfoParser(fileobj, first_sid, first_pid))
+    return make_data(systems, planets, constellation_file)
+
+def with_builder(records, add):
+    """
+    Generator which yields each of the given records, passing it to `add`
+    (one of the `derived.DerivedBuilder` methods) first.
+    """
+    for record in records:
+        add(record)
+        yield record
+
+def convert(planetinfo_file, json_file, constellation_file, first_sid=1, first_pid=1, processes=None,
+        batch_size=1000):
+    """
+    Converts a `PlanetInfo` dump into a gzipped JSON datafile, parsing it
+    across `processes` worker processes as described in `parse_file`.  As
+    in `export.export_json`, the datafile is then streamed out in a single
+    pass, with the derived data built up along the way and written at the
+    end.  Returns the list of any constellation warnings.
+    """
+    import gzip
+    from uqm_map.jsonstream import JSONStreamWriter
+    from uqm_map.derived import DerivedBuilder
+
+    (systems, planets) = parse_file(planetinfo_file, processes, first_sid, first_pid)
+    builder = DerivedBuilder()
+    # The default compression level takes several times longer on big dumps,
+    # for barely any difference in size.  Leaving the timestamp out of the
+    # header means the same dump always gives a byte-identical file.
+    with gzip.GzipFile(json_file, 'w', compresslevel=6, mtime=0) as gz:
+        with io.TextIOWrapper(gz, encoding='utf-8') as df:
+            writer = JSONStreamWriter(df, batch_size)
+            writer.write_list('systems', with_builder(systems, builder.add_system))
+            writer.write_list('planets', with_builder(planets, builder.add_planet))
+            writer.write_value('quasispace', quasispace)
+            (constellations, warnings) = resolve_constellations(systems, constellation_file)
+            writer.write_value('constellations', constellations)
+            writer.write_value('derived', builder.data(constellations))
+            writer.close()
+    return warnings
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Headless queries against the starmap, for scripting and batch analysis
+without the GUI.  A query is described by a "spec" dict (usually read from
+JSON), whose keys are all optional:
+
+    {
+        'id': <anything; echoed back in each result as 'query'>,
+        'near': <system name or quasispace label; see `find_system`>,
+        'radius': <distance from 'near' (default 100)>,
+        'type': <planet type, as in `TypeDispFilter`>,
+        'name': <text to match in system names, as in `NameDispFilter`>,
+        'extra': <also match 'name' against extra system info (default False)>,
+        'constellation': <constellation name, as in `ConstDispFilter`>,
+        'tectonics': <limit>,
+        'weather': <limit>,
+        'temp': <limit>,
+        'bio': <limit on dangerous bio>,
+        'sort': <'value' (default), 'bio', 'bio_danger' or 'name'>,
+        'limit': <maximum number of results>,
+    }
+
+Each limit is either a number, which planets must be at or below, or a
+`[number, less_than]` pair as passed to the `SafetyAggFilter` setters.
+Results are dicts describing each matching system and its aggregates,
+ranked by the requested sort.  Queries never change the filters on the
+`Systems` object they're run against.
+"""
+
+import math
+import itertools
+import multiprocessing
+
+from uqm_map.data import Systems, Filter, MinData, PlanetView, ProxDispFilter, TypeDispFilter, \
+    NameDispFilter, ConstDispFilter, SafetyAggFilter
+from uqm_map.index import bitset_to_flags
+
+spec_keys = set([ 'id', 'near', 'radius', 'type', 'name', 'extra', 'constellation',
+    'tectonics', 'weather', 'temp', 'bio', 'sort', 'limit' ])
+sort_keys = [ 'value', 'bio', 'bio_danger', 'name' ]
+
+def find_system(systems, name):
+    """
+    Returns the system in `systems` whose full name (eg: "Alpha Centauri")
+    matches `name`, ignoring case, or the quasispace exit with the given
+    label.  Raises `ValueError` if there's no such system.
+    """
+    quasi = systems.get(name)
+    if quasi is not None and quasi.is_quasispace:
+        return quasi
+    lower = name.lower()
+    for idx in sorted(systems.names.search(lower)):
+        if systems.system_list[idx].fullname.lower() == lower:
+            return systems.system_list[idx]
+    raise ValueError('Unknown system "{}"'.format(name))
+
+def parse_limit(limit):
+    """
+    Returns a `(value, less_than)` tuple given a limit from a query spec.
+    Strings such as "4", "<=4" or ">=4" are accepted too, for the benefit
+    of commandline options.
+    """
+    if isinstance(limit, str):
+        limit = limit.strip()
+        if limit.startswith('>='):
+            return (int(limit[2:]), False)
+        if limit.startswith('<='):
+            return (int(limit[2:]), True)
+        return (int(limit), True)
+    if isinstance(limit, (list, tuple)):
+        (value, less_than) = limit
+        return (int(value), bool(less_than))
+    return (int(limit), True)
+
+def validate_spec(spec):
+    """
+    Checks that the given query spec only has keys we know about, with
+    values of the right types, raising `ValueError` describing the first
+    problem found.  A missing key, or one set to `None`, means the default.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError('Query specs must be JSON objects')
+    unknown = set(spec.keys()) - spec_keys
+    if unknown:
+        raise ValueError('Unknown query keys: {}'.format(', '.join(sorted(unknown))))
+    for key in ['near', 'type', 'name', 'constellation']:
+        if spec.get(key) is not None and not isinstance(spec[key], str):
+            raise ValueError('"{}" must be a string'.format(key))
+    radius = spec.get('radius')
+    if radius is not None and (isinstance(radius, bool) or not isinstance(radius, (int, float))
+            or math.isnan(radius) or radius < 0):
+        raise ValueError('"radius" must be a number, at least 0')
+    if spec.get('extra') is not None and not isinstance(spec['extra'], bool):
+        raise ValueError('"extra" must be true or false')
+    for key in ['tectonics', 'weather', 'temp', 'bio']:
+        if spec.get(key) is not None:
+            try:
+                parse_limit(spec[key])
+            except (ValueError, TypeError):
+                raise ValueError('Invalid limit for "{}": {}'.format(key, spec[key]))
+    sort = spec.get('sort')
+    if sort is not None and (not isinstance(sort, str) or sort not in sort_keys):
+        raise ValueError('Unknown sort "{}"'.format(sort))
+    limit = spec.get('limit')
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 0):
+        raise ValueError('"limit" must be a whole number, at least 0')
+
+def build_filters(systems, spec):
+    """
+    Returns a tuple of new display and aggregate `Filter` objects built from
+    the given query spec, which is checked with `validate_spec` first.
+    """
+    validate_spec(spec)
+
+    dispfilter = Filter()
+    if spec.get('near'):
+        radius = spec.get('radius')
+        dispfilter.add(ProxDispFilter(find_system(systems, spec['near']), 100 if radius is None else radius))
+    if spec.get('type'):
+        dispfilter.add(TypeDispFilter(spec['type']))
+    if spec.get('name'):
+        dispfilter.add(NameDispFilter(spec['name'], bool(spec.get('extra'))))
+    if spec.get('constellation'):
+        dispfilter.add(ConstDispFilter(spec['constellation']))
+
+    aggfilter = Filter()
+    safety = SafetyAggFilter()
+    for (key, setter) in [('tectonics', safety.set_tectonics), ('weather', safety.set_weather),
+            ('temp', safety.set_temp), ('bio', safety.set_bio)]:
+        if spec.get(key) is not None:
+            setter(*parse_limit(spec[key]))
+    if safety.state() != SafetyAggFilter().state():
+        aggfilter.add(safety)
+
+    return (dispfilter, aggfilter)
+
+def run_query(systems, spec, sums_cache=None):
+    """
+    Runs the given query spec against `systems`, and returns a list of result
+    dicts for each system which passes the display filters, ranked by the
+    spec's `sort`.  Aggregates are computed straight from the planet columns,
+    so `systems` (and the filters it's using) isn't modified, apart from
+    building the columns and indexes if they don't exist yet.  If `systems`
+    is shared with anything else, use `prepare_systems` on it first.
+
+    Filtering the aggregates for the whole galaxy is the expensive part of
+    a broad query, so if `sums_cache` is passed in, it'll be used to store
+    those, keyed on the safety filter limits.  It can be anything with dict
+    `get()` and item assignment.
+    """
+    (dispfilter, aggfilter) = build_filters(systems, spec)
+    sort = spec.get('sort') or 'value'
+
+    if systems.columns is None:
+        systems.build_columns()
+    columns = systems.columns
+    highlight = bitset_to_flags(dispfilter.system_mask(systems), len(systems.system_list))
+    indexes = list(itertools.compress(range(len(systems.system_list)), highlight))
+
+    # With no safety filters, the full aggregates will do.  Otherwise, if
+    # only a handful of systems are left, it's quicker to just add up their
+    # planets than to filter the whole galaxy.
+    if not aggfilter.filtering() and systems.full_sums is not None:
+        sums = systems.full_sums
+    elif sum([len(columns.rows(idx)) for idx in indexes]) < len(columns)/8:
+        sums = columns.aggregate_systems(indexes,
+            lambda row: aggfilter.approve(PlanetView(columns, row)))
+    else:
+        key = tuple([fil.state() for fil in aggfilter.filters])
+        sums = None
+        if sums_cache is not None:
+            sums = sums_cache.get(key)
+        if sums is None:
+            sums = columns.aggregate(aggfilter.planet_mask(columns))
+            if sums_cache is not None:
+                sums_cache[key] = sums
+
+    # Rank before building any results, so a `limit` saves us the bother of
+    # building results which will just be thrown away.
+    if sort == 'name':
+        indexes.sort(key=lambda idx: (systems.system_list[idx].fullname, systems.system_list[idx].idnum))
+    else:
+        indexes.sort(key=lambda idx: (-sums[sort][idx], systems.system_list[idx].idnum))
+    if spec.get('limit') is not None:
+        indexes = indexes[:spec['limit']]
+
+    results = []
+    for (rank, idx) in enumerate(indexes):
+        system = systems.system_list[idx]
+        results.append({
+            'query': spec.get('id'),
+            'rank': rank + 1,
+            'sid': system.idnum,
+            'name': system.fullname,
+            'x': system.x,
+            'y': system.y,
+            'stype': system.stype,
+            'extra': system.extra,
+            'value': sums['value'][idx],
+            'bio': sums['bio'][idx],
+            'bio_danger': sums['bio_danger'][idx],
+            'minerals': dict([(col, sums[col][idx]) for col in MinData.min_vals]),
+            'full_value': system.mineral_agg_full.value(),
+            'full_bio': system.bio_agg_full,
+            })
+    return results
+
+def read_specs(fileobj):
+    """
+    Returns a list of query specs read from the given text file object.  The
+    file may contain a single JSON object, a JSON list of objects, or one
+    JSON object per line.
+    """
+    import json
+    text = fileobj.read()
+    try:
+        specs = json.loads(text)
+    except ValueError:
+        specs = [json.loads(line) for line in text.splitlines() if line.strip() != '']
+    if isinstance(specs, dict):
+        specs = [specs]
+    for spec in specs:
+        if not isinstance(spec, dict):
+            raise ValueError('Query specs must be JSON objects')
+    return specs
+
+def prepare_systems(systems):
+    """
+    Builds everything on `systems` which queries would otherwise build on
+    first use, so that it can be shared between queries (or request
+    threads) without anything changing underneath them.  Returns
+    `systems`, for convenience.
+    """
+    if systems.columns is None:
+        systems.build_columns()
+    if systems.full_sums is None:
+        systems.compute_full_aggregates()
+    if systems.types is None:
+        systems.build_type_index()
+    if systems.name_index is None:
+        systems.build_name_index()
+    for name in systems.constellation_names:
+        systems.constellation_mask(name)
+    return systems
+
+def load_systems(datafile=None, cache=True):
+    """
+    Loads a `Systems` object suitable for querying (see `prepare_systems`),
+    optionally through our on-disk cache (see `uqm_map.cache`).  Planets are
+    loaded lazily, since queries only ever need the planet columns.
+    """
+    if cache:
+        from uqm_map.cache import SystemsCache
+        systems = SystemsCache().load(datafile, lazy=True)
+    else:
+        systems = Systems.load_from_file(datafile, lazy=True)
+    return prepare_systems(systems)
+
+# The `Systems` object for each worker process in `run_batch`
+worker_systems = None
+
+def init_worker(datafile, cache):
+    """
+    Loads the datafile once for each worker process in `run_batch`
+    """
+    global worker_systems
+    worker_systems = load_systems(datafile, cache)
+
+def worker_query(spec):
+    """
+    Runs a single query in a `run_batch` worker process.  Errors are
+    returned as a single result containing an `error` key, so that one bad
+    spec doesn't take down the whole batch.
+    """
+    query_id = spec.get('id') if isinstance(spec, dict) else None
+    try:
+        validate_spec(spec)
+        return run_query(worker_systems, spec)
+    except ValueError as e:
+        return [{'query': query_id, 'error': str(e)}]
+    except Exception as e:
+        return [{'query': query_id, 'error': 'Internal error: {}: {}'.format(type(e).__name__, e)}]
+
+def run_batch(datafile, specs, processes=None, cache=True, chunksize=16):
+    """
+    Generator which runs each of the given query specs, spread across a pool
+    of `processes` worker processes (by default, one per CPU), and yields
+    each spec's list of results in the same order as `specs`.  Each worker
+    loads the datafile just once.  If `processes` is 1, everything is done
+    in this process instead.
+    """
+    if processes == 1:
+        init_worker(datafile, cache)
+        for spec in specs:
+            yield worker_query(spec)
+        return
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(datafile, cache)) as pool:
+        for results in pool.imap(worker_query, specs, chunksize):
+            yield results
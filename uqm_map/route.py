@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Route planning between any two points on the starmap, travelling either
+directly through hyperspace or via quasispace: flying to one of the
+quasispace exits, crossing quasispace to another exit, and coming out at
+that exit's hyperspace position.  Costs are distances, in the same units
+as `System.distance_to` for hyperspace legs, and in quasispace
+coordinates (times `quasi_scale`, plus `portal_cost` per crossing) for
+quasispace legs.
+
+The cheapest routes between every pair of exits are worked out up front
+(`RoutePlanner.portal_costs`), so each route query is just an A* search
+over the start, the goal and the exits, using the precomputed routes as
+the edges between exits.
+"""
+
+import math
+import heapq
+
+class Leg(object):
+    """
+    A single leg of a route: travel through `mode` (either 'hyperspace' or
+    'quasispace') from `start` to `end`, at the given `cost`.  `start` and
+    `end` are `System` or `Quasispace` objects.
+    """
+
+    def __init__(self, mode, start, end, cost):
+        self.mode = mode
+        self.start = start
+        self.end = end
+        self.cost = cost
+
+    def __repr__(self):
+        return 'Leg({}, {} -> {}, {:.1f})'.format(self.mode, self.start.fullname,
+            self.end.fullname, self.cost)
+
+class Route(object):
+    """
+    The cheapest route found from `start` to `end`, as a list of `Leg`
+    objects, and its total `cost`.
+    """
+
+    def __init__(self, start, end, cost, legs):
+        self.start = start
+        self.end = end
+        self.cost = cost
+        self.legs = legs
+
+    def uses_quasispace(self):
+        """
+        Returns `True` if this route goes through quasispace at all
+        """
+        return any([leg.mode == 'quasispace' for leg in self.legs])
+
+    def to_dict(self):
+        """
+        Returns a JSON-friendly description of the route
+        """
+        return {
+            'from': self.start.fullname,
+            'to': self.end.fullname,
+            'cost': round(self.cost, 2),
+            'legs': [{'mode': leg.mode, 'from': leg.start.fullname, 'to': leg.end.fullname,
+                'cost': round(leg.cost, 2)} for leg in self.legs],
+            }
+
+class RoutePlanner(object):
+    """
+    Finds the cheapest routes between points in a `Systems` object, using
+    its quasispace exits as portals.  The planner doesn't change after it's
+    been created, so it can be shared by any number of route queries.
+    """
+
+    def __init__(self, systems, quasi_scale=1.0, portal_cost=0.0):
+        self.portals = list(systems.quasispace)
+        self.quasi_scale = quasi_scale
+        self.portal_cost = portal_cost
+        self.portal_xy = [(portal.x, portal.y) for portal in self.portals]
+        self.compute_portal_costs()
+
+    @staticmethod
+    def hyper_cost(start, end):
+        """
+        Returns the cost of flying directly through hyperspace between two
+        `(x, y)` hyperspace positions
+        """
+        return math.hypot(start[0]-end[0], start[1]-end[1])/10
+
+    def quasi_cost(self, start, end):
+        """
+        Returns the cost of crossing quasispace between two exits
+        """
+        return math.hypot(start.qs_x-end.qs_x, start.qs_y-end.qs_y)*self.quasi_scale + self.portal_cost
+
+    def compute_portal_costs(self):
+        """
+        Works out the cheapest route between each pair of exits, storing the
+        costs in `portal_costs` and, in `portal_next`, the next exit to head
+        for along the way.  Each single hop between exits takes whichever of
+        hyperspace or quasispace is cheaper, as recorded in `portal_modes`.
+        There are only ever a handful of exits, so Floyd-Warshall does fine.
+        """
+        count = len(self.portals)
+        self.portal_modes = [[None]*count for i in range(count)]
+        self.portal_costs = [[0.0]*count for i in range(count)]
+        self.portal_next = [list(range(count)) for i in range(count)]
+        for (p, start) in enumerate(self.portals):
+            for (q, end) in enumerate(self.portals):
+                if p == q:
+                    continue
+                hyper = self.hyper_cost(self.portal_xy[p], self.portal_xy[q])
+                quasi = self.quasi_cost(start, end)
+                if quasi < hyper:
+                    self.portal_modes[p][q] = 'quasispace'
+                    self.portal_costs[p][q] = quasi
+                else:
+                    self.portal_modes[p][q] = 'hyperspace'
+                    self.portal_costs[p][q] = hyper
+        costs = self.portal_costs
+        for k in range(count):
+            for p in range(count):
+                via = costs[p][k]
+                for q in range(count):
+                    if via + costs[k][q] < costs[p][q]:
+                        costs[p][q] = via + costs[k][q]
+                        self.portal_next[p][q] = self.portal_next[p][k]
+
+    def search(self, start, end):
+        """
+        Does an A* search for the cheapest route from `start` to `end`
+        (anything with hyperspace `x` and `y` attributes), returning a tuple
+        of its cost and the list of exit indexes it passes through, in order
+        (consecutive exits being joined by their precomputed routes).
+
+        The heuristic for each node is the lesser of its straight-line
+        hyperspace distance to the goal and the distance to the goal from
+        the exit closest to it.  Any route has to finish either with a
+        direct flight from the node or with a flight from some exit, so
+        this never overestimates.
+        """
+        goal_xy = (end.x, end.y)
+        start_xy = (start.x, start.y)
+        count = len(self.portals)
+        to_goal = [self.hyper_cost(xy, goal_xy) for xy in self.portal_xy]
+        nearest = min(to_goal + [math.inf])
+        heuristic = [min(cost, nearest) for cost in to_goal]
+
+        # Nodes are exit indexes, with `count` as the goal and -1 as the start
+        goal = count
+        best = {-1: 0.0}
+        came_from = {}
+        heap = [(min(self.hyper_cost(start_xy, goal_xy), nearest), -1)]
+        closed = set()
+        while heap:
+            (estimate, node) = heapq.heappop(heap)
+            if node == goal:
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+            cost = best[node]
+            if node < 0:
+                edges = [(q, self.hyper_cost(start_xy, self.portal_xy[q])) for q in range(count)]
+                edges.append((goal, self.hyper_cost(start_xy, goal_xy)))
+            else:
+                edges = list(enumerate(self.portal_costs[node]))
+                edges.append((goal, to_goal[node]))
+            for (other, edge_cost) in edges:
+                if other == node or other in closed:
+                    continue
+                new_cost = cost + edge_cost
+                if new_cost < best.get(other, math.inf):
+                    best[other] = new_cost
+                    came_from[other] = node
+                    heapq.heappush(heap, (new_cost + (0 if other == goal else heuristic[other]), other))
+
+        path = []
+        node = came_from[goal]
+        while node >= 0:
+            path.append(node)
+            node = came_from[node]
+        path.reverse()
+        return (best[goal], path)
+
+    def cost(self, start, end):
+        """
+        Returns the cost of the cheapest route from `start` to `end`
+        """
+        return self.search(start, end)[0]
+
+    def route(self, start, end):
+        """
+        Returns the cheapest `Route` from `start` to `end` (`System` or
+        `Quasispace` objects)
+        """
+        (cost, path) = self.search(start, end)
+        legs = []
+        position = start
+        # Expand each hop between exits into its precomputed steps
+        steps = []
+        for portal in path:
+            if steps:
+                current = steps[-1]
+                while current != portal:
+                    step = self.portal_next[current][portal]
+                    steps.append(step)
+                    current = step
+            else:
+                steps.append(portal)
+        prev = None
+        for step in steps:
+            portal = self.portals[step]
+            if prev is None:
+                leg_cost = self.hyper_cost((position.x, position.y), self.portal_xy[step])
+                mode = 'hyperspace'
+            else:
+                mode = self.portal_modes[prev][step]
+                if mode == 'quasispace':
+                    leg_cost = self.quasi_cost(position, portal)
+                else:
+                    leg_cost = self.hyper_cost(self.portal_xy[prev], self.portal_xy[step])
+            if leg_cost > 0 or mode == 'quasispace':
+                legs.append(Leg(mode, position, portal, leg_cost))
+            position = portal
+            prev = step
+        leg_cost = self.hyper_cost((position.x, position.y), (end.x, end.y))
+        if leg_cost > 0:
+            legs.append(Leg('hyperspace', position, end, leg_cost))
+        return Route(start, end, cost, legs)
+
+    def routes(self, pairs):
+        """
+        Generator which yields the cheapest `Route` for each `(start, end)`
+        tuple in `pairs`
+        """
+        for (start, end) in pairs:
+            yield self.route(start, end)
+
+    def cost_matrix(self, points):
+        """
+        Returns a list of lists of the cheapest route costs between each pair
+        of the given points (`matrix[i][j]` being the cost from `points[i]`
+        to `points[j]`).  Rather than searching for each route separately,
+        we work out the cheapest way from each point to arrive at each exit
+        just once, after which each route is either a direct flight or the
+        cheapest arrival at some exit followed by a flight from there.
+        """
+        count = len(self.portals)
+        coords = [(point.x, point.y) for point in points]
+        to_exits = [[self.hyper_cost(xy, exit_xy) for exit_xy in self.portal_xy] for xy in coords]
+        arrivals = [[min([row[p] + self.portal_costs[p][q] for p in range(count)])
+            for q in range(count)] for row in to_exits]
+        matrix = []
+        for (i, start_xy) in enumerate(coords):
+            arrival = arrivals[i]
+            matrix.append([0.0 if i == j else min([self.hyper_cost(start_xy, end_xy)] +
+                    [arrival[q] + to_exits[j][q] for q in range(count)])
+                for (j, end_xy) in enumerate(coords)])
+        return matrix
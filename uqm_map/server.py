@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+A small local JSON service which keeps a loaded `Systems` object in memory
+and answers queries against it, so that tools can share one warm copy of
+the galaxy rather than each loading the datafile themselves.  Requests
+are handled on their own threads.  Each request builds its own filters
+(see `uqm_map.query`), and everything queries need from the shared
+`Systems` object is built up front by `query.prepare_systems`, so requests
+don't need to wait on each other.  The one thing which still changes is
+the type index's cache of prefix lookups, which only ever holds prefixes
+of real planet types (so it can't grow without bound), and whose entries
+are just replaced whole.
+
+Endpoints:
+
+    GET  /query?name=sol&tectonics=4  - Run one query, given as URL params
+    POST /query                       - Run one query, given as a JSON spec
+    POST /batch                       - Run a JSON list of query specs
+    GET  /info                        - Basic information about the data
+    GET  /stats                       - Request counts, latency and throughput
+
+Query responses look like `{"results": [...]}`, with a list of result
+lists for `/batch`.  Errors are returned as `{"error": "..."}`, with a
+4xx status for bad requests and 500 for anything else.
+"""
+
+import os
+import json
+import time
+import threading
+import collections
+import socketserver
+import urllib.parse
+import http.server
+
+from uqm_map import query
+
+# URL parameters which aren't strings
+param_types = { 'radius': float, 'limit': int, 'extra': lambda val: val.lower() in ['1', 'true', 'yes'] }
+
+class ServerStats(object):
+    """
+    Thread-safe request counters for our server.  Latencies are in seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.paths = {}
+        self.total_latency = 0
+        self.max_latency = 0
+
+    def record(self, path, latency, error=False):
+        """
+        Records a single request to the given path, which took `latency`
+        seconds.
+        """
+        with self.lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            self.paths[path] = self.paths.get(path, 0) + 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def report(self):
+        """
+        Returns a dict describing our counters so far
+        """
+        with self.lock:
+            uptime = time.time() - self.started
+            return {
+                'uptime': uptime,
+                'requests': self.requests,
+                'errors': self.errors,
+                'paths': dict(self.paths),
+                'mean_latency': self.total_latency / self.requests if self.requests else 0,
+                'max_latency': self.max_latency,
+                'requests_per_second': self.requests / uptime if uptime else 0,
+                }
+
+class LRUCache(object):
+    """
+    A small thread-safe dict which only keeps its `size` most recently used
+    entries.  Used to share filtered aggregates between requests (see
+    `query.run_query`).
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+def spec_from_params(querystring):
+    """
+    Returns a query spec built from URL query parameters.  If a parameter
+    is given more than once, the last one wins.
+    """
+    spec = {}
+    for (key, values) in urllib.parse.parse_qs(querystring).items():
+        try:
+            spec[key] = param_types.get(key, str)(values[-1])
+        except ValueError:
+            raise ValueError('Invalid value for "{}": {}'.format(key, values[-1]))
+    return spec
+
+class QueryHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles requests for our query server.  The server is available as
+    `self.server`, and should have `systems` and `stats` attributes.
+    """
+
+    server_version = 'uqm_map'
+    # Keep-alive, so that clients can send a bunch of queries on one connection
+    protocol_version = 'HTTP/1.1'
+    max_body = 16*1024*1024
+
+    def address_string(self):
+        """
+        Unix sockets don't have a client address, so cope with that
+        """
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return 'local'
+
+    def log_message(self, format, *args):
+        """
+        Only log if the server has been told to be verbose
+        """
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        """
+        Sends the given data back to the client as JSON
+        """
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        """
+        Reads and returns the JSON body of our request.  A missing, invalid
+        or oversized `Content-Length` is rejected before we read anything,
+        and since we can't tell where the body ends, the connection gets
+        closed after the error response.
+        """
+        length = self.headers.get('Content-Length', '0').strip()
+        if not length.isdigit() or not length.isascii():
+            self.close_connection = True
+            raise ValueError('Invalid Content-Length: {}'.format(length))
+        length = int(length)
+        if length > self.max_body:
+            self.close_connection = True
+            raise ValueError('Request body too large')
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def handle_request(self, method):
+        """
+        Dispatches a request, and keeps track of how long it took to handle
+        (not counting sending the response back).
+        """
+        start = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+        status = 200
+        try:
+            if method == 'GET' and url.path == '/query':
+                spec = spec_from_params(url.query)
+                data = {'results': query.run_query(self.server.systems, spec, self.server.sums_cache)}
+            elif method == 'POST' and url.path == '/query':
+                spec = self.read_json()
+                if not isinstance(spec, dict):
+                    raise ValueError('Query spec must be a JSON object')
+                data = {'results': query.run_query(self.server.systems, spec, self.server.sums_cache)}
+            elif method == 'POST' and url.path == '/batch':
+                specs = self.read_json()
+                if not isinstance(specs, list) or not all([isinstance(spec, dict) for spec in specs]):
+                    raise ValueError('Batch must be a JSON list of query specs')
+                data = {'results': [query.run_query(self.server.systems, spec, self.server.sums_cache)
+                    for spec in specs]}
+            elif method == 'GET' and url.path == '/info':
+                data = self.server.info()
+            elif method == 'GET' and url.path == '/stats':
+                data = self.server.stats.report()
+            else:
+                status = 404
+                data = {'error': 'Unknown endpoint {} {}'.format(method, url.path)}
+        except (ValueError, TypeError) as e:
+            status = 400
+            data = {'error': str(e)}
+        except Exception as e:
+            # Still answer (and count) the request, rather than just
+            # dropping the connection
+            status = 500
+            data = {'error': 'Internal error: {}: {}'.format(type(e).__name__, e)}
+        self.server.stats.record(url.path, time.perf_counter() - start, error=(status != 200))
+        self.send_json(status, data)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+class QueryServerMixin(object):
+    """
+    The bits shared between our TCP and Unix socket servers
+    """
+
+    # Don't hold up shutdown waiting for clients which have gone quiet
+    daemon_threads = True
+
+    def setup_systems(self, systems, verbose=False):
+        self.systems = query.prepare_systems(systems)
+        self.stats = ServerStats()
+        self.sums_cache = LRUCache()
+        self.verbose = verbose
+
+    def info(self):
+        """
+        Returns a dict of basic information about the data we're serving
+        """
+        return {
+            'systems': len(self.systems.system_list),
+            'planets': len(self.systems.columns),
+            'quasispace': len(self.systems.quasispace),
+            'planet_types': sorted(self.systems.planet_types),
+            'constellations': sorted(self.systems.constellation_names),
+            }
+
+class QueryServer(QueryServerMixin, http.server.ThreadingHTTPServer):
+    """
+    Query server listening on a TCP `(host, port)` address
+    """
+
+    def __init__(self, address, systems, verbose=False):
+        self.setup_systems(systems, verbose)
+        super().__init__(address, QueryHandler)
+
+class UnixQueryServer(QueryServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Query server listening on a Unix socket at the path `address`.  Any
+    existing socket file at that path will be replaced.
+    """
+
+    def __init__(self, address, systems, verbose=False):
+        self.setup_systems(systems, verbose)
+        if os.path.exists(address):
+            os.remove(address)
+        super().__init__(address, QueryHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""
+Building short tours through the highlighted systems (those which pass the
+display filter), starting from a chosen system or quasispace exit.  This is
+the travelling salesman problem, so as with mining runs (see `mining.py`)
+we go for a good tour quickly rather than the very best one.
+
+Everything works off a precomputed distance matrix, holding either straight
+hyperspace distances or, given a `RoutePlanner`, the cheapest route costs
+including quasispace.  Each restart builds a nearest-neighbour tour (picking
+at random between the few nearest unvisited systems, after the first
+restart) and then improves it with 2-opt and Or-opt moves until neither
+finds anything more.  To keep that manageable for thousands of systems,
+moves are only tried between each system and its nearest neighbours.
+Restarts are shared out across a pool of worker processes, each of which
+gets its own copy of the matrix just once, when it starts up.
+"""
+
+import os
+import math
+import time
+import array
+import heapq
+import random
+import itertools
+import concurrent.futures
+
+from uqm_map.mining import restart_seeds
+
+class Tour(object):
+    """
+    A tour from `start` through each of `stops` in order (and back to
+    `start`, if `round_trip` is set), with a total `length`.
+    """
+
+    def __init__(self, start, stops, length, round_trip=False):
+        self.start = start
+        self.stops = stops
+        self.length = length
+        self.round_trip = round_trip
+
+    def to_dict(self):
+        """
+        Returns a JSON-friendly description of the tour
+        """
+        return {
+            'start': self.start.fullname,
+            'stops': [system.fullname for system in self.stops],
+            'length': round(self.length, 2),
+            'round_trip': self.round_trip,
+            }
+
+def distance_matrix(points, planner=None):
+    """
+    Returns a list of `array.array` rows of distances between each pair of
+    the given points (anything with `x` and `y` attributes), measured like
+    `System.distance_to`.  If a `RoutePlanner` is given, we use its route
+    costs instead, which is a good deal slower.
+    """
+    if planner is not None:
+        return [array.array('d', row) for row in planner.cost_matrix(points)]
+    coords = [(point.x/10, point.y/10) for point in points]
+    return [array.array('d', map(math.dist, itertools.repeat(coord), coords)) for coord in coords]
+
+def neighbour_lists(matrix, count=10):
+    """
+    Returns a list holding, for each point in the matrix, the indexes of the
+    `count` other points closest to it, nearest first
+    """
+    neighbours = []
+    for (idx, row) in enumerate(matrix):
+        nearest = heapq.nsmallest(count+1, range(len(row)), key=row.__getitem__)
+        neighbours.append([other for other in nearest if other != idx][:count])
+    return neighbours
+
+def tour_length(order, matrix, round_trip=False):
+    """
+    Returns the length of the tour visiting the matrix indexes in `order`
+    """
+    total = sum([matrix[a][b] for (a, b) in zip(order, order[1:])])
+    if round_trip and order:
+        total += matrix[order[-1]][order[0]]
+    return total
+
+def nearest_neighbour(matrix, neighbours, rng=None, choices=3):
+    """
+    Returns a tour which starts at index 0 and always heads for the closest
+    unvisited point next.  If `rng` is given, we pick at random between the
+    `choices` closest unvisited points instead.  Neighbour lists are checked
+    first, only falling back to the whole matrix row once all of a point's
+    neighbours have been visited.
+    """
+    count = len(matrix)
+    visited = bytearray(count)
+    visited[0] = 1
+    order = [0]
+    current = 0
+    for step in range(count-1):
+        options = [other for other in neighbours[current] if not visited[other]]
+        if len(options) < (1 if rng is None else choices):
+            row = matrix[current]
+            options = sorted([other for other in range(count) if not visited[other]],
+                key=row.__getitem__)
+        if rng is None:
+            current = options[0]
+        else:
+            current = rng.choice(options[:choices])
+        visited[current] = 1
+        order.append(current)
+    return order
+
+def two_opt(order, matrix, neighbours, round_trip=False):
+    """
+    Improves the tour in `order` (which is modified in place) with 2-opt
+    moves: for points `a` and `c`, with `c` one of `a`'s neighbours, swap the
+    edges leaving each of them for one joining them together and one joining
+    their old successors, by reversing the stretch of tour in between.  The
+    first point in the tour never moves.  Returns `True` if any improvement
+    was made.
+    """
+    count = len(order)
+    pos = [0]*count
+    for (idx, point) in enumerate(order):
+        pos[point] = idx
+
+    def after(idx):
+        """
+        Returns the point after position `idx`, or `None` at the end of a
+        one-way tour
+        """
+        if idx+1 < count:
+            return order[idx+1]
+        return order[0] if round_trip else None
+
+    improved = False
+    found = True
+    while found:
+        found = False
+        for a in range(count):
+            for c in neighbours[a]:
+                (p, q) = sorted((pos[a], pos[c]))
+                if q == p+1:
+                    continue
+                first = order[p]
+                second = order[p+1]
+                last = order[q]
+                nxt = after(q)
+                if nxt is None:
+                    gain = matrix[first][second] - matrix[first][last]
+                else:
+                    gain = (matrix[first][second] + matrix[last][nxt]
+                        - matrix[first][last] - matrix[second][nxt])
+                if gain > 1e-9:
+                    order[p+1:q+1] = order[p+1:q+1][::-1]
+                    for idx in range(p+1, q+1):
+                        pos[order[idx]] = idx
+                    found = True
+                    improved = True
+    return improved
+
+def or_opt(order, matrix, neighbours, round_trip=False, max_segment=3):
+    """
+    Improves the tour in `order` (which is modified in place) with Or-opt
+    moves: take a stretch of up to `max_segment` points and move it,
+    possibly reversed, to sit next to one of the neighbours of its first or
+    last point.  The first point in the tour never moves.  Returns `True` if
+    any improvement was made.
+    """
+    count = len(order)
+    pos = [0]*count
+    for (idx, point) in enumerate(order):
+        pos[point] = idx
+
+    def dist(a, b):
+        """
+        Distance between two points, where `None` is the end of a one-way
+        tour
+        """
+        if a is None or b is None:
+            return 0
+        return matrix[a][b]
+
+    improved = False
+    found = True
+    while found:
+        found = False
+        for size in range(1, max_segment+1):
+            for first in range(1, count-size+1):
+                last = first+size-1
+                head = order[first]
+                tail = order[last]
+                prev = order[first-1]
+                if last+1 < count:
+                    nxt = order[last+1]
+                else:
+                    nxt = order[0] if round_trip else None
+                removed = dist(prev, head) + dist(tail, nxt) - dist(prev, nxt)
+                if removed <= 1e-9:
+                    continue
+
+                # Look for the best gap to move the segment into, next to
+                # a neighbour of one of its ends.  Gaps are described by the
+                # points on either side once the segment is taken out.
+                best = None
+                for end in (head, tail):
+                    for c in neighbours[end]:
+                        idx = pos[c]
+                        if first <= idx <= last:
+                            continue
+                        if idx+1 == first:
+                            right = nxt
+                        elif idx+1 < count:
+                            right = order[idx+1]
+                        else:
+                            right = order[0] if round_trip else None
+                        gaps = [(c, right)]
+                        if idx > 0:
+                            gaps.append((prev if idx-1 == last else order[idx-1], c))
+                        elif round_trip:
+                            gaps.append((prev if last == count-1 else order[-1], c))
+                        for (left, right) in gaps:
+                            base = dist(left, right)
+                            for flip in (False, True):
+                                (enter, leave) = (tail, head) if flip else (head, tail)
+                                gain = removed - (dist(left, enter) + dist(leave, right) - base)
+                                if gain > 1e-9 and (best is None or gain > best[0]):
+                                    best = (gain, left, flip)
+                if best is None:
+                    continue
+
+                (gain, left, flip) = best
+                segment = order[first:last+1]
+                if flip:
+                    segment.reverse()
+                rest = order[:first] + order[last+1:]
+                gap = pos[left] if pos[left] < first else pos[left]-size
+                order[:] = rest[:gap+1] + segment + rest[gap+1:]
+                for (idx, point) in enumerate(order):
+                    pos[point] = idx
+                found = True
+                improved = True
+    return improved
+
+def improve(order, matrix, neighbours, round_trip=False):
+    """
+    Applies 2-opt and Or-opt moves to `order` until neither can improve it
+    any further
+    """
+    two_opt(order, matrix, neighbours, round_trip)
+    while or_opt(order, matrix, neighbours, round_trip):
+        if not two_opt(order, matrix, neighbours, round_trip):
+            break
+
+def search(matrix, neighbours, round_trip=False, worker=0, workers=1,
+        restarts=None, seed=0, time_limit=None):
+    """
+    Runs this worker's share of the restarts (see `mining.restart_seeds`),
+    stopping early once `time_limit` seconds have passed (though always
+    finishing at least one restart), and returns the best result found as a
+    tuple of length and order.
+    """
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    best = None
+    for restart_seed in restart_seeds(worker, workers, restarts, seed):
+        rng = None if restart_seed == 0 else random.Random(restart_seed)
+        order = nearest_neighbour(matrix, neighbours, rng)
+        improve(order, matrix, neighbours, round_trip)
+        length = tour_length(order, matrix, round_trip)
+        if best is None or length < best[0]:
+            best = (length, order)
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+    return best
+
+worker_problem = None
+
+def init_worker(matrix, neighbours, round_trip):
+    """
+    Stores the tour problem in a worker process, so that the matrix only
+    gets sent over once per worker
+    """
+    global worker_problem
+    worker_problem = (matrix, neighbours, round_trip)
+
+def worker_search(worker, workers, restarts, seed, time_limit):
+    """
+    Runs `search` in a worker process, on the problem given to
+    `init_worker`
+    """
+    return search(*worker_problem, worker, workers, restarts, seed, time_limit)
+
+class TourBuilder(object):
+    """
+    Builds tours through the highlighted systems in a `Systems` object,
+    starting from `start` (a system or quasispace exit), so the display
+    filter should be applied before the builder is created.  Tours are
+    one-way unless `round_trip` is set.  Distances are straight through
+    hyperspace, or if a `RoutePlanner` is given as `planner`, the cheapest
+    routes including quasispace.  Improvement moves only look at each
+    system's `neighbours` nearest systems.
+    """
+
+    def __init__(self, systems, start, round_trip=False, planner=None, neighbours=10):
+        self.start = start
+        self.round_trip = round_trip
+        self.points = [start] + [system for system in systems.system_list
+            if system.highlight and system is not start]
+        self.matrix = distance_matrix(self.points, planner)
+        self.neighbours = neighbour_lists(self.matrix, neighbours)
+
+    def build(self, restarts=None, time_limit=1.0, processes=1, seed=0):
+        """
+        Returns the shortest `Tour` found within `time_limit` seconds (or
+        with no time limit, if that's `None`) and at most `restarts`
+        restarts, at least one of which has to be set.  The first restart
+        always starts from the plain nearest-neighbour tour, and the rest
+        are randomized, seeded from `seed`.  Restarts are shared out across
+        `processes` worker processes (`None` for one per CPU), or all run in
+        this process if `processes` is 1.
+        """
+        if restarts is None and time_limit is None:
+            raise ValueError('Either restarts or time_limit must be set')
+        if restarts is not None and restarts < 1:
+            raise ValueError('At least one restart is needed')
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if restarts is not None:
+            processes = max(1, min(processes, restarts))
+        problem = (self.matrix, self.neighbours, self.round_trip)
+
+        if processes == 1:
+            results = [search(*problem, restarts=restarts, seed=seed, time_limit=time_limit)]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(processes, initializer=init_worker,
+                    initargs=problem) as executor:
+                futures = [executor.submit(worker_search, worker, processes, restarts, seed, time_limit)
+                    for worker in range(processes)]
+                results = [future.result() for future in futures]
+
+        (length, order) = min(results, key=lambda result: result[0])
+        return Tour(self.start, [self.points[idx] for idx in order[1:]], length, self.round_trip)
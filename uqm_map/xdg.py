@@ -31,13 +31,16 @@ try:
     # First try https://pypi.python.org/pypi/pyxdg
     import xdg.BaseDirectory
     base_config_dir = xdg.BaseDirectory.save_config_path('uqm_map')
+    base_cache_dir = xdg.BaseDirectory.save_cache_path('uqm_map')
 except (ModuleNotFoundError, ImportError):
     # Now try https://pypi.python.org/pypi/xdg
     import xdg
     base_config_dir = os.path.join(xdg.XDG_CONFIG_HOME, 'uqm_map')
+    base_cache_dir = os.path.join(xdg.XDG_CACHE_HOME, 'uqm_map')
 
-# Ensure our config dir exists.  If using pyxdg, this should actually be
-# unnecessary since `save_config_path` would create it.
-if not os.path.exists(base_config_dir):
-    os.mkdir(base_config_dir)
+# Ensure our config and cache dirs exist.  If using pyxdg, this should actually
+# be unnecessary since `save_config_path` and `save_cache_path` would create them.
+for base_dir in [base_config_dir, base_cache_dir]:
+    if not os.path.exists(base_dir):
+        os.makedirs(base_dir)
 
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import sys
+import json
+import argparse
+from uqm_map import query
+
+# Headless starmap queries, without the GUI.  Results are written to stdout
+# as newline-delimited JSON, one object per matching system, in rank order.
+# See `uqm_map/query.py` for the format of query spec files.
+
+# Argument Definitions
+parser = argparse.ArgumentParser(description='UQM/SC2 Starmap Query Tool',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument('-d', '--datafile',
+        type=str,
+        help='Datafile to load for starmap (defaults to the main datafile)')
+parser.add_argument('-n', '--no-cache',
+        dest='cache',
+        action='store_false',
+        help='Don\'t use (or update) the cache of parsed datafiles')
+parser.add_argument('-s', '--spec',
+        type=str,
+        help='Read query specs from this file ("-" for stdin): either a JSON ' +
+            'object, a JSON list of objects, or one JSON object per line.  ' +
+            'Overrides the filtering options below.')
+parser.add_argument('-j', '--jobs',
+        type=int,
+        help='Number of worker processes to use for query specs (defaults to the number of CPUs)')
+parser.add_argument('--near',
+        type=str,
+        help='Only show systems near this system (or quasispace exit)')
+parser.add_argument('--radius',
+        type=float,
+        default=100,
+        help='Distance to use with --near')
+parser.add_argument('--type',
+        type=str,
+        help='Only show systems with this planet type')
+parser.add_argument('--name',
+        type=str,
+        help='Only show systems whose name contains this text')
+parser.add_argument('--extra',
+        action='store_true',
+        help='Match --name against extra system info as well')
+parser.add_argument('--constellation',
+        type=str,
+        help='Only show systems in this constellation')
+for limit in ['tectonics', 'weather', 'temp', 'bio']:
+    parser.add_argument('--{}'.format(limit),
+            type=str,
+            help='Only count planets with {} at or below this (or at/above, with a ">=" prefix)'.format(limit))
+parser.add_argument('--sort',
+        choices=query.sort_keys,
+        default='value',
+        help='How to rank results')
+parser.add_argument('--limit',
+        type=int,
+        help='Maximum number of results per query')
+
+# Parse arguments
+args = parser.parse_args()
+
+try:
+    if args.spec:
+        if args.spec == '-':
+            specs = query.read_specs(sys.stdin)
+        else:
+            with open(args.spec) as df:
+                specs = query.read_specs(df)
+        batch = query.run_batch(args.datafile, specs, processes=args.jobs, cache=args.cache)
+    else:
+        spec = {}
+        for key in ['near', 'radius', 'type', 'name', 'extra', 'constellation',
+                'tectonics', 'weather', 'temp', 'bio', 'sort', 'limit']:
+            if getattr(args, key) is not None:
+                spec[key] = getattr(args, key)
+        batch = [query.run_query(query.load_systems(args.datafile, args.cache), spec)]
+
+    for results in batch:
+        for result in results:
+            sys.stdout.write(json.dumps(result) + "\n")
+except ValueError as e:
+    print('ERROR: {}'.format(e), file=sys.stderr)
+    sys.exit(1)
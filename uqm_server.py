@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# vim: set expandtab tabstop=4 shiftwidth=4:
+#
+# UQM Starmap Viewer
+# Copyright (C) 2009-2017 CJ Kucera
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import sys
+import argparse
+from uqm_map import query
+from uqm_map.server import QueryServer, UnixQueryServer
+
+# Runs a local JSON query service over a single loaded copy of the starmap.
+# See `uqm_map/server.py` for the endpoints it provides.
+
+# Argument Definitions
+parser = argparse.ArgumentParser(description='UQM/SC2 Starmap Query Server',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument('-d', '--datafile',
+        type=str,
+        help='Datafile to load for starmap (defaults to the main datafile)')
+parser.add_argument('-n', '--no-cache',
+        dest='cache',
+        action='store_false',
+        help='Don\'t use (or update) the cache of parsed datafiles')
+parser.add_argument('--host',
+        type=str,
+        default='127.0.0.1',
+        help='Address to listen on')
+parser.add_argument('-p', '--port',
+        type=int,
+        default=8642,
+        help='Port to listen on')
+parser.add_argument('-s', '--socket',
+        type=str,
+        help='Listen on this Unix socket path instead of a TCP port')
+parser.add_argument('-v', '--verbose',
+        action='store_true',
+        help='Log each request')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Load the data and start serving
+systems = query.load_systems(args.datafile, args.cache)
+if args.socket:
+    server = UnixQueryServer(args.socket, systems, verbose=args.verbose)
+    print('Listening on {}'.format(args.socket))
+else:
+    server = QueryServer((args.host, args.port), systems, verbose=args.verbose)
+    print('Listening on http://{}:{}/'.format(*server.server_address[:2]))
+sys.stdout.flush()
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    server.server_close()